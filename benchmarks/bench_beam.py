@@ -0,0 +1,110 @@
+"""Beam search vs sample-and-rerank: forwards, time and quality of the pick.
+
+    python benchmarks/bench_beam.py --model review_gen.pt --tok tokenizer.json
+
+Sample-and-rerank draws ``n`` samples (batched, CLI sampling settings) and
+keeps the one with the best length-normalised log-probability, which takes
+one more forward to score them. Beam search returns its best hypothesis
+directly. Every output is rescored the same way, so "score" is comparable
+across rows. Outputs are a fixed ``--max-new`` tokens (no eos) so lengths
+match.
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from train import ReviewGen, load_checkpoint
+from generate.beam import BeamParams, beam_search
+from generate.sampling import generate_ids
+
+cli = argparse.ArgumentParser()
+cli.add_argument("--model", required=True)
+cli.add_argument("--tok", default=str(ROOT / "tokenizer.json"))
+cli.add_argument("--prompts", default="The ramen here|Service was|Best brunch in")
+cli.add_argument("--max-new", type=int, default=40)
+cli.add_argument("--samples", default="4,16,64", help="Rerank pool sizes")
+cli.add_argument("--beams", default="4,8", help="Beam widths")
+cli.add_argument("--length-penalty", type=float, default=1.0)
+args = cli.parse_args()
+
+from tokenizers import Tokenizer
+
+torch.set_num_threads(1)
+tok = Tokenizer.from_file(args.tok)
+model = load_checkpoint(ReviewGen, args.model)
+prompts = [torch.tensor([tok.encode(p).ids]) for p in args.prompts.split("|")]
+if max(p.size(1) for p in prompts) + args.max_new > model.config["ctx_len"]:
+    raise SystemExit("prompt + --max-new must fit in ctx_len for rescoring")
+
+# count forward_cached calls and the rows they carry
+counts = dict(forwards=0, rows=0)
+forward_cached = model.forward_cached
+
+
+def counted(idx, cache):
+    counts["forwards"] += 1
+    counts["rows"] += idx.size(0)
+    return forward_cached(idx, cache)
+
+
+model.forward_cached = counted
+
+
+@torch.no_grad()
+def scores(seqs, prompt_len):
+    """Length-normalised log-probability of the generated part of each row."""
+    counts["forwards"] += 1
+    counts["rows"] += seqs.size(0)
+    logp = torch.log_softmax(model(seqs[:, :-1]), dim=-1)
+    picked = logp.gather(-1, seqs[:, 1:, None])[..., 0][:, prompt_len - 1 :]
+    return picked.sum(-1) / picked.size(1) ** args.length_penalty
+
+
+def rerank(n):
+    def run(ids):
+        out = torch.stack(generate_ids(model, ids.expand(n, -1), args.max_new))
+        return out[scores(out, ids.size(1)).argmax()]
+
+    return run
+
+
+def beam(k, groups=1):
+    params = BeamParams(
+        num_beams=k, num_groups=groups, length_penalty=args.length_penalty
+    )
+
+    def run(ids):
+        (hyps,), _ = beam_search(model, ids, args.max_new, params)
+        return hyps[0].ids
+
+    return run
+
+
+def measure(name, run):
+    counts.update(forwards=0, rows=0)
+    torch.manual_seed(0)
+    t0 = time.perf_counter()
+    best = [run(ids) for ids in prompts]
+    ms = 1000 * (time.perf_counter() - t0) / len(prompts)
+    counts_now = dict(counts)
+    quality = sum(
+        scores(b[None], p.size(1)).item() for b, p in zip(best, prompts)
+    ) / len(prompts)
+    print(
+        f"{name:<16} {counts_now['forwards'] / len(prompts):>8.0f} "
+        f"{counts_now['rows'] / len(prompts):>8.0f} {ms:>9.1f} {quality:>8.3f}"
+    )
+
+
+print(f"{'method':<16} {'forwards':>8} {'rows':>8} {'ms/prompt':>9} {'score':>8}")
+for n in (int(v) for v in args.samples.split(",")):
+    measure(f"rerank n={n}", rerank(n))
+for k in (int(v) for v in args.beams.split(",")):
+    measure(f"beam k={k}", beam(k))
+    if k % 2 == 0:
+        measure(f"diverse k={k} g=2", beam(k, groups=2))
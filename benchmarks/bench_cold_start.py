@@ -0,0 +1,116 @@
+"""Cold-start time and per-process memory for the checkpoint load paths.
+
+    python benchmarks/bench_cold_start.py [--model review_gen.pt] [--preset large]
+
+Each mode runs in a fresh interpreter. Without ``--model`` a randomly
+initialised checkpoint of ``--preset`` size is written to a temp dir.
+
+RssAnon is private to the process; RssFile is page-cache backed and shared by
+every process mapping the same checkpoint.
+"""
+
+import argparse, json, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+MODES = {
+    # what generate.py did before: unpickle everything, then copy into the model
+    "load+copy": dict(mmap=False, lazy=False, legacy=True),
+    "no-mmap": dict(mmap=False, lazy=False),
+    "mmap": dict(mmap=True, lazy=False),
+    "mmap+lazy": dict(mmap=True, lazy=True),
+}
+
+
+def mem_status():
+    out = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key = line.split(":")[0]
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                out[key] = int(line.split()[1]) / 1024
+    return out
+
+
+def probe(path, mode):
+    t0 = time.perf_counter()
+    import torch
+
+    torch.set_num_threads(1)
+    from train import ReviewGen, load_checkpoint, load_config
+
+    t_import = time.perf_counter() - t0
+    opts = MODES[mode]
+    t1 = time.perf_counter()
+    if opts.get("legacy"):
+        model = ReviewGen.from_config(load_config(path))
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+        model.eval()
+    else:
+        model = load_checkpoint(ReviewGen, path, mmap=opts["mmap"], lazy=opts["lazy"])
+    t_load = time.perf_counter() - t1
+    with torch.no_grad():
+        model(torch.zeros(1, 16, dtype=torch.long))
+    t_first = time.perf_counter() - t1
+    print(
+        json.dumps(
+            dict(
+                mode=mode,
+                import_s=t_import,
+                load_s=t_load,
+                load_and_first_forward_s=t_first,
+                **mem_status(),
+            )
+        )
+    )
+
+
+def make_checkpoint(preset, vocab, directory):
+    import torch
+    from train import ReviewGen, save_checkpoint
+    from train.presets import PRESETS
+
+    torch.manual_seed(0)
+    model = ReviewGen(vocab, **PRESETS[preset])
+    return save_checkpoint(model, Path(directory) / f"{preset}.pt")
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser()
+    cli.add_argument("--model", default=None)
+    cli.add_argument("--preset", default="large")
+    cli.add_argument("--vocab", type=int, default=8000)
+    cli.add_argument("--repeats", type=int, default=3)
+    cli.add_argument("--probe", default=None, help=argparse.SUPPRESS)
+    args = cli.parse_args()
+
+    if args.probe:
+        probe(args.model, args.probe)
+        sys.exit()
+
+    tmp = tempfile.TemporaryDirectory()
+    path = args.model or make_checkpoint(args.preset, args.vocab, tmp.name)
+    size = Path(path).stat().st_size / 2**20
+    print(f"checkpoint {path} ({size:.1f}MB)")
+    print(
+        f"{'mode':<10} {'import s':>8} {'load s':>7} {'load+fwd s':>10} "
+        f"{'RSS MB':>7} {'anon MB':>8} {'file MB':>8}"
+    )
+    for mode in MODES:
+        runs = []
+        for _ in range(args.repeats):
+            out = subprocess.run(
+                [sys.executable, __file__, "--model", str(path), "--probe", mode],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["load_s"])
+        print(
+            f"{mode:<10} {best['import_s']:>8.2f} {best['load_s']:>7.3f} "
+            f"{best['load_and_first_forward_s']:>10.3f} {best['VmRSS']:>7.1f} "
+            f"{best['RssAnon']:>8.1f} {best['RssFile']:>8.1f}"
+        )
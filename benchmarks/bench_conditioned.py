@@ -0,0 +1,71 @@
+"""Cost of hitting a target rating/cuisine mix: control tokens vs rejection.
+
+    python benchmarks/bench_conditioned.py --model review_gen.pt --tok tokenizer.json \
+        --json master.json --target 'rating=1:0.3,rating=5:0.7' --cuisine japanese
+
+Conditioned sampling costs one generation per output; its ms/output is
+measured here with cold and warm control prefixes (``Sampler.warm``).
+Rejection sampling from the unconditioned model needs about 1/share
+generations per kept output, where share is how often the corpus matches.
+That assumes a perfect classifier to do the rejecting, so it is a lower bound.
+"""
+
+import argparse, json, random, sys, time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from tokenizers import Tokenizer
+from train import ReviewGen, load_checkpoint
+from train.control import conditions
+from generate.generate import Sampler
+
+cli = argparse.ArgumentParser()
+cli.add_argument("--model", required=True)
+cli.add_argument("--tok", default=str(ROOT / "tokenizer.json"))
+cli.add_argument("--json", default=str(ROOT / "master.json"))
+cli.add_argument("--target", default="rating=1:0.3,rating=5:0.7")
+cli.add_argument("--cuisine", default=None, help="Added to every target")
+cli.add_argument("--outputs", type=int, default=40)
+cli.add_argument("--max-new", type=int, default=60)
+args = cli.parse_args()
+
+torch.set_num_threads(1)
+torch.manual_seed(0)
+weights = {}
+for part in args.target.split(","):
+    cond, weight = part.rsplit(":", 1)
+    name, value = cond.split("=")
+    target = {name: int(value) if name == "rating" else value}
+    if args.cuisine:
+        target["cuisine"] = args.cuisine
+    weights[tuple(sorted(target.items()))] = float(weight)
+
+corpus = [
+    conditions(r) for r in json.loads(Path(args.json).read_text()) if r.get("text")
+]
+rejection = 0.0
+for key, weight in weights.items():
+    share = sum(all(c.get(k) == v for k, v in key) for c in corpus) / len(corpus)
+    print(f"{dict(key)}: {share:.2%} of the corpus")
+    rejection += weight / share if share else float("inf")
+
+rng = random.Random(0)
+keys = list(weights)
+requests = [
+    dict(k) for k in rng.choices(keys, [weights[k] for k in keys], k=args.outputs)
+]
+model = load_checkpoint(ReviewGen, args.model)
+sampler = Sampler(model, Tokenizer.from_file(args.tok), max_new=args.max_new)
+for label in ("cold", "warm"):
+    if label == "warm":
+        sampler.warm([dict(k) for k in keys])
+    t0 = time.perf_counter()
+    sampler.sample_conditioned(requests)
+    ms = 1000 * (time.perf_counter() - t0) / len(requests)
+    print(f"conditioned ({label} prefixes): 1 generation/output, {ms:.1f} ms/output")
+print(f"rejection sampling: >= {rejection:.1f} generations/output")
+print(f"prefix cache: {sampler.prefix_cache.stats}")
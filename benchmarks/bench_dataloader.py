@@ -0,0 +1,99 @@
+"""Data-wait per training step for different DataLoader configurations.
+
+    python benchmarks/bench_dataloader.py --bs 48 --seq-len 128
+
+Uses random token ids, so no corpus or tokenizer is needed. "wait" is the time
+the training loop spends blocked on ``next(loader)`` while a real
+forward/backward of ``ReviewGen`` runs between batches.
+"""
+
+import argparse, os, sys, time
+from pathlib import Path
+
+import torch
+from torch.utils.data import Dataset
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from train import ReviewGen
+from train.dataset import ReviewLMDataset, collate_blocks
+from train.loader import build_loader, measure_data_wait
+
+
+class PerItem(Dataset):
+    """``ds`` without ``__getitems__``: per-item indexing + default_collate."""
+
+    def __init__(self, ds):
+        self.ds = ds
+
+    def __len__(self):
+        return len(self.ds)
+
+    def __getitem__(self, idx):
+        return self.ds[idx]
+
+
+def make_step(model, device):
+    def step(batch):
+        x, y = (t.to(device, non_blocking=True) for t in batch)
+        logits = model(x)
+        torch.nn.functional.cross_entropy(
+            logits.reshape(-1, logits.size(-1)), y.reshape(-1)
+        ).backward()
+        model.zero_grad(set_to_none=True)
+
+    return step
+
+
+def step_time(step, batch, n=10):
+    step(batch)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        step(batch)
+    return (time.perf_counter() - t0) / n
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="DataLoader data-wait per step")
+    cli.add_argument("--bs", type=int, default=48)
+    cli.add_argument("--seq-len", type=int, default=128)
+    cli.add_argument("--vocab", type=int, default=8000)
+    cli.add_argument("--n-tokens", type=int, default=2_000_000)
+    cli.add_argument("--batches", type=int, default=40)
+    cli.add_argument("--workers", default=None, help="comma separated, e.g. 0,1,2,4")
+    args = cli.parse_args(argv)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokens = torch.randint(0, args.vocab, (args.n_tokens,), dtype=torch.long)
+    ds = ReviewLMDataset.from_tokens(tokens, seq_len=args.seq_len)
+    model = ReviewGen(args.vocab, ctx_len=args.seq_len).to(device)
+    step = make_step(model, device)
+
+    if args.workers:
+        workers = [int(w) for w in args.workers.split(",")]
+    else:
+        workers = sorted({0, 1, 2, 4, len(os.sched_getaffinity(0))})
+
+    batch = next(iter(build_loader(ds, args.bs, device, collate_fn=collate_blocks)))
+    compute = step_time(step, batch)
+    print(f"device={device} bs={args.bs} seq_len={args.seq_len} cpus={os.cpu_count()}")
+    print(f"compute per step: {1000 * compute:.2f}ms")
+    print(f"{'collate':>8} {'workers':>7} {'wait ms':>8} {'wait %':>7}")
+    configs = [("default", 0, None)] + [("blocks", n, collate_blocks) for n in workers]
+    for name, n, collate in configs:
+        # per-item __getitem__ + default_collate stacking, as train.py used to do
+        source = ds if collate else PerItem(ds)
+        loader = build_loader(
+            source,
+            args.bs,
+            device,
+            num_workers=n,
+            persistent_workers=False,
+            collate_fn=collate,
+        )
+        wait = measure_data_wait(loader, step, n_batches=args.batches)
+        print(f"{name:>8} {n:>7} {1000 * wait:>8.3f} {100 * wait / compute:>6.2f}%")
+
+
+if __name__ == "__main__":
+    main()
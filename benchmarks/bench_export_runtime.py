@@ -0,0 +1,144 @@
+"""Cold start and decode latency: eager PyTorch vs the exported runtimes.
+
+    python benchmarks/bench_export_runtime.py [--model review_gen.pt] [--preset large]
+
+The checkpoint is exported to TorchScript and ONNX in a temp dir (export time
+is reported). Each mode then runs in a fresh interpreter, as an autoscaled
+worker would: import, load, first token (a ``--prompt``-token prefill), then
+``--tokens`` single-token decode steps at batch 1, all on one thread.
+"""
+
+import argparse, json, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+MODES = ["eager", "torchscript", "onnx"]
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+
+
+def probe(path, mode, prompt, tokens):
+    t0 = time.perf_counter()
+    if mode == "eager":
+        import torch
+
+        torch.set_num_threads(1)
+        from train import ReviewGen, load_checkpoint
+
+        t_import = time.perf_counter() - t0
+        model = load_checkpoint(ReviewGen, path)
+        t_load = time.perf_counter() - t0
+
+        def prefill(ids):
+            with torch.no_grad():
+                cache = model.new_cache()
+                return model.forward_cached(torch.from_numpy(ids), cache), cache
+
+        def decode(ids, cache):
+            with torch.no_grad():
+                return model.forward_cached(torch.from_numpy(ids), cache), cache
+
+    else:
+        from generate.runtime import ExportedReviewGen
+
+        t_import = time.perf_counter() - t0
+        suffix = ".onnx" if mode == "onnx" else ".ts"
+        model = ExportedReviewGen(Path(path).with_suffix(suffix), threads=1)
+        t_load = time.perf_counter() - t0
+
+        def prefill(ids):
+            logits, *past = model.step(ids, *model.empty_past(1))
+            return logits, past
+
+        def decode(ids, past):
+            logits, *past = model.step(ids, *past)
+            return logits, past
+
+    import numpy as np
+
+    ids = np.random.default_rng(0).integers(0, model.config["vocab_size"], (1, prompt))
+    _, state = prefill(ids)
+    t_first = time.perf_counter() - t0
+    step = ids[:, :1]
+    t1 = time.perf_counter()
+    for _ in range(tokens):
+        _, state = decode(step, state)
+    ms_per_token = 1000 * (time.perf_counter() - t1) / tokens
+    print(
+        json.dumps(
+            dict(
+                mode=mode,
+                import_s=t_import,
+                load_s=t_load,
+                first_token_s=t_first,
+                ms_per_token=ms_per_token,
+                rss_mb=rss_mb(),
+            )
+        )
+    )
+
+
+def export_all(path, directory):
+    from train import ReviewGen, load_checkpoint, save_checkpoint
+    from generate.export import export
+
+    model = load_checkpoint(ReviewGen, path)
+    base = Path(directory) / "model"
+    save_checkpoint(model, base.with_suffix(".pt"))  # the probes find all three here
+    for fmt, suffix in [("torchscript", ".ts"), ("onnx", ".onnx")]:
+        t0 = time.perf_counter()
+        export(model, base.with_suffix(suffix), fmt)
+        size = base.with_suffix(suffix).stat().st_size / 2**20
+        print(f"exported {fmt} in {time.perf_counter() - t0:.1f}s ({size:.1f}MB)")
+    return base.with_suffix(".pt")
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser()
+    cli.add_argument("--model", default=None)
+    cli.add_argument("--preset", default="large")
+    cli.add_argument("--vocab", type=int, default=8000)
+    cli.add_argument("--prompt", type=int, default=16)
+    cli.add_argument("--tokens", type=int, default=64)
+    cli.add_argument("--repeats", type=int, default=3)
+    cli.add_argument("--probe", default=None, help=argparse.SUPPRESS)
+    args = cli.parse_args()
+
+    if args.probe:
+        probe(args.model, args.probe, args.prompt, args.tokens)
+        sys.exit()
+
+    tmp = tempfile.TemporaryDirectory()
+    if args.model is None:
+        from bench_cold_start import make_checkpoint
+
+        args.model = make_checkpoint(args.preset, args.vocab, tmp.name)
+    path = export_all(args.model, tmp.name)
+    print(
+        f"{'mode':<12} {'import s':>8} {'load s':>7} {'1st token s':>11} "
+        f"{'ms/token':>9} {'RSS MB':>7}"
+    )
+    for mode in MODES:
+        runs = []
+        for _ in range(args.repeats):
+            out = subprocess.run(
+                [sys.executable, __file__, "--model", str(path), "--probe", mode]
+                + ["--prompt", str(args.prompt), "--tokens", str(args.tokens)],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["first_token_s"])
+        print(
+            f"{mode:<12} {best['import_s']:>8.2f} {best['load_s']:>7.3f} "
+            f"{best['first_token_s']:>11.3f} {best['ms_per_token']:>9.2f} "
+            f"{best['rss_mb']:>7.1f}"
+        )
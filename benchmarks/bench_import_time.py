@@ -0,0 +1,91 @@
+"""Import cost of every ``review-gen`` command, checked against a budget.
+
+    python benchmarks/bench_import_time.py [--repeats 3] [--top 5] [--only train,generate]
+
+Runs ``python -X importtime cli.py <command> --help`` in a fresh interpreter
+per command and sums the cumulative time of the top-level imports (what the
+interpreter spent importing, not startup or argparse). The best of
+``--repeats`` runs is compared with the command's budget; the biggest imports
+are listed for any command over it, and the run exits non-zero. Commands whose
+module subclasses torch classes at import (shards, export) get a torch-sized
+budget; everything else must answer ``--help`` without torch.
+"""
+
+import argparse, re, subprocess, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from cli import COMMANDS
+
+LIGHT_MS = 150  # stdlib + our own modules
+TORCH_MS = 4000  # torch itself is ~2s cold on a laptop CPU
+BUDGETS_MS = {name: LIGHT_MS for name in COMMANDS}
+BUDGETS_MS.update(shards=TORCH_MS, export=TORCH_MS)
+
+# "import time:       self [us] |  cumulative | imported package"
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """[(module, cumulative us)] for the top-level imports, in import order."""
+    return [
+        (m[4], int(m[2]))
+        for m in map(LINE.match, stderr.splitlines())
+        if m and not m[3]
+    ]
+
+
+def measure(command):
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", str(ROOT / "cli.py"), command, "--help"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        raise RuntimeError(f"{command} --help failed:\n{proc.stderr[-2000:]}")
+    imports = parse_importtime(proc.stderr)
+    return dict(
+        import_ms=sum(us for _, us in imports) / 1000,
+        wall_ms=1000 * wall,
+        imports=imports,
+    )
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="review-gen --help import times")
+    cli.add_argument("--repeats", type=int, default=3, help="Best of N runs")
+    cli.add_argument("--top", type=int, default=5, help="Imports listed when over")
+    cli.add_argument("--only", default=None, help="Comma-separated commands")
+    args = cli.parse_args(argv)
+
+    commands = args.only.split(",") if args.only else list(COMMANDS)
+    print(f"{'command':<10} {'import ms':>9} {'budget':>7} {'wall ms':>8}  status")
+    over = []
+    for command in commands:
+        best = min(
+            (measure(command) for _ in range(args.repeats)),
+            key=lambda r: r["import_ms"],
+        )
+        budget = BUDGETS_MS[command]
+        status = "ok" if best["import_ms"] <= budget else "OVER"
+        print(
+            f"{command:<10} {best['import_ms']:>9.1f} {budget:>7} "
+            f"{best['wall_ms']:>8.0f}  {status}"
+        )
+        if status == "OVER":
+            over.append(command)
+            for module, us in sorted(best["imports"], key=lambda i: -i[1])[: args.top]:
+                print(f"{'':<10}   {us / 1000:>8.1f}ms  {module}")
+    if over:
+        print(f"over budget: {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
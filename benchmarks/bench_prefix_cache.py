@@ -0,0 +1,78 @@
+"""Prompt prefill time with and without the prefix cache.
+
+    python benchmarks/bench_prefix_cache.py [--model review_gen.pt] [--preset base]
+
+Requests draw from ``--seeds`` distinct prompts of ``--prompt-len`` tokens;
+half of them extend their seed with a few extra tokens, which exercises
+forking from a cached prefix. Without ``--model`` a randomly initialised
+model of ``--preset`` size is used.
+"""
+
+import argparse, random, sys, time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from train import ReviewGen, load_checkpoint
+from train.presets import PRESETS
+from generate.prefix_cache import PrefixCache
+from generate.sampling import advance, check_stride
+
+cli = argparse.ArgumentParser()
+cli.add_argument("--model", default=None)
+cli.add_argument("--preset", default="base")
+cli.add_argument("--vocab", type=int, default=8000)
+cli.add_argument("--requests", type=int, default=500)
+cli.add_argument("--seeds", type=int, default=8)
+cli.add_argument("--prompt-len", type=int, default=48)
+cli.add_argument("--batch", type=int, default=4, help="Samples per request")
+cli.add_argument("--budget-mb", type=float, default=64)
+args = cli.parse_args()
+
+torch.set_num_threads(1)
+torch.manual_seed(0)
+if args.model:
+    model = load_checkpoint(ReviewGen, args.model)
+else:
+    model = ReviewGen(args.vocab, **PRESETS[args.preset]).eval()
+vocab, ctx_len = model.config["vocab_size"], model.config["ctx_len"]
+stride = check_stride(None, ctx_len)
+
+rng = random.Random(0)
+seeds = [
+    [rng.randrange(vocab) for _ in range(args.prompt_len)] for _ in range(args.seeds)
+]
+requests = []
+for _ in range(args.requests):
+    ids = list(rng.choice(seeds))
+    if rng.random() < 0.5:
+        ids += [rng.randrange(vocab) for _ in range(rng.randint(1, 8))]
+    requests.append(torch.tensor([ids[:ctx_len]]).expand(args.batch, -1))
+
+
+def run(prefill):
+    t0 = time.perf_counter()
+    with torch.no_grad():
+        for ids in requests:
+            prefill(ids)
+    return (time.perf_counter() - t0) / len(requests) * 1000
+
+
+def no_cache(ids):
+    advance(model, ids, model.new_cache(), 0, stride)
+
+
+prefix = PrefixCache(model, args.budget_mb)
+plain_ms = run(no_cache)
+cached_ms = run(prefix.prefill)
+s = prefix.stats
+print(f"no cache:     {plain_ms:.2f} ms/request")
+print(f"prefix cache: {cached_ms:.2f} ms/request ({plain_ms / cached_ms:.1f}x)")
+print(
+    f"hit rate {s.hit_rate:.1%}, partial {s.partial_hits / s.lookups:.1%}, "
+    f"tokens reused {s.token_reuse:.1%}, {len(prefix)} entries "
+    f"{prefix.bytes / 2**20:.1f}MB, {s.evictions} evictions"
+)
@@ -0,0 +1,69 @@
+"""Speculative vs plain sampling: acceptance rate, tokens/s and speedup.
+
+    python benchmarks/bench_speculative.py --model review_gen.pt --draft tiny.pt
+
+Both paths sample from the same distribution, so the comparison is purely
+throughput. ``--draft int8`` uses an int8-quantized copy of the target as the
+draft instead of a separate checkpoint.
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from train import ReviewGen, load_checkpoint
+from generate.quantize import quantize_int8
+from generate.sampling import SamplingParams, generate_ids
+from generate.speculative import SpecStats, speculative_generate
+
+cli = argparse.ArgumentParser()
+cli.add_argument("--model", required=True)
+cli.add_argument("--draft", required=True, help="Checkpoint path or 'int8'")
+cli.add_argument("--k", default="2,4,6", help="Draft lengths to try")
+cli.add_argument("--max-new", type=int, default=200)
+cli.add_argument("--runs", type=int, default=5)
+cli.add_argument("--seed", type=int, default=0)
+args = cli.parse_args()
+
+torch.set_num_threads(1)
+target = load_checkpoint(ReviewGen, args.model)
+if args.draft == "int8":
+    draft = quantize_int8(load_checkpoint(ReviewGen, args.model))
+else:
+    draft = load_checkpoint(ReviewGen, args.draft)
+params = SamplingParams()
+prompt = torch.tensor([[0]])
+
+
+def timed(fn):
+    torch.manual_seed(args.seed)
+    t0 = time.perf_counter()
+    n_tokens = sum(fn() for _ in range(args.runs))
+    return n_tokens / (time.perf_counter() - t0)
+
+
+plain_tps = timed(
+    lambda: len(generate_ids(target, prompt, args.max_new, params)[0]) - 1
+)
+print(f"plain: {plain_tps:.1f} tokens/s")
+print(f"{'k':>3} {'accept':>7} {'tok/fwd':>7} {'tok/s':>8} {'speedup':>7}")
+for k in (int(v) for v in args.k.split(",")):
+    total = SpecStats()
+
+    def run():
+        seq, stats = speculative_generate(
+            target, draft, prompt, args.max_new, params, k=k
+        )
+        for field in ("rounds", "drafted", "accepted", "generated"):
+            setattr(total, field, getattr(total, field) + getattr(stats, field))
+        return len(seq) - 1
+
+    tps = timed(run)
+    print(
+        f"{k:>3} {total.acceptance_rate:>7.1%} {total.tokens_per_target_forward:>7.2f} "
+        f"{tps:>8.1f} {tps / plain_tps:>6.2f}x"
+    )
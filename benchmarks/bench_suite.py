@@ -0,0 +1,298 @@
+"""End-to-end benchmark of the data, train and generate stages.
+
+    python benchmarks/bench_suite.py --out results.json
+    python benchmarks/bench_suite.py --baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --quick --update-baseline
+
+Everything runs on a synthetic corpus (``synthetic_corpus.py``), so no scrape,
+checkpoint or network is needed:
+
+- clean: ``clean_reviews`` records/s
+- tokenize: BPE training time and ``encode_batch`` tokens/s
+- dataset: ``ReviewLMDataset`` build time, peak and retained RSS
+- train: forward/backward/step tokens/s per ``--presets``
+- generate: time to first token and ms/token of ``generate.py``'s
+  ``Sampler.sample`` (encode, ``generate_ids`` with its prefix cache, decode)
+
+Results are written as JSON (flat ``stage.metric`` names). With a baseline,
+each metric is compared and the run exits non-zero if any is more than
+``--tolerance`` worse; ``*_per_s`` metrics are better higher, the rest lower.
+Baselines are machine specific, so none is committed: store one per deployment
+target with ``--update-baseline``. Without one the run warns and compares nothing.
+"""
+
+import argparse, json, os, platform, statistics, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+import torch
+
+from synthetic_corpus import synthetic_reviews
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+# ---------- memory ----------
+def status_mb(key):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(key + ":"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def reset_peak_rss():
+    # "5" resets VmHWM to the current RSS (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def timed(fn, repeats=3):
+    """(median seconds, last result) over ``repeats`` calls."""
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), out
+
+
+# ---------- stages ----------
+def bench_clean(reviews):
+    from train.pre_tokenisation import clean_reviews
+
+    raw = [r["text"] for r in reviews]
+    seconds, texts = timed(lambda: list(clean_reviews(raw)))
+    return {"clean.records_per_s": len(raw) / seconds}, texts
+
+
+def bench_tokenize(texts, vocab_size, path):
+    from train.train_tokenizer import train_tokenizer
+
+    t0 = time.perf_counter()
+    tokenizer = train_tokenizer(iter(texts), vocab_size)
+    train_s = time.perf_counter() - t0
+    tokenizer.save(str(path))
+    seconds, encodings = timed(lambda: tokenizer.encode_batch(texts))
+    n_tokens = sum(len(e.ids) for e in encodings)
+    return {
+        "tokenize.train_s": train_s,
+        "tokenize.tokens_per_s": n_tokens / seconds,
+    }, tokenizer
+
+
+def bench_dataset(json_path, tokenizer_path, seq_len):
+    from train.dataset import ReviewLMDataset
+
+    before = status_mb("VmRSS")
+    has_peak = reset_peak_rss()
+    t0 = time.perf_counter()
+    ds = ReviewLMDataset(str(json_path), str(tokenizer_path), seq_len=seq_len)
+    metrics = {
+        "dataset.build_s": time.perf_counter() - t0,
+        "dataset.retained_rss_mb": status_mb("VmRSS") - before,
+    }
+    if has_peak:
+        metrics["dataset.peak_rss_mb"] = status_mb("VmHWM") - before
+    return metrics, ds
+
+
+def bench_train(ds, vocab_size, presets, bs, steps):
+    from train import ReviewGen
+    from train.presets import PRESETS
+
+    gen = torch.Generator().manual_seed(0)
+    metrics = {}
+    for name in presets:
+        torch.manual_seed(0)
+        model = ReviewGen(vocab_size, ctx_len=ds.seq_len, **PRESETS[name]).train()
+        opt = torch.optim.AdamW(model.parameters(), lr=3e-4)
+
+        def step():
+            idx = torch.randint(0, len(ds), (bs,), generator=gen).tolist()
+            x, y = ds.__getitems__(idx)
+            loss = model.loss(x, y)
+            loss.backward()
+            opt.step()
+            opt.zero_grad(set_to_none=True)
+
+        step()  # warm-up: allocator, optimizer state
+        t0 = time.perf_counter()
+        for _ in range(steps):
+            step()
+        seconds = time.perf_counter() - t0
+        metrics[f"train.{name}.tokens_per_s"] = bs * ds.seq_len * steps / seconds
+    return metrics
+
+
+def bench_generate(tokenizer, vocab_size, seq_len, preset, max_new, repeats):
+    from train import ReviewGen
+    from train.presets import PRESETS
+    from generate.generate import Sampler
+
+    torch.manual_seed(0)
+    model = ReviewGen(vocab_size, ctx_len=seq_len, **PRESETS[preset]).eval()
+    # one Sampler, so repeated prompts hit its prefix cache as in a server;
+    # no eos so every run produces exactly n tokens
+    sampler = Sampler(model, tokenizer, stop_at_eos=False)
+    prompts = ["The ramen here", "Service was", "Best brunch in", "We waited"]
+
+    def sample(prompt, n):
+        sampler.max_new = n
+        return sampler.sample(prompt)
+
+    # warm-up, and every prompt's prefill in the cache: the first-token and
+    # full runs below must see the same cache state for their difference to
+    # be the per-token cost
+    for prompt in prompts:
+        sample(prompt, 4)
+    first, full = [], []
+    for i in range(repeats):
+        prompt = prompts[i % len(prompts)]
+        first.append(timed(lambda: sample(prompt, 1), 1)[0])
+        full.append(timed(lambda: sample(prompt, max_new), 1)[0])
+    ttft = statistics.median(first)
+    per_token = (statistics.median(full) - ttft) / (max_new - 1)
+    return {"generate.ttft_ms": 1000 * ttft, "generate.ms_per_token": 1000 * per_token}
+
+
+# ---------- baseline comparison ----------
+def higher_is_better(metric):
+    return metric.endswith("_per_s")
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (metric, baseline, current, relative change, status); a change
+    is positive when the metric got better."""
+    rows = []
+    for metric, current in results.items():
+        if metric not in baseline:
+            rows.append((metric, None, current, None, "new"))
+            continue
+        old = baseline[metric]
+        change = (current - old) / old if old else 0.0
+        if not higher_is_better(metric):
+            change = -change
+        status = "REGRESSION" if change < -tolerance else "ok"
+        rows.append((metric, old, current, change, status))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}  status")
+    for metric, old, current, change, status in rows:
+        old_s = f"{old:>12.4g}" if old is not None else f"{'-':>12}"
+        change_s = f"{100 * change:>+7.1f}%" if change is not None else f"{'-':>8}"
+        print(f"{metric:<32} {old_s} {current:>12.4g} {change_s}  {status}")
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Data/train/generate benchmark suite")
+    cli.add_argument("--reviews", type=int, default=20000)
+    cli.add_argument("--vocab-size", type=int, default=4000)
+    cli.add_argument("--seq-len", type=int, default=128)
+    cli.add_argument("--presets", default="tiny,small,base")
+    cli.add_argument("--bs", type=int, default=16)
+    cli.add_argument("--train-steps", type=int, default=10)
+    cli.add_argument("--generate-preset", default="small")
+    cli.add_argument("--max-new", type=int, default=64)
+    cli.add_argument("--repeats", type=int, default=5)
+    cli.add_argument("--threads", type=int, default=None)
+    cli.add_argument("--quick", action="store_true", help="Small sizes, for CI")
+    cli.add_argument("--out", default=None, help="Write results JSON here")
+    cli.add_argument(
+        "--baseline",
+        default=str(DEFAULT_BASELINE),
+        help="Results JSON to compare against (warns if missing)",
+    )
+    cli.add_argument(
+        "--update-baseline", action="store_true", help="Write results to --baseline"
+    )
+    cli.add_argument(
+        "--tolerance", type=float, default=0.15, help="Allowed relative slowdown"
+    )
+    args = cli.parse_args(argv)
+
+    if args.quick:
+        args.reviews, args.vocab_size, args.train_steps = 3000, 1000, 3
+        args.presets, args.max_new, args.repeats = "tiny,small", 16, 3
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    tmp = tempfile.TemporaryDirectory()
+    json_path = Path(tmp.name) / "synthetic.json"
+    tok_path = Path(tmp.name) / "tokenizer.json"
+    reviews = synthetic_reviews(args.reviews)
+    json_path.write_text(json.dumps(reviews))
+
+    results = {}
+    metrics, texts = bench_clean(reviews)
+    results.update(metrics)
+    metrics, tokenizer = bench_tokenize(texts, args.vocab_size, tok_path)
+    results.update(metrics)
+    del reviews, texts
+    metrics, ds = bench_dataset(json_path, tok_path, args.seq_len)
+    results.update(metrics)
+    vocab = tokenizer.get_vocab_size()
+    results.update(
+        bench_train(ds, vocab, args.presets.split(","), args.bs, args.train_steps)
+    )
+    results.update(
+        bench_generate(
+            tokenizer,
+            vocab,
+            args.seq_len,
+            args.generate_preset,
+            args.max_new,
+            args.repeats,
+        )
+    )
+
+    report = dict(
+        meta=dict(
+            machine=platform.machine(),
+            python=platform.python_version(),
+            torch=torch.__version__,
+            threads=torch.get_num_threads(),
+            cpus=os.cpu_count(),
+            time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            args={k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        ),
+        metrics=results,
+    )
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+    baseline = Path(args.baseline)
+    regressions = []
+    if args.update_baseline:
+        baseline.write_text(json.dumps(report, indent=2))
+        print(f"wrote baseline {baseline}")
+    if baseline.exists() and not args.update_baseline:
+        rows = compare(
+            results, json.loads(baseline.read_text())["metrics"], args.tolerance
+        )
+        print_comparison(rows)
+        regressions = [r[0] for r in rows if r[-1] == "REGRESSION"]
+    else:
+        for metric, value in results.items():
+            print(f"{metric:<32} {value:>12.4g}")
+        if not args.update_baseline:
+            print(
+                f"WARNING: no baseline at {baseline}, nothing was compared; "
+                "run with --update-baseline on the reference machine to store one",
+                file=sys.stderr,
+            )
+    if regressions:
+        raise SystemExit(f"{len(regressions)} regressions: {', '.join(regressions)}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Peak training memory and step time for the loss / checkpointing options.
+
+    python benchmarks/bench_train_memory.py [--preset small] [--vocab 8000]
+
+Each mode trains a randomly initialised model for a few steps in a fresh
+interpreter and reports its peak RSS (CPU) or peak allocated memory (CUDA).
+"""
+
+import argparse, json, resource, subprocess, sys, time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+MODES = {
+    "full logits": dict(chunk=0, ckpt=False),
+    "chunked loss": dict(chunk=1024, ckpt=False),
+    "chunked+ckpt": dict(chunk=1024, ckpt=True),
+}
+
+
+def probe(args, mode):
+    import torch
+    from train import ReviewGen
+    from train.presets import PRESETS
+
+    torch.set_num_threads(1)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    torch.manual_seed(0)
+    opts = MODES[mode]
+    model = ReviewGen(args.vocab, ctx_len=args.seq_len, **PRESETS[args.preset])
+    model = model.to(device).train()
+    model.grad_checkpoint = opts["ckpt"]
+    opt = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    x = torch.randint(0, args.vocab, (args.bs, args.seq_len), device=device)
+    y = torch.randint(0, args.vocab, (args.bs, args.seq_len), device=device)
+
+    def step():
+        model.loss(x, y, chunk=opts["chunk"]).backward()
+        opt.step()
+        opt.zero_grad(set_to_none=True)
+
+    step()  # optimizer state + allocator warmup
+    if device == "cuda":
+        torch.cuda.synchronize()
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        step()
+    if device == "cuda":
+        torch.cuda.synchronize()
+        peak = torch.cuda.max_memory_allocated() / 2**20
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    step_ms = (time.perf_counter() - t0) / args.steps * 1000
+    print(json.dumps(dict(mode=mode, step_ms=step_ms, peak_mb=peak)))
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser()
+    cli.add_argument("--preset", default="small")
+    cli.add_argument("--vocab", type=int, default=8000)
+    cli.add_argument("--bs", type=int, default=48)
+    cli.add_argument("--seq-len", type=int, default=128)
+    cli.add_argument("--steps", type=int, default=3)
+    cli.add_argument("--probe", default=None, help=argparse.SUPPRESS)
+    args = cli.parse_args()
+
+    if args.probe:
+        probe(args, args.probe)
+        sys.exit()
+
+    logits_mb = args.bs * args.seq_len * args.vocab * 4 / 2**20
+    print(f"{args.preset}, bs {args.bs} x seq {args.seq_len}, vocab {args.vocab}")
+    print(f"full logits tensor: {logits_mb:.0f}MB (plus as much again for its grad)")
+    print(f"{'mode':<13} {'step ms':>8} {'peak MB':>8}")
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--probe", mode],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:<13} {r['step_ms']:>8.0f} {r['peak_mb']:>8.0f}")
@@ -0,0 +1,135 @@
+"""Synthetic restaurant reviews in the master.json format.
+
+    python benchmarks/synthetic_corpus.py --reviews 20000 --out synthetic.json
+
+Text is stitched from per-cuisine dishes and rating-dependent phrases, so it
+has a realistic length spread and a vocabulary BPE can compress. Like a real
+scrape, a few percent are exact duplicates, scraped profile blurbs or empty,
+which ``pre_tokenisation.clean_reviews`` drops.
+"""
+
+import argparse, json, random
+
+CUISINES = {
+    "italian": ["margherita", "carbonara", "tiramisu", "lasagne", "risotto", "burrata"],
+    "japanese": [
+        "ramen",
+        "gyoza",
+        "sashimi",
+        "katsu curry",
+        "tempura",
+        "matcha ice cream",
+    ],
+    "indian": ["butter chicken", "dal makhani", "naan", "biryani", "samosas", "lassi"],
+    "cafe": [
+        "flat white",
+        "avocado toast",
+        "banana bread",
+        "eggs benedict",
+        "croissant",
+    ],
+    "mexican": ["tacos al pastor", "guacamole", "churros", "quesadilla", "burrito"],
+    "thai": ["pad thai", "green curry", "som tam", "massaman", "sticky rice"],
+}
+PRAISE = [
+    "the {dish} was {good}",
+    "we loved the {dish}",
+    "staff were {friendly} and the {dish} came out quickly",
+    "honestly the best {dish} I've had in {area}",
+    "great value for the portion size",
+    "lovely atmosphere, {friendly} service",
+    "will definitely be back for the {dish}",
+]
+COMPLAINTS = [
+    "the {dish} was {bad}",
+    "we waited {minutes} minutes for a table",
+    "service was {slow} and nobody checked on us",
+    "the {dish} was cold when it arrived",
+    "overpriced for what you get",
+    "too loud to hold a conversation",
+    "would not come back",
+]
+GOOD = ["amazing", "delicious", "perfect", "spot on", "really fresh", "incredible"]
+BAD = ["bland", "overcooked", "greasy", "disappointing", "tiny", "way too salty"]
+FRIENDLY = ["friendly", "attentive", "lovely", "welcoming", "super helpful"]
+SLOW = ["slow", "chaotic", "rude", "forgetful"]
+AREAS = ["Shoreditch", "Soho", "Hackney", "Brixton", "Camden", "Peckham", "town"]
+DATES = [
+    "a day ago",
+    "a week ago",
+    "2 weeks ago",
+    "a month ago",
+    "3 months ago",
+    "a year ago",
+]
+PROFILE_BLURBS = ["Local Guide · {n} reviews", "{n} reviews · {m} photos"]
+
+
+def review_text(rng, cuisine, rating):
+    dishes = CUISINES[cuisine]
+    pos = rating / 5 - 0.1  # share of praise sentences
+    sentences = []
+    for _ in range(rng.choice([1, 1, 2, 3, 4, 6, 9])):
+        template = rng.choice(PRAISE if rng.random() < pos else COMPLAINTS)
+        s = template.format(
+            dish=rng.choice(dishes),
+            good=rng.choice(GOOD),
+            bad=rng.choice(BAD),
+            friendly=rng.choice(FRIENDLY),
+            slow=rng.choice(SLOW),
+            area=rng.choice(AREAS),
+            minutes=rng.choice([20, 30, 45, 60]),
+        )
+        sentences.append(s[0].upper() + s[1:] + rng.choice([".", ".", "!", "..."]))
+    return " ".join(sentences)
+
+
+def synthetic_reviews(n, seed=0, restaurants=200, noise=0.03):
+    """``n`` review dicts with the scraper's fields."""
+    rng = random.Random(seed)
+    places = [
+        dict(
+            restaurant_name=f"{rng.choice(['The', 'Little', 'Casa', 'Bar'])} {i}",
+            restaurant_address=f"{i} {rng.choice(AREAS)} Road, London",
+            restaurant_cuisine=cuisine,
+            restaurant_rating=f"{rng.uniform(3.2, 4.9):.1f}",
+        )
+        for i, cuisine in enumerate(rng.choices(list(CUISINES), k=restaurants))
+    ]
+    out = []
+    for i in range(n):
+        place = rng.choice(places)
+        rating = rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 6])[0]
+        roll = rng.random()
+        if out and roll < noise / 3:
+            text = rng.choice(out)["text"]  # exact duplicate
+        elif roll < 2 * noise / 3:
+            blurb = rng.choice(PROFILE_BLURBS).format(
+                n=rng.randint(2, 300), m=rng.randint(1, 900)
+            )
+            text = f"{blurb} {review_text(rng, place['restaurant_cuisine'], rating)}"
+        elif roll < noise:
+            text = ""
+        else:
+            text = review_text(rng, place["restaurant_cuisine"], rating)
+        out.append(
+            dict(
+                reviewer_name=f"user{rng.randint(0, n)}",
+                rating=rating,
+                text=text,
+                date=rng.choice(DATES),
+                **place,
+            )
+        )
+    return out
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description="Write a synthetic master.json")
+    cli.add_argument("--reviews", type=int, default=20000)
+    cli.add_argument("--seed", type=int, default=0)
+    cli.add_argument("--out", default="synthetic.json")
+    args = cli.parse_args()
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(synthetic_reviews(args.reviews, args.seed), f)
+    print(f"wrote {args.reviews} reviews to {args.out}")
@@ -0,0 +1,50 @@
+"""review-gen: one entry point for the whole pipeline.
+
+    review-gen <command> [options]      (or: python cli.py <command> ...)
+    review-gen <command> --help
+
+Each command is a module with a ``main(argv)``; it is imported only when run,
+so ``--help`` and the light commands never load torch.
+"""
+
+import importlib, sys
+
+# command -> (module, one-line help)
+COMMANDS = {
+    "scrape": ("scrape_reviews.scraper", "scrape Google Maps reviews into the store"),
+    "store": ("scrape_reviews.review_store", "import/export/search the review store"),
+    "clean": ("train.pre_tokenisation", "clean master.json into reviews.txt"),
+    "shards": ("train.streaming", "split a corpus into JSONL shards"),
+    "tokenizer": ("train.train_tokenizer", "train (and compare) BPE tokenizers"),
+    "presets": ("train.presets", "params / FLOPs / latency per model preset"),
+    "train": ("train.train", "train ReviewGen"),
+    "sweep": ("train.sweep", "successive-halving hyperparameter sweep"),
+    "generate": ("generate.generate", "sample reviews"),
+    "quantize": ("generate.quantize", "write an int8 checkpoint and compare"),
+    "export": ("generate.export", "export the decode step to ONNX/TorchScript"),
+}
+
+
+def usage():
+    width = max(map(len, COMMANDS))
+    lines = ["usage: review-gen <command> [options]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {text}" for name, (_, text) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] not in COMMANDS:
+        print(f"review-gen: unknown command {argv[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[argv[0]][0])
+    sys.argv = [f"review-gen {argv[0]}", *argv[1:]]  # argparse's prog in usage lines
+    result = module.main(argv[1:])
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Beam search and diverse beam search over ReviewGen's KV cache.
+
+All ``num_beams`` beams of every prompt are rows of one batch, so each step
+is a single ``forward_cached`` call; reordering beams is a ``KVCache.select``.
+Beams are scored by summed log-probability and finished hypotheses by
+``logprob / generated_len ** length_penalty``. A beam that emits ``eos_id``
+leaves the search as a hypothesis; a prompt is done once it holds
+``num_beams`` hypotheses that no live beam can still beat, and its rows are
+dropped from the batch.
+
+With ``num_groups`` > 1 the beams are split into groups that advance in turn
+(Vijayakumar et al., diverse beam search): a group's candidates lose
+``diversity`` per earlier group that picked the same token at this step, so
+the n-best list is not one sentence with different endings.
+"""
+
+from dataclasses import dataclass
+
+import torch
+
+from generate.sampling import advance, check_stride, seen_mask
+
+
+@dataclass
+class BeamParams:
+    num_beams: int = 4
+    num_groups: int = 1
+    diversity: float = 0.5
+    length_penalty: float = 1.0
+    repetition_penalty: float = 1.0
+    n_best: int = 1
+
+
+@dataclass
+class Hypothesis:
+    ids: torch.Tensor  # prompt + generated, without the trailing eos
+    score: float  # length-normalised log-probability (diversity penalty included)
+
+
+@dataclass
+class BeamStats:
+    forwards: int = 0
+    rows: int = 0  # sequences summed over forwards: the batch cost
+
+
+def _log_probs(logits, seen, repetition_penalty):
+    # the same repetition penalty as sampling.next_token_probs
+    if repetition_penalty != 1.0:
+        logits = torch.where(seen, logits / repetition_penalty, logits)
+    return torch.log_softmax(logits.float(), dim=-1)
+
+
+def _add(hyps, ids, score, size):
+    """Keep the ``size`` best hypotheses of one prompt, best first."""
+    for h in hyps:
+        if torch.equal(h.ids, ids):  # e.g. two groups ending the same text
+            h.score = max(h.score, score)
+            break
+    else:
+        hyps.append(Hypothesis(ids, score))
+    hyps.sort(key=lambda h: -h.score)
+    del hyps[size:]
+
+
+@torch.no_grad()
+def beam_search(
+    model, ids, max_new, params=None, eos_id=None, stride=None, prefix_cache=None
+):
+    """Beam search up to ``max_new`` tokens after each row of ``ids`` (B, T).
+
+    Returns (a list with the ``n_best`` Hypotheses of each prompt, best
+    first; BeamStats).
+    """
+    params = params or BeamParams()
+    K, G = params.num_beams, params.num_groups
+    if K % G:
+        raise ValueError(f"num_beams={K} must split into num_groups={G}")
+    per_group = K // G
+    vocab = model.config["vocab_size"]
+    if per_group >= vocab:
+        raise ValueError(f"{per_group} beams per group needs a larger vocab")
+    stride = check_stride(stride, model.config["ctx_len"])
+    B, device = ids.size(0), ids.device
+    stats = BeamStats(forwards=1, rows=B)
+
+    # prefill each prompt once, then copy its state to its K beams
+    if prefix_cache is not None and ids.size(1) <= model.config["ctx_len"]:
+        cache, logits = prefix_cache.prefill(ids)
+        start = 0
+    else:
+        cache = model.new_cache()
+        logits, start = advance(model, ids, cache, 0, stride)
+    expand = torch.arange(B, device=device).repeat_interleave(K)
+    cache.select(expand)
+    logits, history = logits[expand], ids[expand]
+    seen = seen_mask(history, vocab)
+    # the beams of a group start as copies: only the first is live at step 0
+    scores = torch.full((B, K), float("-inf"), device=device)
+    scores[:, ::per_group] = 0.0
+
+    prompts = list(range(B))  # prompt index of each live block of K rows
+    finished = [[] for _ in range(B)]
+    for step in range(max_new):
+        n, length = len(prompts), step + 1
+        logp = _log_probs(logits, seen, params.repetition_penalty).view(n, K, vocab)
+        new_scores = torch.empty_like(scores)
+        sources = torch.empty(n, K, dtype=torch.long, device=device)
+        tokens = torch.empty(n, K, dtype=torch.long, device=device)
+        taken = torch.zeros(n, vocab, device=device)  # picks of earlier groups
+        for g in range(G):
+            beams = slice(g * per_group, (g + 1) * per_group)
+            cand = scores[:, beams, None] + logp[:, beams]
+            cand = cand - params.diversity * taken[:, None]
+            flat = cand.reshape(n, -1)
+            if eos_id is not None:
+                # eos is a finished hypothesis if it ranks among the group's
+                # top per_group candidates; live beams continue without it
+                cutoff = flat.topk(per_group).values[:, -1:]
+                ended = (cand[..., eos_id] >= cutoff) & cand[..., eos_id].isfinite()
+                for i, b in ended.nonzero().tolist():
+                    row = i * K + g * per_group + b
+                    score = cand[i, b, eos_id].item() / length**params.length_penalty
+                    _add(finished[prompts[i]], history[row], score, K)
+                    taken[i, eos_id] += 1
+                cand[..., eos_id] = float("-inf")
+                flat = cand.reshape(n, -1)
+            top, idx = flat.topk(per_group)
+            new_scores[:, beams] = top
+            sources[:, beams] = idx // vocab + g * per_group
+            tokens[:, beams] = idx % vocab
+            taken.scatter_add_(1, tokens[:, beams], torch.ones_like(top))
+
+        # a prompt is done when no live beam can beat its worst hypothesis
+        best_live = new_scores.max(dim=1).values / length**params.length_penalty
+        keep = [
+            i
+            for i, p in enumerate(prompts)
+            if len(finished[p]) < K or best_live[i].item() > finished[p][-1].score
+        ]
+        rows = (torch.arange(n, device=device)[:, None] * K + sources)[keep].view(-1)
+        history = torch.cat([history[rows], tokens[keep].view(-1, 1)], dim=1)
+        seen = seen[rows].scatter_(1, history[:, -1:], True)
+        scores, prompts = new_scores[keep], [prompts[i] for i in keep]
+        if not prompts:
+            break
+        cache.select(rows)
+        if step == max_new - 1:
+            break
+        logits, start = advance(model, history, cache, start, stride)
+        stats.forwards += 1
+        stats.rows += len(rows)
+
+    # out of tokens: live beams compete with the finished ones
+    length = max(1, history.size(1) - ids.size(1))
+    for i, p in enumerate(prompts):
+        for b, score in enumerate(scores[i].tolist()):
+            if score > float("-inf"):
+                norm = score / length**params.length_penalty
+                _add(finished[p], history[i * K + b], norm, K)
+    return [hyps[: params.n_best] for hyps in finished], stats
@@ -0,0 +1,173 @@
+"""Export ReviewGen to ONNX or TorchScript for ``runtime.py``.
+
+    python generate/export.py --model review_gen.pt --format onnx
+
+The exported graph is one decode step over an explicit KV cache:
+
+    (idx (B, T), past_k, past_v) -> (logits (B, T, vocab), present_k, present_v)
+
+with past/present of shape (n_layers, B, n_heads, P, head_dim). P = 0 is a
+prefill and T = 1 a decode step; B, T and P are all dynamic (P + T must stay
+within ctx_len). The model config is written beside the graph
+(``review_gen.onnx`` -> ``review_gen.json``); that is all the runtime reads.
+"""
+
+import argparse, sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+if not __package__:  # run as a script: import the generate package
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from train import ReviewGen, load_checkpoint, load_config, save_config
+from train.checkpoint import QUANT_KEY
+
+FORMATS = {"onnx": ".onnx", "torchscript": ".ts"}
+INPUTS = ["idx", "past_k", "past_v"]
+OUTPUTS = ["logits", "present_k", "present_v"]
+
+
+class _ConcatCache:
+    """KVCache stand-in for ``ReviewGen._layer_cached``: appends new keys and
+    values to the ``past`` tensors and keeps the results as ``present``."""
+
+    def __init__(self, past_k, past_v):
+        self.past_k, self.past_v = past_k, past_v
+        self.k, self.v = [], []
+
+    def update(self, layer, k, v):
+        k = torch.cat([self.past_k[layer], k], dim=2)
+        v = torch.cat([self.past_v[layer], v], dim=2)
+        self.k.append(k)
+        self.v.append(v)
+        return k, v
+
+
+class DecodeStep(torch.nn.Module):
+    """``ReviewGen.forward_cached`` with the cache passed in and returned."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, idx, past_k, past_v):
+        m = self.model
+        start, T = past_k.shape[3], idx.shape[1]
+        x = m.tok_emb(idx) + m.pos_emb[:, start : start + T]
+        # always built (all ones when T == 1) so one graph serves both phases
+        mask = torch.ones(T, start + T, dtype=torch.bool, device=idx.device)
+        mask = mask.tril(diagonal=start)
+        cache = _ConcatCache(past_k, past_v)
+        for i, layer in enumerate(m.transformer.layers):
+            x = m._layer_cached(layer, x, cache, i, mask)
+        return m.lm_head(x), torch.stack(cache.k), torch.stack(cache.v)
+
+
+def past_shape(model, batch, length=0):
+    c = model.config
+    return c["n_layers"], batch, c["n_heads"], length, c["d_model"] // c["n_heads"]
+
+
+def example_inputs(model, batch=2, seq=5, past=3):
+    """Tracing inputs; sizes > 1 so no axis gets specialised to a constant."""
+    idx = torch.randint(0, model.config["vocab_size"], (batch, seq))
+    shape = past_shape(model, batch, past)
+    return idx, torch.randn(shape), torch.randn(shape)
+
+
+def export_onnx(model, path):
+    step = DecodeStep(model).eval()
+    batch = torch.export.Dim("batch")
+    seq = torch.export.Dim("seq", max=model.config["ctx_len"])
+    past = torch.export.Dim("past", max=model.config["ctx_len"])
+    try:
+        torch.onnx.export(
+            step,
+            example_inputs(model),
+            str(path),
+            input_names=INPUTS,
+            output_names=OUTPUTS,
+            dynamic_shapes=(
+                {0: batch, 1: seq},
+                {1: batch, 3: past},
+                {1: batch, 3: past},
+            ),
+            dynamo=True,
+            external_data=False,  # one file; these models are far below 2GB
+        )
+    except ImportError as e:
+        raise ImportError(
+            "ONNX export needs the onnx and onnxscript packages "
+            "(pip install onnx onnxscript onnxruntime)"
+        ) from e
+
+
+def export_torchscript(model, path):
+    # tracing records the shape reads, so B, T and P stay dynamic
+    step = torch.jit.trace(DecodeStep(model).eval(), example_inputs(model))
+    step.save(str(path))
+
+
+def export(model, path, fmt=None):
+    """Write the decode-step graph and the model config; returns the path."""
+    path = Path(path)
+    fmt = fmt or {ext: f for f, ext in FORMATS.items()}.get(path.suffix, "onnx")
+    with torch.no_grad():
+        (export_onnx if fmt == "onnx" else export_torchscript)(model.eval(), path)
+    save_config(model, path)
+    return path
+
+
+@torch.no_grad()
+def parity(model, runtime_model, batch=2, seq=None):
+    """Max |logits| difference between eager ``forward`` and the exported
+    graph run as a prefill followed by single-token steps."""
+    seq = seq or model.config["ctx_len"]
+    idx = torch.randint(0, model.config["vocab_size"], (batch, seq))
+    ref = model(idx).numpy()
+    split = seq // 2
+    past_k, past_v = runtime_model.empty_past(batch)
+    logits, past_k, past_v = runtime_model.step(idx[:, :split].numpy(), past_k, past_v)
+    out = [logits]
+    for t in range(split, seq):
+        logits, past_k, past_v = runtime_model.step(
+            idx[:, t : t + 1].numpy(), past_k, past_v
+        )
+        out.append(logits)
+    return float(np.abs(np.concatenate(out, axis=1) - ref).max())
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Export ReviewGen for runtime.py")
+    cli.add_argument("--model", default=str(PROJECT_ROOT / "review_gen.pt"))
+    cli.add_argument(
+        "--format",
+        choices=sorted(FORMATS),
+        default=None,
+        help="Default: from --out, else onnx",
+    )
+    cli.add_argument("--out", default=None, help="Default: --model with .onnx/.ts")
+    args = cli.parse_args(argv)
+
+    if load_config(args.model).get(QUANT_KEY):
+        raise SystemExit("export the fp32 checkpoint, not a quantized one")
+    model = load_checkpoint(ReviewGen, args.model)
+    if args.out:
+        path = export(model, args.out, args.format)
+    else:
+        fmt = args.format or "onnx"
+        path = export(model, Path(args.model).with_suffix(FORMATS[fmt]), fmt)
+
+    from generate.runtime import ExportedReviewGen
+
+    diff = parity(model, ExportedReviewGen(path))
+    print(
+        f"wrote {path} ({path.stat().st_size / 2**20:.1f}MB), max |logit diff| {diff:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,353 @@
-import argparse, torch, sys
+import argparse, sys
+from functools import lru_cache
 from pathlib import Path
 
-sys.path.append(str(Path(__file__).parent.parent))
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+if not __package__:  # run as a script: import the generate package, not this file
+    sys.path.insert(0, str(PROJECT_ROOT))
 
-from tokenizers import Tokenizer
-from train import ReviewGen
 
 # ---------- CLI ----------
-cli = argparse.ArgumentParser()
-cli.add_argument("--prompt", default="", help="Seed text")
-cli.add_argument("--max_new", type=int, default=80)
-cli.add_argument("--temperature", type=float, default=0.9)
-cli.add_argument("--top_k", type=int, default=40)
-cli.add_argument("--top_p", type=float, default=0.9)
-cli.add_argument("--repetition_penalty", type=float, default=1.15)
-args = cli.parse_args()
+def build_parser():
+    cli = argparse.ArgumentParser(description="Sample reviews from ReviewGen")
+    cli.add_argument("--prompt", default="", help="Seed text")
+    cli.add_argument(
+        "--model", default=str(PROJECT_ROOT / "review_gen.pt"), help="Weights file"
+    )
+    cli.add_argument(
+        "--tok", default=str(PROJECT_ROOT / "tokenizer.json"), help="Tokenizer file"
+    )
+    cli.add_argument(
+        "--max_new",
+        type=int,
+        default=80,
+        help="Tokens to generate; may exceed the model's ctx_len (sliding window)",
+    )
+    cli.add_argument("--num-samples", type=int, default=1, help="Batched samples")
+    cli.add_argument(
+        "--window-stride",
+        type=int,
+        default=None,
+        help="Tokens dropped when the context window slides (default ctx_len/4)",
+    )
+    cli.add_argument(
+        "--no-stop-at-eos",
+        dest="stop_at_eos",
+        action="store_false",
+        help="Keep generating past <eos>",
+    )
+    cli.add_argument("--temperature", type=float, default=0.9)
+    cli.add_argument("--top_k", type=int, default=40)
+    cli.add_argument("--top_p", type=float, default=0.9)
+    cli.add_argument("--repetition_penalty", type=float, default=1.15)
+    cli.add_argument(
+        "--quantize",
+        choices=["none", "int8"],
+        default="none",
+        help="int8: dynamic quantization of the linear layers (CPU only)",
+    )
+    cli.add_argument(
+        "--no-mmap",
+        dest="mmap",
+        action="store_false",
+        help="Read the weights into memory instead of memory-mapping them",
+    )
+    cli.add_argument(
+        "--draft",
+        default=None,
+        help="Small ReviewGen checkpoint for speculative sampling (same tokenizer), "
+        "or 'int8' for an int8 copy of --model",
+    )
+    cli.add_argument("--spec-k", type=int, default=4, help="Draft tokens per round")
+    cli.add_argument(
+        "--rating",
+        type=int,
+        default=None,
+        help="Condition on a star rating (model trained with --controls)",
+    )
+    cli.add_argument(
+        "--cuisine", default=None, help="Condition on a cuisine, e.g. japanese"
+    )
+    cli.add_argument(
+        "--beams",
+        type=int,
+        default=0,
+        help="Beam search with this many beams instead of sampling",
+    )
+    cli.add_argument(
+        "--beam-groups",
+        type=int,
+        default=1,
+        help="Diverse beam search: split the beams into this many groups",
+    )
+    cli.add_argument(
+        "--diversity", type=float, default=0.5, help="Penalty between beam groups"
+    )
+    cli.add_argument(
+        "--length-penalty",
+        type=float,
+        default=1.0,
+        help="Beam score = logprob / length**penalty (0: raw logprob)",
+    )
+    cli.add_argument(
+        "--n-best", type=int, default=1, help="Beam hypotheses to print, with scores"
+    )
+    cli.add_argument(
+        "--prefix-cache-mb",
+        type=float,
+        default=64,
+        help="Memory budget for cached prompt KV state (0 disables)",
+    )
+    return cli
+
 
 # ---------- Load model + tokenizer ----------
-device = "cuda" if torch.cuda.is_available() else "cpu"
-tok = Tokenizer.from_file("tokenizer.json")
+def load_models(args, tok):
+    """(model, draft or None, device) for the parsed CLI ``args``."""
+    import torch
+    from train import ReviewGen, load_checkpoint, load_config
+    from train.checkpoint import QUANT_KEY
+    from generate.quantize import load_quantized, quantize_int8
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if (
+        args.quantize == "int8"
+        or args.draft == "int8"
+        or any(load_config(p).get(QUANT_KEY) for p in (args.model, args.draft) if p)
+    ):
+        device = "cpu"  # int8 kernels are CPU only
+
+    def load_model(path):
+        # config saved beside the weights by train.py; older checkpoints have none
+        config = load_config(path, vocab_size=len(tok.get_vocab()))
+        # checkpoint written by generate/quantize.py
+        if config.get(QUANT_KEY) == "int8":
+            return load_quantized(path, config)
+        model = load_checkpoint(
+            ReviewGen,
+            path,
+            device=device,
+            mmap=args.mmap,
+            vocab_size=config["vocab_size"],
+        )
+        if args.quantize == "int8":
+            model = quantize_int8(model)
+        return model.to(device).eval()
 
-model = ReviewGen(len(tok.get_vocab()))
-model.load_state_dict(torch.load("review_gen.pt", map_location=device))
-model.to(device).eval()
+    model = load_model(args.model)
+    if args.draft == "int8":
+        # an already-int8 main model is its own draft
+        quantized = args.quantize == "int8" or load_config(args.model).get(QUANT_KEY)
+        draft = model if quantized else quantize_int8(load_model(args.model))
+    else:
+        draft = load_model(args.draft) if args.draft else None
+    return model, draft, device
 
 
 # ---------- Sampling ----------
-@torch.no_grad()
-def sample(prompt: str) -> str:
-    ids = torch.tensor(tok.encode(prompt).ids, device=device).unsqueeze(0)
+class Sampler:
+    """Prompt in, cleaned review texts out, for one loaded model."""
 
-    for _ in range(args.max_new):
-        logits = model(ids)[:, -1] / args.temperature
+    def __init__(
+        self,
+        model,
+        tok,
+        params=None,
+        max_new=80,
+        stop_at_eos=True,
+        stride=None,
+        draft=None,
+        spec_k=4,
+        prefix_cache_mb=64,
+        device="cpu",
+    ):
+        from generate.prefix_cache import PrefixCache
+        from generate.sampling import SamplingParams
 
-        for token_id in set(ids[0].tolist()):
-            logits[:, token_id] /= args.repetition_penalty
+        self.model, self.tok, self.draft = model, tok, draft
+        self.params = params or SamplingParams()
+        self.max_new, self.stride, self.spec_k = max_new, stride, spec_k
+        self.device = device
+        self.eos_id = tok.token_to_id("<eos>")
+        self.stop_id = self.eos_id if stop_at_eos else None
+        self.prefix_cache = (
+            PrefixCache(model, prefix_cache_mb) if prefix_cache_mb else None
+        )
+        # seed prompts repeat a lot; skip re-tokenising them
+        self.prompt_ids = lru_cache(maxsize=1024)(self._prompt_ids)
 
-        probs = torch.softmax(logits, dim=-1)
+    def _prompt_ids(self, prompt: str, conditions: tuple = ()) -> tuple:
+        ids = tuple(self.tok.encode(prompt).ids)
+        if conditions:
+            from train.control import control_ids
 
-        # top-p sampling
-        if args.top_p < 1.0:
-            sorted_probs, sorted_idx = torch.sort(probs, dim=-1, descending=True)
-            cumulative_probs = torch.cumsum(sorted_probs, dim=-1)
-            mask = cumulative_probs > args.top_p
+            # a training review: <eos> of the one before, controls, text
+            controls = control_ids(self.tok, dict(conditions))
+            return (self.eos_id, *controls, *ids)
+        # reviews are separated by <eos> in training, so it also starts one
+        return ids or (self.eos_id,)
 
-            mask = torch.cat(
-                [torch.zeros_like(mask[:, :1], dtype=torch.bool), mask[:, :-1]], dim=-1
-            )
+    def encode_prompt(self, prompt: str, conditions=None):
+        """(1, T) ids for ``prompt``, after the control tokens for
+        ``conditions`` ({"rating": 2, "cuisine": "ramen"}) if given."""
+        import torch
+
+        key = tuple(sorted((conditions or {}).items()))
+        ids = self.prompt_ids(prompt, key)
+        return torch.tensor(ids, device=self.device).unsqueeze(0)
 
-            sorted_probs.masked_fill_(mask, 0.0)
+    def warm(self, conditions_list, prompt: str = ""):
+        """Prefill the prefix cache with each control prefix, so conditioned
+        requests only encode their own prompt text."""
+        if self.prefix_cache is not None:
+            for conditions in conditions_list:
+                self.prefix_cache.prefill(self.encode_prompt(prompt, conditions))
 
-            probs.zero_()
-            probs.scatter_(-1, sorted_idx, sorted_probs)
+    def sample(self, prompt: str, n: int = 1, conditions=None) -> list:
+        from generate.sampling import generate_ids
 
-            if probs.sum() > 0:
-                probs.div_(probs.sum(dim=-1, keepdim=True))
+        ids = self.encode_prompt(prompt, conditions).expand(n, -1)
+        if self.draft is not None:
+            return [
+                self.clean_output(seq.tolist()) for seq in self.sample_speculative(ids)
+            ]
+        out = generate_ids(
+            self.model,
+            ids,
+            self.max_new,
+            self.params,
+            eos_id=self.stop_id,
+            stride=self.stride,
+            prefix_cache=self.prefix_cache,
+        )
+        return [self.clean_output(seq.tolist()) for seq in out]
 
-        # top-k sampling
-        if args.top_k > 0:
-            topk_probs, topk_idx = torch.topk(probs, min(args.top_k, probs.size(-1)))
-            probs.zero_()
-            probs.scatter_(-1, topk_idx, topk_probs)
+    def sample_conditioned(self, requests, prompt: str = "") -> list:
+        """One text per condition dict in ``requests``, in order. Requests
+        with the same conditions are sampled as one batch, so a target mix
+        (say 30% 1-star, 70% 5-star) costs one generation per output."""
+        groups = {}
+        for i, conditions in enumerate(requests):
+            groups.setdefault(tuple(sorted(conditions.items())), []).append(i)
+        out = [None] * len(requests)
+        for key, rows in groups.items():
+            for i, text in zip(rows, self.sample(prompt, len(rows), dict(key))):
+                out[i] = text
+        return out
 
-            if probs.sum() > 0:
-                probs.div_(probs.sum(dim=-1, keepdim=True))
+    def beam_search(self, prompt: str, params=None, conditions=None) -> list:
+        """(score, text) for the n-best beam hypotheses, best first."""
+        from generate.beam import beam_search
 
-        next_id = torch.multinomial(probs, num_samples=1)
-        ids = torch.cat([ids, next_id], dim=1)
+        (hyps,), _ = beam_search(
+            self.model,
+            self.encode_prompt(prompt, conditions),
+            self.max_new,
+            params,
+            eos_id=self.stop_id,
+            stride=self.stride,
+            prefix_cache=self.prefix_cache,
+        )
+        return [(h.score, self.clean_output(h.ids.tolist())) for h in hyps]
 
-    output = tok.decode(ids[0].tolist(), skip_special_tokens=True).strip()
-    # clean up common BPE artifacts
-    output = (
-        output.replace("Ġ", " ")
-        .replace("Ċ", "\n")
-        .replace("âĢ¦", "...")
-        .replace("âĢĻ", "'")
+    def sample_speculative(self, ids) -> list:
+        from generate.speculative import SpecStats, speculative_generate
+
+        out, stats = [], SpecStats()
+        for row in ids:
+            seq, s = speculative_generate(
+                self.model,
+                self.draft,
+                row.unsqueeze(0),
+                self.max_new,
+                self.params,
+                k=self.spec_k,
+                eos_id=self.stop_id,
+                stride=self.stride,
+            )
+            out.append(seq)
+            for field in ("rounds", "drafted", "accepted", "generated"):
+                setattr(stats, field, getattr(stats, field) + getattr(s, field))
+        print(
+            f"speculative: acceptance {stats.acceptance_rate:.2%}, "
+            f"{stats.tokens_per_target_forward:.2f} tokens per target forward",
+            file=sys.stderr,
+        )
+        return out
+
+    def clean_output(self, ids) -> str:
+        output = self.tok.decode(ids, skip_special_tokens=True).strip()
+        # clean up common BPE artifacts
+        output = (
+            output.replace("Ġ", " ")
+            .replace("Ċ", "\n")
+            .replace("âĢ¦", "...")
+            .replace("âĢĻ", "'")
+        )
+        if output.startswith(" "):
+            output = output[1:]
+        output = " ".join(output.split())
+        for punct in [".", ",", "!", "?", ":", ";"]:
+            output = output.replace(" " + punct, punct)
+        output = output.replace("\n ", "\n")
+        return output
+
+
+def main(argv=None):
+    cli = build_parser()
+    args = cli.parse_args(argv)
+    if args.beams and args.draft:
+        cli.error("--beams and --draft don't combine")
+
+    from tokenizers import Tokenizer
+    from generate.sampling import SamplingParams
+
+    tok = Tokenizer.from_file(args.tok)
+    model, draft, device = load_models(args, tok)
+    params = SamplingParams(
+        temperature=args.temperature,
+        top_k=args.top_k,
+        top_p=args.top_p,
+        repetition_penalty=args.repetition_penalty,
+    )
+    sampler = Sampler(
+        model,
+        tok,
+        params,
+        max_new=args.max_new,
+        stop_at_eos=args.stop_at_eos,
+        stride=args.window_stride,
+        draft=draft,
+        spec_k=args.spec_k,
+        prefix_cache_mb=args.prefix_cache_mb,
+        device=device,
     )
-    if output.startswith(" "):
-        output = output[1:]
-    output = " ".join(output.split())
-    for punct in [".", ",", "!", "?", ":", ";"]:
-        output = output.replace(" " + punct, punct)
-    output = output.replace("\n ", "\n")
-    return output
+    conditions = {
+        name: value
+        for name, value in (("rating", args.rating), ("cuisine", args.cuisine))
+        if value is not None
+    }
+    try:
+        sampler.encode_prompt(args.prompt, conditions)
+    except ValueError as e:  # no such control token in this tokenizer
+        cli.error(str(e))
+    if args.beams:
+        from generate.beam import BeamParams
+
+        beam = BeamParams(
+            num_beams=args.beams,
+            num_groups=args.beam_groups,
+            diversity=args.diversity,
+            length_penalty=args.length_penalty,
+            repetition_penalty=args.repetition_penalty,
+            n_best=args.n_best,
+        )
+        for score, text in sampler.beam_search(args.prompt, beam, conditions):
+            print(f"{score:.3f}\t{text}")
+        return
+    for text in sampler.sample(args.prompt, args.num_samples, conditions):
+        print(text)
 
 
-print(sample(args.prompt))
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Prompt prefix cache: reuse the KV state of seed texts across calls.
+
+Entries are keyed by the tuple of prompt token ids and hold the per-layer
+keys/values for those positions (trimmed to the prompt length) plus the logits
+at the last position. A new prompt forks from the longest cached prefix and
+only its remaining tokens go through the model. Entries are evicted least
+recently used first once their total size exceeds ``max_mb``.
+
+One cache serves one model: the stored state is meaningless for any other.
+Prompts longer than ``ctx_len`` slide the window before the first sampled
+token, so ``generate_ids`` does not route them through the cache.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import torch
+
+
+@dataclass
+class PrefixStats:
+    lookups: int = 0
+    hits: int = 0  # whole prompt cached
+    partial_hits: int = 0  # some shorter prefix cached
+    prompt_tokens: int = 0
+    reused_tokens: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def token_reuse(self):
+        return self.reused_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PrefixCache:
+    def __init__(self, model, max_mb=64):
+        self.model = model
+        self.max_bytes = int(max_mb * 2**20)
+        self.entries = OrderedDict()  # token tuple -> (keys, values, logits)
+        self.bytes = 0
+        self.stats = PrefixStats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _size(entry):
+        keys, values, logits = entry
+        return sum(t.numel() * t.element_size() for t in (*keys, *values, logits))
+
+    def longest_prefix(self, ids):
+        """Longest cached prefix of the token sequence ``ids``, or (0, None)."""
+        for n in range(len(ids), 0, -1):
+            entry = self.entries.get(ids[:n])
+            if entry is not None:
+                self.entries.move_to_end(ids[:n])
+                return n, entry
+        return 0, None
+
+    def put(self, ids, entry):
+        """Store ``entry`` for ``ids``, evicting old entries to fit the budget."""
+        if ids in self.entries:
+            self.entries.move_to_end(ids)
+            return
+        size = self._size(entry)
+        if size > self.max_bytes:
+            return
+        self.entries[ids] = entry
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.bytes -= self._size(old)
+            self.stats.evictions += 1
+
+    def _prompt_state(self, ids):
+        """(keys, values, logits) for one prompt, computing what is not cached."""
+        self.stats.lookups += 1
+        self.stats.prompt_tokens += len(ids)
+        n, entry = self.longest_prefix(ids)
+        self.stats.reused_tokens += n
+        if n == len(ids):
+            self.stats.hits += 1
+            return entry
+        if n:
+            self.stats.partial_hits += 1
+        cache = self.model.new_cache()
+        if entry is not None:
+            _load(cache, entry[0], entry[1])
+        rest = torch.tensor([ids[n:]], device=self.model.pos_emb.device)
+        logits = self.model.forward_cached(rest, cache)[:, -1]
+        entry = (
+            [k[:, :, : cache.length].clone() for k in cache.k],
+            [v[:, :, : cache.length].clone() for v in cache.v],
+            logits,
+        )
+        self.put(ids, entry)
+        return entry
+
+    @torch.no_grad()
+    def prefill(self, ids):
+        """KV cache and last-position logits for a (B, T) batch of prompts.
+
+        Each distinct row is looked up (or computed and stored) once, so a
+        batch of n samples of one prompt costs a single lookup.
+        """
+        rows, inverse = torch.unique(ids, dim=0, return_inverse=True)
+        states = [self._prompt_state(tuple(row.tolist())) for row in rows]
+        keys, values, logits = zip(*states)
+
+        def gather(parts):
+            return torch.cat(parts).index_select(0, inverse)
+
+        cache = self.model.new_cache()
+        _load(cache, [gather(k) for k in zip(*keys)], [gather(v) for v in zip(*values)])
+        return cache, gather(logits)
+
+
+def _load(cache, keys, values):
+    """Copy per-layer (B, H, T, hd) keys/values into an empty ``cache``."""
+    for i, (k, v) in enumerate(zip(keys, values)):
+        cache.update(i, k, v)
+    cache.length = keys[0].size(2)
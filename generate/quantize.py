@@ -0,0 +1,276 @@
+"""Dynamic int8 quantization of ReviewGen for CPU inference.
+
+    python generate/quantize.py --model review_gen.pt --json heldout.json
+
+quantizes the nn.Linear layers (lm_head and the feed-forward linears), writes
+``review_gen.int8.pt`` (+ ``.json`` config) and reports held-out perplexity,
+per-token decode latency (KV-cached, as generate.py samples) and per-process
+RSS for fp32 vs int8.
+"""
+
+import argparse, ctypes, io, json, math, multiprocessing, resource, sys, time, warnings
+from contextlib import contextmanager
+from pathlib import Path
+
+if not __package__:  # run as a script: import the train package
+    sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+
+def quantize_int8(model):
+    """Dynamically quantize every nn.Linear to int8 weights (activations stay fp32).
+
+    The attention ``out_proj`` is a NonDynamicallyQuantizableLinear and stays
+    fp32, as does the fused ``in_proj`` which is a bare parameter.
+    """
+    import torch
+    import torch.nn as nn
+
+    torch.backends.quantized.engine = _cpu_engine()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # torch.ao.quantization deprecation notice
+        qmodel = torch.ao.quantization.quantize_dynamic(
+            model.cpu().eval(), {nn.Linear}, dtype=torch.qint8
+        )
+    return _without_fastpath(qmodel)
+
+
+@contextmanager
+def mha_fastpath(enabled):
+    """Set the process-wide nn.MultiheadAttention fast path flag for a block."""
+    import torch
+
+    previous = torch.backends.mha.get_fastpath_enabled()
+    torch.backends.mha.set_fastpath_enabled(enabled)
+    try:
+        yield
+    finally:
+        torch.backends.mha.set_fastpath_enabled(previous)
+
+
+def _without_fastpath(qmodel):
+    # The nn.TransformerEncoderLayer fast path reads linear.weight as a tensor;
+    # on a DynamicQuantizedLinear it is a method, so the quantized transformer
+    # runs the regular (module by module) forward. The flag is global, so it is
+    # only switched off while this model's transformer runs.
+    blocks = []
+
+    def enter(module, args):
+        blocks.append(mha_fastpath(False))
+        blocks[-1].__enter__()
+
+    def leave(module, args, output):
+        blocks.pop().__exit__(None, None, None)
+
+    qmodel.transformer.register_forward_pre_hook(enter)
+    qmodel.transformer.register_forward_hook(leave, always_call=True)
+    return qmodel
+
+
+def _cpu_engine():
+    import torch
+
+    engines = torch.backends.quantized.supported_engines
+    for name in ("x86", "fbgemm", "qnnpack"):
+        if name in engines:
+            return name
+    return torch.backends.quantized.engine
+
+
+def save_quantized(qmodel, path):
+    import torch
+    from train.checkpoint import QUANT_KEY, config_path
+
+    torch.save(qmodel.state_dict(), str(path))
+    config = dict(qmodel.config, **{QUANT_KEY: "int8"})
+    config_path(path).write_text(json.dumps(config, indent=2))
+
+
+def load_quantized(path, config=None):
+    """Load a checkpoint written by ``save_quantized``.
+
+    The packed int8 weights can only be loaded into an already quantized
+    module, so the nn.Linear layers of a freshly built model are swapped for
+    empty int8 ones instead of running ``quantize_dynamic`` on throwaway fp32
+    weights (which deep-copies the whole model first).
+    """
+    import torch
+    from train.checkpoint import QUANT_KEY, load_config
+
+    config = dict(config or load_config(path))
+    config.pop(QUANT_KEY, None)
+    qmodel = _int8_skeleton(config)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        qmodel.load_state_dict(torch.load(str(path), map_location="cpu"))
+    release_freed_memory()
+    return qmodel.eval()
+
+
+def release_freed_memory():
+    """Hand freed heap pages back to the OS (glibc only).
+
+    The fp32 skeleton and the unpickled state dict are freed after loading but
+    glibc keeps small/medium blocks in its arenas, so without a trim they stay
+    in every replica's RSS.
+    """
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def _int8_skeleton(config):
+    import torch
+    import torch.nn as nn
+    import torch.ao.nn.quantized.dynamic as nnqd
+    from train import ReviewGen
+
+    torch.backends.quantized.engine = _cpu_engine()
+    # Not built on the meta device: creating meta tensors imports torch._dynamo,
+    # which costs more private memory per process than the fp32 weights do.
+    model = ReviewGen.from_config(config)
+    for parent in list(model.modules()):
+        for name, child in parent.named_children():
+            if type(child) is nn.Linear:  # exact type, as quantize_dynamic does
+                qlinear = nnqd.Linear(
+                    child.in_features,
+                    child.out_features,
+                    bias_=child.bias is not None,
+                    dtype=torch.qint8,
+                )
+                setattr(parent, name, qlinear)
+    return _without_fastpath(model)
+
+
+# ---------- evaluation ----------
+def perplexity(model, ds, bs=32, max_batches=None):
+    import torch
+    import torch.nn.functional as F
+
+    loader = torch.utils.data.DataLoader(ds, batch_size=bs)
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for i, (x, y) in enumerate(loader):
+            if max_batches is not None and i >= max_batches:
+                break
+            logits = model(x)
+            total += F.cross_entropy(
+                logits.reshape(-1, logits.size(-1)), y.reshape(-1), reduction="sum"
+            ).item()
+            count += y.numel()
+    return math.exp(total / count)
+
+
+def ms_per_token(model, vocab_size, ctx_len, n_tokens=64, prompt_len=8):
+    """Greedy decode latency through the KV cache, as ``Sampler`` decodes: one
+    prefill, then one ``forward_cached`` call per token (capped to fit in
+    ``ctx_len``, so the window never slides)."""
+    import torch
+
+    n_tokens = max(1, min(n_tokens, ctx_len - prompt_len))
+    ids = torch.randint(0, vocab_size, (1, prompt_len))
+    with torch.no_grad():
+        model.forward_cached(ids, model.new_cache())  # warm-up
+        cache = model.new_cache()
+        logits = model.forward_cached(ids, cache)[:, -1]
+        t0 = time.perf_counter()
+        for _ in range(n_tokens):
+            next_id = logits.argmax(-1, keepdim=True)
+            logits = model.forward_cached(next_id, cache)[:, -1]
+    return 1000 * (time.perf_counter() - t0) / n_tokens
+
+
+def current_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    # non-Linux: peak RSS is the best we can do (KiB on Linux, bytes on macOS)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rss_probe(path, quantized, q):
+    """Runs in a fresh process: load the model, run one forward and report
+    (RSS, RSS attributable to the model above the bare ``import torch``)."""
+    import torch
+    from train import ReviewGen, load_checkpoint
+
+    torch.set_num_threads(1)
+    base = current_rss_mb()
+    if quantized:
+        model = load_quantized(path)
+    else:
+        model = load_checkpoint(ReviewGen, path)
+        release_freed_memory()
+    with torch.no_grad():
+        model(torch.zeros(1, model.config["ctx_len"], dtype=torch.long))
+    rss = current_rss_mb()
+    q.put((rss, rss - base))
+
+
+def process_rss_mb(path, quantized):
+    ctx = multiprocessing.get_context("spawn")
+    q = ctx.Queue()
+    proc = ctx.Process(target=_rss_probe, args=(str(path), quantized, q))
+    proc.start()
+    rss = q.get()
+    proc.join()
+    return rss
+
+
+def state_dict_mb(model):
+    import torch
+
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return len(buf.getvalue()) / 2**20
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Quantize ReviewGen to int8 and compare")
+    cli.add_argument("--model", default="review_gen.pt", help="fp32 weights")
+    cli.add_argument("--tok", default="tokenizer.json")
+    cli.add_argument("--json", default=None, help="Held-out reviews for perplexity")
+    cli.add_argument("--out", default=None, help="Default: <model>.int8.pt")
+    cli.add_argument("--max-batches", type=int, default=50)
+    args = cli.parse_args(argv)
+
+    from tokenizers import Tokenizer
+    from train import ReviewGen, load_checkpoint, load_config
+    from train.dataset import ReviewLMDataset
+
+    tok = Tokenizer.from_file(args.tok)
+    config = load_config(args.model, vocab_size=len(tok.get_vocab()))
+    model = load_checkpoint(ReviewGen, args.model, **config)
+    ds = None
+    if args.json:
+        ds = ReviewLMDataset(args.json, args.tok, seq_len=config["ctx_len"])
+    report = {}
+
+    def measure(name, m):
+        if ds is not None:
+            report[f"ppl_{name}"] = perplexity(m, ds, max_batches=args.max_batches)
+        report[f"ms_per_token_{name}"] = ms_per_token(
+            m, config["vocab_size"], config["ctx_len"]
+        )
+
+    # fp32 first, before anything quantization-related has touched the process
+    measure("fp32", model)
+    qmodel = quantize_int8(model)
+    out = Path(args.out or Path(args.model).with_suffix(".int8.pt"))
+    save_quantized(qmodel, out)
+    print(
+        f"saved {out} ({state_dict_mb(qmodel):.2f}MB, fp32 {state_dict_mb(model):.2f}MB)"
+    )
+    measure("int8", qmodel)
+    if ds is not None:
+        report["ppl_delta"] = report["ppl_int8"] - report["ppl_fp32"]
+    for name, path in (("fp32", args.model), ("int8", out)):
+        rss, model_rss = process_rss_mb(path, quantized=name == "int8")
+        report[f"rss_mb_{name}"] = rss
+        report[f"model_rss_mb_{name}"] = model_rss
+    print(json.dumps({k: round(v, 4) for k, v in report.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Sampling over an exported ReviewGen decode step (see export.py).
+
+For ``.onnx`` models only numpy and onnxruntime are imported, so a generation
+worker starts without loading PyTorch or the ``train`` package; ``.ts``
+(TorchScript) models need torch but not ``train``. ``generate`` follows
+``sampling.generate_ids``: same sampling pipeline, same rolling-window
+schedule, rows dropped at eos.
+
+    model = ExportedReviewGen("review_gen.onnx")
+    out = generate(model, np.array([[eos_id]]), max_new=80, eos_id=eos_id)
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+class ExportedReviewGen:
+    def __init__(self, path, threads=None):
+        path = Path(path)
+        self.config = json.loads(path.with_suffix(".json").read_text())
+        c = self.config
+        self.head_dim = c["d_model"] // c["n_heads"]
+        if path.suffix == ".onnx":
+            import onnxruntime as ort
+
+            opts = ort.SessionOptions()
+            if threads:
+                opts.intra_op_num_threads = threads
+            self.session = ort.InferenceSession(
+                str(path), opts, providers=["CPUExecutionProvider"]
+            )
+            self._step = self._onnx_step
+        else:
+            import torch
+
+            if threads:
+                torch.set_num_threads(threads)
+            self.module = torch.jit.load(str(path))
+            self._step = self._torchscript_step
+
+    def _onnx_step(self, idx, past_k, past_v):
+        return self.session.run(None, dict(idx=idx, past_k=past_k, past_v=past_v))
+
+    def _torchscript_step(self, idx, past_k, past_v):
+        import torch
+
+        with torch.no_grad():
+            out = self.module(*(torch.from_numpy(a) for a in (idx, past_k, past_v)))
+        return [t.numpy() for t in out]
+
+    def step(self, idx, past_k, past_v):
+        """(B, T) ids after the cached (n_layers, B, H, P, hd) keys/values ->
+        (logits (B, T, vocab), present_k, present_v)."""
+        return self._step(np.ascontiguousarray(idx, dtype=np.int64), past_k, past_v)
+
+    def empty_past(self, batch):
+        c = self.config
+        shape = (c["n_layers"], batch, c["n_heads"], 0, self.head_dim)
+        return np.zeros(shape, np.float32), np.zeros(shape, np.float32)
+
+
+class _Defaults:
+    # same as sampling.SamplingParams, which needs torch to import
+    temperature, top_k, top_p, repetition_penalty = 0.9, 40, 0.9, 1.15
+
+
+def next_token_probs(logits, seen, params):
+    """numpy port of ``sampling.next_token_probs``: temperature, repetition
+    penalty, softmax, top-p, top-k on (B, V) logits."""
+    logits = logits.astype(np.float64) / params.temperature
+    if params.repetition_penalty != 1.0:
+        logits = np.where(seen, logits / params.repetition_penalty, logits)
+    probs = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    probs /= probs.sum(axis=-1, keepdims=True)
+
+    if params.top_p < 1.0:
+        order = np.argsort(-probs, axis=-1, kind="stable")
+        sorted_probs = np.take_along_axis(probs, order, axis=-1)
+        cumulative = np.cumsum(sorted_probs, axis=-1)
+        # shift right so the token that crosses top_p is kept
+        drop = np.zeros_like(sorted_probs, dtype=bool)
+        drop[:, 1:] = cumulative[:, :-1] > params.top_p
+        np.put_along_axis(probs, order, np.where(drop, 0.0, sorted_probs), axis=-1)
+        probs /= probs.sum(axis=-1, keepdims=True)
+
+    k = params.top_k
+    if 0 < k < probs.shape[-1]:
+        kth = np.partition(probs, -k, axis=-1)[:, -k, None]
+        # exactly k survive, as with torch.topk: of the tokens tied with the
+        # k-th value, the lowest ids fill what is left
+        above = probs > kth
+        tied = probs == kth
+        room = k - above.sum(axis=-1, keepdims=True)
+        keep = above | (tied & (np.cumsum(tied, axis=-1) <= room))
+        probs = np.where(keep, probs, 0.0)
+        probs /= probs.sum(axis=-1, keepdims=True)
+    return probs
+
+
+def window_start(start, n, ctx_len, stride):
+    # same schedule as sampling.window_start
+    if n - start > ctx_len:
+        return n - (ctx_len - stride)
+    return start
+
+
+def generate(model, ids, max_new, params=None, eos_id=None, stride=None, rng=None):
+    """Sample up to ``max_new`` tokens after each row of ``ids`` (B, T).
+
+    Returns a list of 1-D int64 arrays (prompt + generated, without eos).
+    """
+    params = params or _Defaults
+    rng = rng or np.random.default_rng()
+    ctx_len, vocab = model.config["ctx_len"], model.config["vocab_size"]
+    stride = stride or max(1, ctx_len // 4)
+    if not 0 < stride < ctx_len:
+        raise ValueError(f"stride must be in (0, ctx_len={ctx_len}), got {stride}")
+
+    history = np.asarray(ids, dtype=np.int64)
+    B = history.shape[0]
+    seen = np.zeros((B, vocab), dtype=bool)
+    np.put_along_axis(seen, history, True, axis=1)
+    alive = np.arange(B)
+    done = [None] * B
+    start, cached = 0, 0  # history index of cache position 0, positions cached
+    past_k, past_v = model.empty_past(B)
+
+    for step in range(max_new):
+        n = history.shape[1]
+        new_start = window_start(start, n, ctx_len, stride)
+        if new_start != start:
+            start, cached = new_start, 0
+            past_k, past_v = model.empty_past(len(alive))
+        logits, past_k, past_v = model.step(
+            history[:, start + cached :], past_k, past_v
+        )
+        cached = n - start
+
+        probs = next_token_probs(logits[:, -1], seen, params)
+        u = rng.random((len(alive), 1))
+        next_ids = (probs.cumsum(axis=-1) < u).sum(axis=-1, keepdims=True)
+        next_ids = np.minimum(next_ids, vocab - 1)
+        history = np.concatenate([history, next_ids], axis=1)
+        np.put_along_axis(seen, next_ids, True, axis=1)
+
+        if eos_id is not None:
+            finished = next_ids[:, 0] == eos_id
+            if finished.any():
+                for row in np.flatnonzero(finished):
+                    done[alive[row]] = history[row, :-1]
+                keep = np.flatnonzero(~finished)
+                alive, history, seen = alive[keep], history[keep], seen[keep]
+                past_k, past_v = past_k[:, keep], past_v[:, keep]
+                if not len(keep):
+                    break
+
+    for row, idx in enumerate(alive):
+        done[idx] = history[row]
+    return done
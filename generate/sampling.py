@@ -0,0 +1,151 @@
+"""Token sampling over ReviewGen's KV cache.
+
+``generate_ids`` runs a batch of sequences with a rolling context window
+(see ``window_start``): the cache holds at most ``ctx_len`` positions, and
+when it fills up the last ``ctx_len - stride`` tokens are re-encoded from
+position 0 and decoding carries on. Memory is fixed, and the re-encode happens once every ``stride``
+tokens, so per-token cost does not grow with output length.
+"""
+
+from dataclasses import dataclass
+
+import torch
+
+
+@dataclass
+class SamplingParams:
+    temperature: float = 0.9
+    top_k: int = 40
+    top_p: float = 0.9
+    repetition_penalty: float = 1.15
+
+
+def next_token_probs(logits, seen, params):
+    """(B, V) logits -> (B, V) sampling distribution.
+
+    Same order as the original loop in generate.py: temperature, repetition
+    penalty on every token already in the sequence, softmax, top-p, top-k.
+    ``seen`` is a (B, V) bool mask of tokens in each sequence so far.
+    """
+    logits = logits / params.temperature
+    if params.repetition_penalty != 1.0:
+        logits = torch.where(seen, logits / params.repetition_penalty, logits)
+    probs = torch.softmax(logits, dim=-1)
+
+    if params.top_p < 1.0:
+        sorted_probs, sorted_idx = torch.sort(probs, dim=-1, descending=True)
+        cumulative = torch.cumsum(sorted_probs, dim=-1)
+        # shift right so the token that crosses top_p is kept
+        mask = torch.cat(
+            [
+                torch.zeros_like(cumulative[:, :1], dtype=torch.bool),
+                cumulative[:, :-1] > params.top_p,
+            ],
+            dim=-1,
+        )
+        sorted_probs = sorted_probs.masked_fill(mask, 0.0)
+        probs = torch.zeros_like(probs).scatter_(-1, sorted_idx, sorted_probs)
+        probs = _renormalise(probs)
+
+    if params.top_k > 0:
+        topk_probs, topk_idx = torch.topk(probs, min(params.top_k, probs.size(-1)))
+        probs = torch.zeros_like(probs).scatter_(-1, topk_idx, topk_probs)
+        probs = _renormalise(probs)
+
+    return probs
+
+
+def _renormalise(probs):
+    total = probs.sum(dim=-1, keepdim=True)
+    return torch.where(total > 0, probs / total.clamp_min(1e-30), probs)
+
+
+def seen_mask(ids, vocab_size):
+    return torch.zeros(
+        ids.size(0), vocab_size, dtype=torch.bool, device=ids.device
+    ).scatter_(1, ids, True)
+
+
+def window_start(start, n, ctx_len, stride):
+    """Start of the context window used to predict history index ``n``.
+
+    The window ``[start, n)`` is kept until it would exceed ``ctx_len``, then
+    jumps so that the last ``ctx_len - stride`` tokens remain. Every decoder
+    (plain, speculative, beam) uses this one schedule, so they all condition
+    on exactly the same context at every position.
+    """
+    if n - start > ctx_len:
+        return n - (ctx_len - stride)
+    return start
+
+
+def advance(model, history, cache, start, stride):
+    """Last-position logits after ``history``, plus the (possibly moved)
+    window start. Feeds only the tokens missing from ``cache`` unless the
+    window slides, in which case the cache is rebuilt from the new start."""
+    n = history.size(1)
+    new_start = window_start(start, n, cache.max_len, stride)
+    if new_start != start or cache.length == 0:
+        cache.reset()
+        pending = history[:, new_start:]
+    else:
+        pending = history[:, start + cache.length :]
+    return model.forward_cached(pending, cache)[:, -1], new_start
+
+
+def check_stride(stride, ctx_len):
+    stride = stride or max(1, ctx_len // 4)
+    if not 0 < stride < ctx_len:
+        raise ValueError(f"stride must be in (0, ctx_len={ctx_len}), got {stride}")
+    return stride
+
+
+@torch.no_grad()
+def generate_ids(
+    model, ids, max_new, params=None, eos_id=None, stride=None, prefix_cache=None
+):
+    """Sample up to ``max_new`` tokens after each row of ``ids`` (B, T).
+
+    Rows that emit ``eos_id`` stop and are dropped from the batch. Returns a
+    list of 1-D tensors (prompt + generated, without the trailing eos).
+    ``prefix_cache`` (a ``prefix_cache.PrefixCache`` for ``model``) supplies
+    the prompt's KV state when it has been seen before.
+    """
+    params = params or SamplingParams()
+    stride = check_stride(stride, model.config["ctx_len"])
+    vocab = model.config["vocab_size"]
+
+    history = ids
+    seen = seen_mask(ids, vocab)
+    alive = torch.arange(ids.size(0), device=ids.device)
+    done = [None] * ids.size(0)
+    if prefix_cache is not None and ids.size(1) <= model.config["ctx_len"]:
+        cache, logits = prefix_cache.prefill(ids)
+        start = 0
+    else:
+        cache = model.new_cache()
+        logits, start = advance(model, ids, cache, 0, stride)
+
+    for step in range(max_new):
+        probs = next_token_probs(logits, seen, params)
+        next_ids = torch.multinomial(probs, num_samples=1)
+        history = torch.cat([history, next_ids], dim=1)
+        seen.scatter_(1, next_ids, True)
+
+        if eos_id is not None:
+            finished = next_ids[:, 0] == eos_id
+            if finished.any():
+                for row in finished.nonzero()[:, 0].tolist():
+                    done[alive[row].item()] = history[row, :-1]
+                keep = (~finished).nonzero()[:, 0]
+                alive, history, seen = alive[keep], history[keep], seen[keep]
+                if keep.numel() == 0:
+                    break
+                cache.select(keep)
+        if step == max_new - 1:
+            break
+        logits, start = advance(model, history, cache, start, stride)
+
+    for row, idx in enumerate(alive.tolist()):
+        done[idx] = history[row]
+    return done
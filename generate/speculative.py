@@ -0,0 +1,180 @@
+"""Speculative sampling with a small draft ReviewGen (Leviathan et al. / Chen et al.).
+
+The draft proposes ``k`` tokens one at a time; the target scores all of them
+in a single ``forward_cached`` call and each proposal is accepted with
+probability ``min(1, p/q)``. On rejection a replacement is drawn from
+``norm(max(p - q, 0))``; if all are accepted a bonus token comes from the
+target's last position. ``p`` and ``q`` are the final sampling distributions
+(temperature, repetition penalty, top-p, top-k all applied), so the output is
+distributed exactly as ``sampling.generate_ids`` with the target alone.
+"""
+
+from dataclasses import dataclass
+
+import torch
+import torch.nn.functional as F
+
+from generate.sampling import (
+    SamplingParams,
+    check_stride,
+    next_token_probs,
+    seen_mask,
+    window_start,
+)
+
+
+@dataclass
+class SpecStats:
+    rounds: int = 0
+    drafted: int = 0
+    accepted: int = 0
+    generated: int = 0
+
+    @property
+    def acceptance_rate(self):
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_target_forward(self):
+        return self.generated / self.rounds if self.rounds else 0.0
+
+
+class _Decoder:
+    """A model + KV cache that tracks which history tokens the cache holds.
+
+    ``start`` is the history index at cache position 0. The target follows
+    ``sampling.window_start`` exactly; the draft only has to produce *some*
+    proposal distribution, so it simply slides early enough to fit a round.
+    """
+
+    def __init__(self, model, stride):
+        self.model = model
+        self.cache = model.new_cache()
+        self.ctx_len = self.cache.max_len
+        self.stride = check_stride(stride, self.ctx_len)
+        self.start = 0
+
+    @property
+    def end(self):
+        return self.start + self.cache.length
+
+    def _run(self, history, start):
+        if start != self.start or self.cache.length == 0:
+            self.start = start
+            self.cache.reset()
+        return self.model.forward_cached(history[:, self.end :], self.cache)
+
+    def draft_step(self, history, reserve):
+        """Last-position logits, leaving cache room for ``reserve`` more tokens."""
+        start = self.start
+        if history.size(1) - start + reserve > self.ctx_len:
+            start = history.size(1) - (self.ctx_len - max(self.stride, reserve))
+        return self._run(history, start)[:, -1]
+
+    def verify_window(self, n):
+        """(window start, max drafts) for predicting history index ``n`` onwards:
+        every verified position has to share the window plain sampling uses."""
+        start = window_start(self.start, n, self.ctx_len, self.stride)
+        return start, self.ctx_len - (n - start)
+
+    def verify(self, history, start, n_tokens):
+        """Logits for the last ``n_tokens`` positions of ``history``."""
+        return self._run(history, start)[:, -n_tokens:]
+
+    def rewind(self, n_valid):
+        """Drop cached positions past history index ``n_valid``."""
+        self.cache.crop(max(0, n_valid - self.start))
+
+
+@torch.no_grad()
+def speculative_generate(
+    target, draft, ids, max_new, params=None, k=4, eos_id=None, stride=None
+):
+    """Sample up to ``max_new`` tokens after ``ids`` (1, T).
+
+    Returns (prompt + generated ids as a 1-D tensor, SpecStats).
+    """
+    if ids.size(0) != 1:
+        raise ValueError("speculative_generate decodes one sequence at a time")
+    if target.config["vocab_size"] != draft.config["vocab_size"]:
+        raise ValueError("draft and target must share a tokenizer")
+    k = min(k, draft.config["ctx_len"] - 1, target.config["ctx_len"] - 1)
+    params = params or SamplingParams()
+    vocab = target.config["vocab_size"]
+    tgt, dft = _Decoder(target, stride), _Decoder(draft, stride)
+    stats = SpecStats()
+
+    history = ids
+    seen = seen_mask(ids, vocab)
+
+    n_new = 0
+    while n_new < max_new:
+        n = history.size(1)  # index of the first token this round predicts
+        start, room = tgt.verify_window(n)
+        n_draft = min(k, max_new - n_new - 1, room)
+        # ---- draft proposes n_draft tokens ----
+        ext, ext_seen = history, seen.clone()
+        drafts, q = [], []
+        for j in range(n_draft):
+            logits = dft.draft_step(ext, reserve=n_draft - 1 - j)
+            q_j = next_token_probs(logits, ext_seen, params)
+            d = torch.multinomial(q_j, num_samples=1)
+            drafts.append(d)
+            q.append(q_j)
+            ext = torch.cat([ext, d], dim=1)
+            ext_seen = ext_seen.scatter(1, d, True)
+            if eos_id is not None and d.item() == eos_id:
+                break  # nothing after eos is kept, so don't propose it
+        n_draft = len(drafts)
+
+        # ---- target scores them in one forward ----
+        # positions: the last history token, then each draft
+        logits = tgt.verify(ext, start, n_draft + 1)
+        stats.rounds += 1
+        stats.drafted += n_draft
+
+        # p for every verified position in one call; row j conditions on
+        # the history plus the first j drafts (for the repetition penalty)
+        drafted = torch.cat(drafts, dim=1)[0] if drafts else ids.new_empty(0)
+        prefix = torch.zeros(n_draft + 1, vocab, dtype=torch.bool, device=ids.device)
+        if n_draft:
+            prefix[1:] = F.one_hot(drafted, vocab).cumsum(0).bool()
+        p = next_token_probs(logits[0], seen | prefix, params)
+
+        # accept draft j while u_j * q_j(d_j) < p_j(d_j)
+        n_ok = 0
+        if n_draft:
+            q = torch.cat(q)
+            rows = torch.arange(n_draft, device=ids.device)
+            u = torch.rand(n_draft, device=ids.device)
+            ok = u * q[rows, drafted] < p[rows, drafted]
+            n_ok = int(ok.long().cumprod(0).sum())
+        accepted = drafted[:n_ok]
+        if eos_id is not None and (accepted == eos_id).any():
+            accepted = accepted[: (accepted == eos_id).nonzero()[0, 0] + 1]
+            new_token = None
+        elif n_ok < n_draft:
+            residual = (p[n_ok] - q[n_ok]).clamp_min(0)
+            total = residual.sum()
+            dist = residual / total if total > 0 else p[n_ok]
+            new_token = torch.multinomial(dist, num_samples=1)
+        else:
+            new_token = torch.multinomial(p[n_draft], num_samples=1)
+
+        stats.accepted += len(accepted)
+        n_valid = history.size(1) + len(accepted)  # cache may hold these
+        pieces = [accepted] if new_token is None else [accepted, new_token]
+        new = torch.cat(pieces)[: max_new - n_new].unsqueeze(0)
+        history = torch.cat([history, new], dim=1)
+        seen = seen.scatter(1, new, True)
+        n_new += new.size(1)
+        stats.generated += new.size(1)
+        tgt.rewind(n_valid)
+        dft.rewind(n_valid)
+
+        if eos_id is not None and (new[0] == eos_id).any():
+            cut = (new[0] == eos_id).nonzero()[0, 0].item()
+            history = history[:, : history.size(1) - new.size(1) + cut]
+            break
+
+    return history[0], stats
@@ -0,0 +1,334 @@
+"""SQLite store for scraped reviews.
+
+One database file replaces the per-restaurant JSON files. It runs in WAL mode,
+so several scraper processes can write while exports read. Restaurants are
+unique on (name, address) and reviews on a hash of (restaurant, reviewer, date,
+text), so re-scraping a restaurant only adds what is new. Review ids only
+grow, which is what incremental exports key on.
+
+    python scrape_reviews/review_store.py reviews.db import restaurant_reviews/
+    python scrape_reviews/review_store.py reviews.db export --shard-dir shards
+    python scrape_reviews/review_store.py reviews.db export --json master.json
+    python scrape_reviews/review_store.py reviews.db search "bottomless brunch"
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restaurants (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    address TEXT NOT NULL DEFAULT '',
+    cuisine TEXT NOT NULL DEFAULT '',
+    rating TEXT NOT NULL DEFAULT '',
+    UNIQUE (name, address)
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    restaurant_id INTEGER NOT NULL REFERENCES restaurants(id),
+    review_key BLOB NOT NULL UNIQUE,
+    reviewer_name TEXT NOT NULL DEFAULT '',
+    rating INTEGER,
+    text TEXT NOT NULL DEFAULT '',
+    date TEXT NOT NULL DEFAULT '',
+    scraped_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_restaurant ON reviews(restaurant_id);
+CREATE INDEX IF NOT EXISTS reviews_rating ON reviews(rating);
+CREATE INDEX IF NOT EXISTS reviews_date ON reviews(date);
+CREATE INDEX IF NOT EXISTS restaurants_cuisine ON restaurants(cuisine);
+CREATE TABLE IF NOT EXISTS exports (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+# external-content FTS5 index over reviews.text, kept in sync by triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    text, content='reviews', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS reviews_fts_insert AFTER INSERT ON reviews BEGIN
+    INSERT INTO reviews_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_fts_delete AFTER DELETE ON reviews BEGIN
+    INSERT INTO reviews_fts(reviews_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# the field names the scraper's JSON files (and master.json) use
+EXPORT_QUERY = """
+SELECT r.id, r.reviewer_name, r.rating, r.text, r.date,
+       s.name, s.rating, s.address, s.cuisine
+FROM reviews r JOIN restaurants s ON s.id = r.restaurant_id
+WHERE r.id > ? ORDER BY r.id
+"""
+EXPORT_FIELDS = [
+    "reviewer_name",
+    "rating",
+    "text",
+    "date",
+    "restaurant_name",
+    "restaurant_rating",
+    "restaurant_address",
+    "restaurant_cuisine",
+]
+
+
+def review_key(restaurant_id, review):
+    """Identity of a review: the scraper's (reviewer, text, date) dedup key,
+    scoped to the restaurant. Hashed so the unique index stays small."""
+    parts = [
+        str(restaurant_id),
+        review.get("reviewer_name", ""),
+        review.get("date", ""),
+        review.get("text", ""),
+    ]
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).digest()
+
+
+class ReviewStore:
+    def __init__(self, path, timeout=60):
+        self.path = str(path)
+        # concurrent writers wait on the lock for up to `timeout` seconds
+        self.conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # durable at checkpoints; fine for a scrape
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.fts = self._create_fts()
+
+    def _create_fts(self):
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"FTS5 unavailable ({e}); full-text search disabled")
+            return False
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def transaction(self):
+        return _Transaction(self.conn)
+
+    def restaurant_id(self, name, address="", cuisine="", rating=""):
+        """Id of the (name, address) restaurant, creating it if needed."""
+        self.conn.execute(
+            "INSERT INTO restaurants (name, address, cuisine, rating) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name, address) DO UPDATE SET "
+            "cuisine = CASE WHEN excluded.cuisine != '' THEN excluded.cuisine ELSE cuisine END, "
+            "rating = CASE WHEN excluded.rating != '' THEN excluded.rating ELSE rating END",
+            (name, address or "", cuisine or "", str(rating or "")),
+        )
+        return self.conn.execute(
+            "SELECT id FROM restaurants WHERE name = ? AND address = ?",
+            (name, address or ""),
+        ).fetchone()[0]
+
+    def add_reviews(self, reviews):
+        """Insert scraper review dicts in one transaction; returns how many were new.
+
+        Each dict carries its restaurant in the ``restaurant_*`` fields, as the
+        scraper and master.json have them.
+        """
+        now = time.time()
+        with self.transaction():
+            ids = {}
+            rows = []
+            for review in reviews:
+                place = (
+                    review.get("restaurant_name", ""),
+                    review.get("restaurant_address", ""),
+                )
+                if place not in ids:
+                    ids[place] = self.restaurant_id(
+                        *place,
+                        cuisine=review.get("restaurant_cuisine", ""),
+                        rating=review.get("restaurant_rating", ""),
+                    )
+                rid = ids[place]
+                rows.append(
+                    (
+                        rid,
+                        review_key(rid, review),
+                        review.get("reviewer_name", ""),
+                        review.get("rating"),
+                        review.get("text", ""),
+                        review.get("date", ""),
+                        now,
+                    )
+                )
+            cur = self.conn.executemany(
+                "INSERT OR IGNORE INTO reviews "
+                "(restaurant_id, review_key, reviewer_name, rating, text, date, scraped_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return cur.rowcount  # ignored duplicates don't count
+
+    def import_json(self, paths):
+        """Load the scraper's old ``*_reviews.json`` files (or master.json)."""
+        total = 0
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                total += self.add_reviews(json.load(f))
+        return total
+
+    def iter_reviews(self, since_id=0, batch_size=10000):
+        """(id, review dict) in id order for every review after ``since_id``."""
+        cur = self.conn.execute(EXPORT_QUERY, (since_id,))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row[0], dict(zip(EXPORT_FIELDS, row[1:]))
+
+    def export_json(self, path):
+        """Full export as one JSON array in the master.json format."""
+        n = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for _, review in self.iter_reviews():
+                f.write(",\n" if n else "\n")
+                f.write(json.dumps(review, ensure_ascii=False))
+                n += 1
+            f.write("\n]\n")
+        return n
+
+    def export_shard(self, shard_dir, name="corpus"):
+        """Write reviews added since the last export called ``name`` to a new
+        JSONL shard in ``shard_dir``; returns (path or None, count).
+
+        The shards together are the whole corpus, so ``train.py --shards``
+        picks new data up without re-reading anything already exported.
+        """
+        row = self.conn.execute(
+            "SELECT last_id FROM exports WHERE name = ?", (name,)
+        ).fetchone()
+        last_id = row[0] if row else 0
+        os.makedirs(shard_dir, exist_ok=True)
+        tmp = os.path.join(shard_dir, f".{name}.partial")
+        first = last = None
+        n = 0
+        with open(tmp, "w", encoding="utf-8") as f:
+            for review_id, review in self.iter_reviews(last_id):
+                first = review_id if first is None else first
+                last = review_id
+                f.write(json.dumps(review, ensure_ascii=False) + "\n")
+                n += 1
+        if not n:
+            os.remove(tmp)
+            return None, 0
+        path = os.path.join(shard_dir, f"{name}-{first:09d}-{last:09d}.jsonl")
+        os.replace(tmp, path)
+        with self.transaction():
+            self.conn.execute(
+                "INSERT INTO exports (name, last_id) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id",
+                (name, last),
+            )
+        return path, n
+
+    def search(self, query, limit=20):
+        """Reviews matching an FTS5 ``query``, best match first."""
+        if not self.fts:
+            raise RuntimeError("this SQLite build has no FTS5")
+        return self.conn.execute(
+            "SELECT s.name, r.rating, r.text FROM reviews_fts "
+            "JOIN reviews r ON r.id = reviews_fts.rowid "
+            "JOIN restaurants s ON s.id = r.restaurant_id "
+            "WHERE reviews_fts MATCH ? ORDER BY rank LIMIT ?",
+            (query, limit),
+        ).fetchall()
+
+    def stats(self):
+        q = lambda sql: self.conn.execute(sql).fetchone()[0]
+        return {
+            "restaurants": q("SELECT COUNT(*) FROM restaurants"),
+            "reviews": q("SELECT COUNT(*) FROM reviews"),
+            "with_text": q("SELECT COUNT(*) FROM reviews WHERE text != ''"),
+        }
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT; takes the write lock up front so concurrent
+    writers queue on busy_timeout instead of failing mid-transaction."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite review store")
+    parser.add_argument("db", help="Database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Import scraper JSON files")
+    imp.add_argument("paths", nargs="+", help="JSON files or directories of them")
+    exp = sub.add_parser("export", help="Export the training corpus")
+    exp.add_argument("--json", help="Write everything as one master.json-style array")
+    exp.add_argument(
+        "--shard-dir", help="Write reviews new since the last export as a JSONL shard"
+    )
+    exp.add_argument("--name", default="corpus", help="Name of the incremental export")
+    srch = sub.add_parser("search", help="Full-text search")
+    srch.add_argument("query")
+    srch.add_argument("--limit", type=int, default=20)
+    sub.add_parser("stats")
+    args = parser.parse_args(argv)
+
+    with ReviewStore(args.db) as store:
+        if args.command == "import":
+            paths = []
+            for p in args.paths:
+                paths += (
+                    sorted(glob.glob(os.path.join(p, "*.json")))
+                    if os.path.isdir(p)
+                    else [p]
+                )
+            print(
+                f"Imported {store.import_json(paths)} new reviews from {len(paths)} files"
+            )
+        elif args.command == "export":
+            t0 = time.perf_counter()
+            if args.json:
+                n = store.export_json(args.json)
+                print(f"Exported {n} reviews to {args.json}")
+            if args.shard_dir:
+                path, n = store.export_shard(args.shard_dir, args.name)
+                print(
+                    f"Exported {n} new reviews to {path}"
+                    if n
+                    else "No new reviews since the last export"
+                )
+            print(f"Export took {time.perf_counter() - t0:.2f}s")
+        elif args.command == "search":
+            for name, rating, text in store.search(args.query, args.limit):
+                print(f"[{name}, {rating}*] {text[:200]}")
+        else:
+            print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,45 @@ import json
 import os
 import time
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import sys
 import argparse
 import tempfile
+import shutil
+from pathlib import Path
+
+if not __package__:  # run as a script: import the scrape_reviews package
+    sys.path.insert(0, str(Path(__file__).parent.parent.absolute()))
+
+from scrape_reviews.review_store import ReviewStore
+
+webdriver = Options = Service = By = WebDriverWait = EC = None
+
+def _import_selenium():
+    """selenium is only needed once a browser starts, not for --help"""
+    global webdriver, Options, Service, By, WebDriverWait, EC
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
 
 OUTPUT_DIR = "restaurant_reviews"
+DB_PATH = "restaurant_reviews.db"
 DEBUG_DIR = "debug"
 MAX_REVIEWS_PER_RESTAURANT = 1000
+RECYCLE_EVERY = 25  # restaurants per browser before it is restarted
+MAX_BROWSER_MB = 1500  # restart early once the browser's memory passes this
+
+# requests the scraper never needs: images, map tiles, fonts, audio/video.
+# Chrome DevTools URL patterns, '*' matches anything
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3", "*.m3u8",
+    "*/maps/vt*", "*/kh/v=*", "*/vt/lyrs=*", "*/maps/preview/photo*",
+    "*streetviewpixels*", "*/a-/*", "*/p/AF1Qip*",
+]
 
 def find_chrome_executable():
     possible_locations = [
@@ -28,8 +55,9 @@ def find_chrome_executable():
             return location
     return "/usr/bin/chromium-browser"
 
-def setup_driver():
+def setup_driver(block_resources=True):
     """Setup Chrome browser with appropriate options"""
+    temp_dir = None
     try:
         print("Setting up Chrome driver...")
         
@@ -52,6 +80,14 @@ def setup_driver():
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option("useAutomationExtension", False)
         
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_argument("--mute-audio")
+        if block_resources:
+            chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+            chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        # network events, read back by transfer_stats() for bytes per restaurant
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        
         chromedriver_path = "/usr/bin/chromedriver"
         print(f"Using chromedriver at: {chromedriver_path}")
         
@@ -61,13 +97,79 @@ def setup_driver():
         
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
+        driver.execute_cdp_cmd("Network.enable", {})
+        if block_resources:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            print(f"Blocking {len(BLOCKED_URL_PATTERNS)} URL patterns (images, tiles, fonts, media)")
+        
+        driver.profile_dir = temp_dir
         return driver
     except Exception as e:
         print(f"Error setting up driver: {e}")
         import traceback
         traceback.print_exc()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
         return None
 
+def close_driver(driver):
+    """Quit the browser and delete its temporary profile directory"""
+    try:
+        driver.quit()
+        print("Browser closed")
+    except Exception as e:
+        print(f"Error closing browser: {e}")
+    profile_dir = getattr(driver, "profile_dir", None)
+    if profile_dir:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+def browser_memory_mb(driver):
+    """Memory of chromedriver and every browser process under it, in MB.
+
+    Uses PSS from /proc (shared pages are split between the processes that
+    map them, so the renderers aren't counted several times). Linux only;
+    returns None elsewhere.
+    """
+    try:
+        root = driver.service.process.pid
+        children = {}
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(pid))
+            except (OSError, ValueError, IndexError):
+                continue
+        total_kb, stack = 0, [root]
+        while stack:
+            pid = stack.pop()
+            stack.extend(children.get(pid, []))
+            try:
+                with open(f"/proc/{pid}/smaps_rollup") as f:
+                    total_kb += next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+            except (OSError, StopIteration):
+                continue
+        return total_kb / 1024
+    except Exception:
+        return None
+
+def transfer_stats(driver):
+    """Bytes received, requests finished and requests blocked since the last call"""
+    stats = {"bytes": 0, "requests": 0, "blocked": 0}
+    try:
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            if message["method"] == "Network.loadingFinished":
+                stats["bytes"] += message["params"].get("encodedDataLength", 0)
+                stats["requests"] += 1
+            elif message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                stats["blocked"] += 1
+    except Exception as e:
+        print(f"Could not read network log: {e}")
+    return stats
+
 def handle_cookie_consent(driver, restaurant_name):
     """Handle cookie consent dialog if present"""
     try:
@@ -589,10 +691,8 @@ def process_restaurant(driver, restaurant_name, restaurant_data, debug=False):
         traceback.print_exc()
         return [], restaurant_data
 
-def main():
+def main(argv=None):
     """Main function to run the scraper"""
-    print("Initializing Google Maps Review Scraper...")
-    
     parser = argparse.ArgumentParser(description='Google Maps Restaurant Review Scraper')
     parser.add_argument('--csv', type=str, default="restaurants.csv", 
                         help='CSV file with restaurant data (default: restaurants.csv)')
@@ -602,15 +702,32 @@ def main():
                         help='Index of first restaurant to process (default: 0, starts from beginning)')
     parser.add_argument('--debug', action='store_true', 
                         help='Enable debug mode with screenshots and HTML dumps')
-    args = parser.parse_args()
+    parser.add_argument('--db', type=str, default=DB_PATH,
+                        help=f'SQLite review store to write to; several scrapers can share one (default: {DB_PATH})')
+    parser.add_argument('--json-files', action='store_true',
+                        help=f'Also write one JSON file per restaurant into {OUTPUT_DIR}/')
+    parser.add_argument('--recycle-every', type=int, default=RECYCLE_EVERY,
+                        help=f'Restart the browser after this many restaurants (default: {RECYCLE_EVERY})')
+    parser.add_argument('--max-browser-mb', type=float, default=MAX_BROWSER_MB,
+                        help=f'Restart the browser once it uses more memory than this (default: {MAX_BROWSER_MB})')
+    parser.add_argument('--no-block', action='store_true',
+                        help='Load images, map tiles, fonts and media (blocked by default)')
+    args = parser.parse_args(argv)
+    
+    print("Initializing Google Maps Review Scraper...")
+    _import_selenium()
         
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if args.json_files:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
     if args.debug:
         os.makedirs(DEBUG_DIR, exist_ok=True)
     
     driver = None
+    store = ReviewStore(args.db)
+    total_bytes = 0
     try:
-        driver = setup_driver()
+        driver = setup_driver(block_resources=not args.no_block)
+        restaurants_on_driver = 0
         if not driver:
             print("Driver setup failed. Exiting...")
             return
@@ -658,10 +775,33 @@ def main():
                     restaurant_data[key] = value
             
             if reviews:
-                filename = f"{OUTPUT_DIR}/{restaurant_name.replace(' ', '_')}_reviews.json"
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(reviews, f, indent=2, ensure_ascii=False)
-                print(f"Saved {len(reviews)} reviews to {filename}")
+                added = store.add_reviews(reviews)
+                print(f"Saved {len(reviews)} reviews to {args.db} ({added} new)")
+                if args.json_files:
+                    safe_name = re.sub(r'[^\w.-]+', '_', restaurant_name)
+                    filename = f"{OUTPUT_DIR}/{safe_name}_{global_index}_reviews.json"
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        json.dump(reviews, f, ensure_ascii=False)
+                    print(f"Saved {len(reviews)} reviews to {filename}")
+            
+            net = transfer_stats(driver)
+            memory = browser_memory_mb(driver)
+            total_bytes += net["bytes"]
+            memory_text = f"{memory:.0f}MB" if memory is not None else "unknown"
+            print(f"Transferred {net['bytes'] / 1e6:.2f}MB in {net['requests']} requests "
+                  f"({net['blocked']} blocked), browser memory {memory_text}")
+            
+            restaurants_on_driver += 1
+            over_memory = memory is not None and memory > args.max_browser_mb
+            if restaurants_on_driver >= args.recycle_every or over_memory:
+                reason = "memory limit" if over_memory else f"{restaurants_on_driver} restaurants"
+                print(f"Recycling browser ({reason})")
+                close_driver(driver)
+                driver = setup_driver(block_resources=not args.no_block)
+                restaurants_on_driver = 0
+                if not driver:
+                    print("Driver setup failed. Exiting...")
+                    return
             
         
     except Exception as e:
@@ -669,12 +809,10 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
+        store.close()
+        print(f"Total transferred: {total_bytes / 1e6:.1f}MB")
         if driver:
-            try:
-                driver.quit()
-                print("Browser closed")
-            except:
-                pass
+            close_driver(driver)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture
+def small_model():
+    """Factory for a seeded 50-token ReviewGen in eval mode."""
+    import torch
+    from train import ReviewGen
+
+    def build(ctx_len=16):
+        torch.manual_seed(0)
+        return ReviewGen(50, ctx_len=ctx_len, d_model=32, n_heads=2, n_layers=2).eval()
+
+    return build
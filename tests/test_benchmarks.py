@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("torch")
+
+sys.path.append(str(Path(__file__).parent.parent / "benchmarks"))
+
+from bench_suite import compare
+from synthetic_corpus import synthetic_reviews
+from train.pre_tokenisation import clean_reviews
+
+
+def test_synthetic_corpus_is_deterministic_and_noisy():
+    reviews = synthetic_reviews(2000, seed=1)
+    assert reviews == synthetic_reviews(2000, seed=1)
+    texts = [r["text"] for r in reviews]
+    kept = list(clean_reviews(texts))
+    assert 0.7 * len(texts) < len(kept) < len(texts)
+
+
+def test_compare_flags_regressions_in_the_right_direction():
+    baseline = {"train.small.tokens_per_s": 1000.0, "generate.ms_per_token": 10.0}
+    results = {
+        "train.small.tokens_per_s": 800.0,  # slower: worse
+        "generate.ms_per_token": 8.0,  # faster: better
+        "generate.ttft_ms": 5.0,
+    }
+    status = {r[0]: r[-1] for r in compare(results, baseline, tolerance=0.1)}
+    assert status == {
+        "train.small.tokens_per_s": "REGRESSION",
+        "generate.ms_per_token": "ok",
+        "generate.ttft_ms": "new",
+    }
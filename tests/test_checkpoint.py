@@ -0,0 +1,53 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from train import ReviewGen, load_checkpoint, save_checkpoint
+
+
+@pytest.mark.parametrize("tie", [False, True])
+@pytest.mark.parametrize("mmap,lazy", [(True, False), (False, False), (True, True)])
+def test_roundtrip_matches_eager(tmp_path, tie, mmap, lazy):
+    model = ReviewGen(97, ctx_len=16, d_model=32, n_layers=1, tie_weights=tie).eval()
+    path = save_checkpoint(model, tmp_path / "m.pt")
+    assert (tmp_path / "m.json").exists()
+
+    loaded = load_checkpoint(ReviewGen, path, mmap=mmap, lazy=lazy)
+    x = torch.randint(0, 97, (2, 16))
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(x), model(x))
+    if tie:
+        assert loaded.lm_head.weight is loaded.tok_emb.weight
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_safetensors_roundtrip_matches_eager(tmp_path, mmap):
+    pytest.importorskip("safetensors")
+    model = ReviewGen(97, ctx_len=16, d_model=32, n_layers=1, tie_weights=True).eval()
+    path = save_checkpoint(model, tmp_path / "m.safetensors")
+    loaded = load_checkpoint(ReviewGen, path, mmap=mmap)
+    x = torch.randint(0, 97, (2, 16))
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(x), model(x))
+    assert loaded.lm_head.weight is loaded.tok_emb.weight
+
+
+@pytest.mark.parametrize("tie", [False, True])
+def test_quantized_roundtrip_matches_and_keeps_fastpath(tmp_path, tie):
+    from generate.quantize import (
+        load_quantized,
+        ms_per_token,
+        quantize_int8,
+        save_quantized,
+    )
+
+    fastpath = torch.backends.mha.get_fastpath_enabled()
+    model = ReviewGen(97, ctx_len=16, d_model=32, n_layers=1, tie_weights=tie).eval()
+    qmodel = quantize_int8(model)
+    save_quantized(qmodel, tmp_path / "m.int8.pt")
+    loaded = load_quantized(tmp_path / "m.int8.pt")
+    x = torch.randint(0, 97, (2, 16))
+    with torch.no_grad():
+        torch.testing.assert_close(loaded(x), qmodel(x))
+    assert torch.backends.mha.get_fastpath_enabled() == fastpath
+    assert ms_per_token(loaded, 97, 16, n_tokens=4) > 0  # decodes through the cache
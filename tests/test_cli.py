@@ -0,0 +1,48 @@
+import subprocess, sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT / "benchmarks"))
+
+from bench_import_time import BUDGETS_MS, LIGHT_MS, parse_importtime
+from cli import COMMANDS, main
+
+LIGHT = [name for name, budget in BUDGETS_MS.items() if budget == LIGHT_MS]
+
+
+def test_usage_lists_every_command(capsys):
+    assert main([]) == 2
+    assert main(["nope"]) == 2
+    out = capsys.readouterr()
+    assert all(name in out.out for name in COMMANDS)
+    assert "unknown command 'nope'" in out.err
+
+
+@pytest.mark.parametrize("command", LIGHT)
+def test_help_does_not_import_torch(command):
+    code = (
+        "import sys; from cli import main\n"
+        "try: main([sys.argv[1], '--help'])\n"
+        "except SystemExit: pass\n"
+        "print('torch' in sys.modules)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code, command],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        check=True,
+    ).stdout
+    assert out.strip().endswith("False"), out
+
+
+def test_parse_importtime_keeps_top_level_imports():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:       300 |        420 | io\n"
+        "import time:        50 |       2000 | train.presets\n"
+    )
+    assert parse_importtime(stderr) == [("io", 420), ("train.presets", 2000)]
@@ -0,0 +1,54 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from generate.sampling import SamplingParams, generate_ids
+
+
+def exported(model, tmp_path, fmt):
+    if fmt == "onnx":
+        pytest.importorskip("onnxscript")
+        pytest.importorskip("onnxruntime")
+    from generate.export import FORMATS, export
+    from generate.runtime import ExportedReviewGen
+
+    path = export(model, tmp_path / f"model{FORMATS[fmt]}", fmt)
+    return ExportedReviewGen(path)
+
+
+@pytest.mark.parametrize("fmt", ["torchscript", "onnx"])
+def test_exported_step_matches_eager(tmp_path, fmt, small_model):
+    from generate.export import parity
+
+    model = small_model()
+    runtime_model = exported(model, tmp_path, fmt)
+    assert parity(model, runtime_model, batch=3) < 1e-4
+
+
+def test_runtime_greedy_matches_generate_ids(tmp_path, small_model):
+    from generate.runtime import generate
+
+    model = small_model(ctx_len=16)
+    runtime_model = exported(model, tmp_path, "torchscript")
+    ids = torch.randint(0, 50, (2, 4))
+    params = SamplingParams(top_k=1)
+    ref = generate_ids(model, ids, max_new=40, params=params)  # slides the window
+    out = generate(runtime_model, ids.numpy(), max_new=40, params=params)
+    assert [o.tolist() for o in out] == [r.tolist() for r in ref]
+
+
+def test_runtime_top_k_keeps_exactly_k_tied_tokens():
+    from generate.runtime import next_token_probs as np_probs
+    from generate.sampling import next_token_probs
+
+    logits = torch.tensor(
+        [[1.0, 3.0, 2.0, 2.0, 2.0, 0.0], [0.5, 0.1, 2.0, 1.0, 0.2, 0.3]]
+    )
+    seen = torch.zeros_like(logits, dtype=torch.bool)
+    params = SamplingParams(temperature=1.0, top_k=3, top_p=1.0, repetition_penalty=1.0)
+    ref = next_token_probs(logits, seen, params)
+    out = np_probs(logits.numpy(), seen.numpy(), params)
+    assert ((out > 0).sum(-1) == (ref > 0).sum(-1).numpy()).all()
+    assert (out[0] > 0).tolist() == [False, True, True, True, False, False]
+    # no ties: the same distribution as eager sampling
+    torch.testing.assert_close(torch.from_numpy(out[1]).float(), ref[1])
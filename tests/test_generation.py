@@ -0,0 +1,151 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from train import ReviewGen
+from generate.sampling import SamplingParams, generate_ids, next_token_probs, seen_mask
+
+
+def test_forward_cached_matches_forward(small_model):
+    model = small_model()
+    x = torch.randint(0, 50, (3, 16))
+    with torch.no_grad():
+        ref = model(x)
+        cache = model.new_cache()
+        chunks = [model.forward_cached(x[:, :5], cache)]
+        chunks += [model.forward_cached(x[:, t : t + 1], cache) for t in range(5, 9)]
+        chunks.append(model.forward_cached(x[:, 9:], cache))
+    torch.testing.assert_close(torch.cat(chunks, dim=1), ref)
+
+
+def test_generation_runs_past_ctx_len(small_model):
+    model = small_model(ctx_len=16)
+    ids = torch.randint(0, 50, (2, 4))
+    out = generate_ids(model, ids, max_new=100, params=SamplingParams(top_k=5))
+    assert [len(o) for o in out] == [104, 104]
+
+
+def test_generation_stops_at_eos(small_model):
+    model = small_model()
+    eos_id = 7
+
+    def always_eos(module, inputs, logits):
+        return torch.full_like(logits, -1e4).index_fill_(-1, torch.tensor(eos_id), 0)
+
+    model.lm_head.register_forward_hook(always_eos)
+    ids = torch.randint(8, 50, (3, 4))
+    params = SamplingParams(temperature=0.01, repetition_penalty=1.0)
+    out = generate_ids(model, ids, max_new=20, params=params, eos_id=eos_id)
+    assert [o.tolist() for o in out] == ids.tolist()
+
+
+def test_speculative_with_identical_draft_accepts_everything(small_model):
+    from generate.speculative import speculative_generate
+
+    model = small_model(ctx_len=16)
+    ids = torch.randint(0, 50, (1, 3))
+    out, stats = speculative_generate(model, model, ids, max_new=40, k=4)
+    assert len(out) == 43
+    assert stats.acceptance_rate == 1.0
+
+
+def test_speculative_stops_drafting_at_eos(small_model):
+    from generate.speculative import speculative_generate
+
+    model = small_model()
+    eos_id = 7
+
+    def always_eos(module, inputs, logits):
+        return torch.full_like(logits, -1e4).index_fill_(-1, torch.tensor(eos_id), 0)
+
+    model.lm_head.register_forward_hook(always_eos)
+    ids = torch.tensor([[eos_id]])  # an empty prompt, as Sampler encodes it
+    out, stats = speculative_generate(model, model, ids, max_new=20, eos_id=eos_id)
+    assert out.tolist() == [eos_id]
+    assert (stats.drafted, stats.accepted) == (1, 1)
+
+
+def test_speculative_matches_target_distribution():
+    from generate.speculative import speculative_generate
+
+    torch.manual_seed(0)
+    vocab = 5
+    target = ReviewGen(vocab, ctx_len=8, d_model=16, n_layers=2).eval()
+    draft = ReviewGen(vocab, ctx_len=8, d_model=16, n_layers=1).eval()
+    params = SamplingParams(temperature=0.8, top_k=4, top_p=0.95)
+    ids = torch.tensor([[1, 2]])
+
+    with torch.no_grad():
+        p_first = next_token_probs(target(ids)[:, -1], seen_mask(ids, vocab), params)
+    n = 2000
+    counts = torch.zeros(vocab)
+    for _ in range(n):
+        out, _ = speculative_generate(target, draft, ids, max_new=3, params=params, k=3)
+        counts[out[2]] += 1
+    assert (counts / n - p_first[0]).abs().max() < 0.04
+
+
+def test_prefix_cache_matches_fresh_prefill(small_model):
+    from generate.prefix_cache import PrefixCache
+
+    model = small_model()
+    prefix = PrefixCache(model, max_mb=1)
+    seed = torch.tensor([[3, 4, 5, 6]])
+    prefix.prefill(seed)
+    ids = torch.tensor([[3, 4, 5, 6, 7, 8], [3, 4, 5, 6, 7, 8], [9, 4, 5, 6, 7, 8]])
+    cache, logits = prefix.prefill(ids)
+    with torch.no_grad():
+        ref = model(ids)
+    torch.testing.assert_close(logits, ref[:, -1])
+    assert cache.length == 6
+    assert (prefix.stats.lookups, prefix.stats.partial_hits) == (3, 1)
+
+    prefix.prefill(ids[:1])
+    assert prefix.stats.hits == 1
+
+    prefix.max_bytes = prefix.bytes - 1  # next insert evicts the oldest entry
+    prefix.prefill(torch.tensor([[1, 2]]))
+    assert prefix.stats.evictions >= 1 and prefix.bytes <= prefix.max_bytes
+
+
+def test_beam_scores_match_rescoring_across_batch_and_window(small_model):
+    from generate.beam import BeamParams, beam_search
+
+    model = small_model(ctx_len=16)
+    ids = torch.randint(0, 50, (2, 4))
+    params = BeamParams(num_beams=4, num_groups=1, length_penalty=0.0, n_best=3)
+    hyps, stats = beam_search(model, ids, max_new=8, params=params)
+    assert stats.forwards == 8  # one batched forward per step for all beams
+    for row, best in zip(ids, hyps):
+        assert [h.score for h in best] == sorted((h.score for h in best), reverse=True)
+        for h in best:
+            assert torch.equal(h.ids[:4], row) and len(h.ids) == 12
+            with torch.no_grad():
+                logp = torch.log_softmax(model(h.ids[None, :-1]), dim=-1)[0]
+            total = logp[3:].gather(1, h.ids[4:, None]).sum().item()
+            assert h.score == pytest.approx(total, abs=1e-4)
+
+    # one beam is greedy decoding, also once the window slides
+    (greedy,), _ = beam_search(model, ids[:1], 30, BeamParams(num_beams=1))
+    out = generate_ids(
+        model, ids[:1], 30, SamplingParams(temperature=1e-4, repetition_penalty=1.0)
+    )
+    assert torch.equal(greedy[0].ids, out[0])
+
+
+def test_diverse_beams_end_at_eos(small_model):
+    from generate.beam import BeamParams, beam_search
+
+    model = small_model()
+    # eos likely enough that some beams finish early
+    model.lm_head.register_forward_hook(
+        lambda m, i, logits: logits.index_add(
+            -1, torch.tensor([7]), torch.full_like(logits[..., :1], 3.0)
+        )
+    )
+    ids = torch.randint(8, 50, (1, 4))
+    params = BeamParams(num_beams=4, num_groups=2, diversity=2.0, n_best=4)
+    (hyps,), _ = beam_search(model, ids, max_new=6, params=params, eos_id=7)
+    assert len({tuple(h.ids.tolist()) for h in hyps}) == 4
+    assert all(7 not in h.ids[4:].tolist() for h in hyps)
+    assert min(len(h.ids) for h in hyps) < 10
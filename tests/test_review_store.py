@@ -0,0 +1,64 @@
+import json, multiprocessing
+
+from scrape_reviews.review_store import ReviewStore
+
+
+def reviews(n, restaurant="Dishoom", start=0):
+    return [
+        dict(
+            reviewer_name=f"user{i}",
+            rating=1 + i % 5,
+            text=f"review number {i} of the black daal",
+            date="a week ago",
+            restaurant_name=restaurant,
+            restaurant_address="12 Upper St Martin's Ln",
+            restaurant_cuisine="indian",
+        )
+        for i in range(start, start + n)
+    ]
+
+
+def write(db, start):
+    with ReviewStore(db) as store:
+        for i in range(start, start + 100, 10):
+            store.add_reviews(reviews(10, start=i))
+
+
+def test_dedup_incremental_export_and_search(tmp_path):
+    db, shards = tmp_path / "reviews.db", tmp_path / "shards"
+    with ReviewStore(db) as store:
+        assert store.add_reviews(reviews(5)) == 5
+        assert store.add_reviews(reviews(5)) == 0
+        # same name elsewhere is a different restaurant
+        other = reviews(5, start=0)
+        for r in other:
+            r["restaurant_address"] = "Shoreditch"
+        assert store.add_reviews(other) == 5
+
+        path, n = store.export_shard(shards)
+        assert n == 10
+        assert store.export_shard(shards) == (None, 0)
+        store.add_reviews(reviews(3, start=5))
+        path, n = store.export_shard(shards)
+        assert n == 3
+        rows = [json.loads(line) for line in open(path)]
+        assert [r["reviewer_name"] for r in rows] == ["user5", "user6", "user7"]
+        assert rows[0]["restaurant_cuisine"] == "indian"
+
+        if store.fts:
+            hits = store.search('"number 7"')
+            assert [text for _, _, text in hits] == [reviews(1, start=7)[0]["text"]]
+
+
+def test_concurrent_writers(tmp_path):
+    db = tmp_path / "reviews.db"
+    ReviewStore(db).close()
+    # overlapping ranges: 0-99 and 50-149
+    procs = [multiprocessing.Process(target=write, args=(db, s)) for s in (0, 50)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    with ReviewStore(db) as store:
+        assert store.stats()["reviews"] == 150
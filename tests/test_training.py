@@ -0,0 +1,311 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from train import ReviewGen
+
+
+@pytest.mark.parametrize("tie_weights", [False, True])
+def test_chunked_loss_and_checkpointing_match_full_logits(tie_weights):
+    torch.manual_seed(0)
+    model = ReviewGen(300, ctx_len=32, d_model=32, tie_weights=tie_weights).train()
+    x, y = torch.randint(0, 300, (2, 3, 32))
+
+    def loss_and_grads(chunk, grad_checkpoint):
+        model.grad_checkpoint = grad_checkpoint
+        torch.manual_seed(1)  # same dropout masks
+        loss = model.loss(x, y, chunk=chunk)
+        loss.backward()
+        grads = [p.grad.clone() for p in model.parameters()]
+        model.zero_grad()
+        return loss, grads
+
+    ref_loss, ref_grads = loss_and_grads(0, False)
+    loss, grads = loss_and_grads(17, True)
+    torch.testing.assert_close(loss, ref_loss)
+    for g, ref in zip(grads, ref_grads):
+        torch.testing.assert_close(g, ref)
+
+
+@pytest.mark.parametrize("tie_weights", [False, True])
+def test_initial_loss_is_near_uniform(tie_weights):
+    import math
+
+    torch.manual_seed(0)
+    vocab = 8000
+    model = ReviewGen(vocab, ctx_len=32, d_model=64, tie_weights=tie_weights).eval()
+    x, y = torch.randint(0, vocab, (2, 4, 32))
+    with torch.no_grad():
+        loss = model.loss(x, y).item()
+    assert abs(loss - math.log(vocab)) < 1.0
+
+
+def test_csv_writer_rotates_a_file_with_another_header(tmp_path):
+    from train.metrics import BackgroundCSVWriter
+
+    path = tmp_path / "metrics.csv"
+    path.write_text("step,loss\n1,2.0\n")
+    writer = BackgroundCSVWriter(path, ["step", "epoch", "loss"])
+    writer.writerow([2, 0, 1.5])
+    writer.close()
+    assert path.read_text().splitlines() == ["step,epoch,loss", "2,0,1.5"]
+    assert (tmp_path / "metrics.1.csv").read_text() == "step,loss\n1,2.0\n"
+
+    writer = BackgroundCSVWriter(path, ["step", "epoch", "loss"])  # same header
+    writer.writerow([3, 0, 1.0])
+    writer.close()
+    assert writer.rotated is None and len(path.read_text().splitlines()) == 3
+
+
+def test_getitems_matches_stacked_getitem():
+    from train.dataset import ReviewLMDataset
+
+    ds = ReviewLMDataset.from_tokens(torch.arange(100), seq_len=7)
+    idx = [3, 0, 11, 3]
+    x, y = ds.__getitems__(idx)
+    torch.testing.assert_close(x, torch.stack([ds[i][0] for i in idx]))
+    torch.testing.assert_close(y, torch.stack([ds[i][1] for i in idx]))
+
+
+def test_autotune_picks_fewest_workers_within_tolerance(monkeypatch):
+    from train import loader
+
+    waits = {0: 0.010, 1: 0.0025, 2: 0.00200, 4: 0.00201}
+    monkeypatch.setattr(
+        loader, "measure_data_wait", lambda n, step, n_batches: waits[n]
+    )
+    chosen, measured = loader.autotune_num_workers(
+        lambda n: n, None, candidates=list(waits), tolerance=0.02
+    )
+    assert measured == waits
+    assert chosen == 2  # 4 is no faster; 1 is 25% slower
+
+
+def make_tokenizer(path, words):
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    vocab = {w: i for i, w in enumerate(["<unk>", "<eos>", *words])}
+    tok = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.Whitespace()
+    tok.save(str(path))
+    return str(path)
+
+
+def test_streaming_dataset_resumes_mid_epoch(tmp_path):
+    import copy, json, random
+    from torch.utils.data import DataLoader
+    from train.streaming import StreamingReviewDataset
+
+    words = [f"w{i}" for i in range(20)]
+    rng = random.Random(0)
+    for shard in range(3):
+        with open(tmp_path / f"part-{shard}.jsonl", "w") as f:
+            for _ in range(40):
+                text = " ".join(rng.choices(words, k=rng.randint(3, 12)))
+                f.write(json.dumps({"text": text}) + "\n")
+    tok = make_tokenizer(tmp_path / "tok.json", words)
+    ds = StreamingReviewDataset(
+        str(tmp_path / "*.jsonl"), tok, seq_len=8, batch_size=4, shuffle_buffer=16
+    )
+
+    def epoch(position=None):
+        ds.set_epoch(1, position)
+        loader = DataLoader(ds, batch_size=None, num_workers=2)
+        for x, _ in ds.track(loader):
+            yield x, copy.deepcopy(ds.position)
+
+    full = list(epoch())
+    assert len(full) > 6 and full[0][0].shape == (4, 8)
+    resumed = [x for x, _ in epoch(full[4][1])]
+    assert len(resumed) == len(full) - 5
+    for a, (b, _) in zip(resumed, full[5:]):
+        assert torch.equal(a, b)
+
+
+def test_control_tokens_prefix_reviews(tmp_path):
+    import json
+    from tokenizers import Tokenizer
+    from train.control import add_control_tokens, control_ids, control_vocab
+    from train.dataset import tokenize_corpus
+    from train.streaming import StreamingReviewDataset
+
+    words = [f"w{i}" for i in range(10)]
+    records = [
+        dict(text=f"w{i % 10} w{(i * 3) % 10}", rating=1 + i % 5, restaurant_cuisine=c)
+        for i, c in enumerate(["Japanese;ramen", "thai", "", "thai"] * 10)
+    ]
+    (tmp_path / "master.json").write_text(json.dumps(records))
+    tok = Tokenizer.from_file(make_tokenizer(tmp_path / "tok.json", words))
+    tokens = control_vocab(records, min_count=5)
+    assert tokens[-2:] == ["<cuisine=japanese>", "<cuisine=thai>"]
+    add_control_tokens(tok, tokens)
+    tok.save(str(tmp_path / "tok.json"))
+
+    ids = tokenize_corpus(
+        tmp_path / "master.json", tok, controls=True, control_dropout=0
+    )
+    eos, thai = tok.token_to_id("<eos>"), tok.token_to_id("<cuisine=thai>")
+    first = [tok.token_to_id("<rating=1>"), tok.token_to_id("<cuisine=japanese>")]
+    assert ids[:5].tolist() == first + [tok.token_to_id("w0")] * 2 + [eos]
+    two = tok.token_to_id("<rating=2>")
+    assert control_ids(tok, {"cuisine": "Thai", "rating": "2"}) == [two, thai]
+    with pytest.raises(ValueError, match="cuisine=pizza"):
+        control_ids(tok, {"cuisine": "pizza"})
+    with pytest.raises(ValueError, match="rating=7 "):
+        control_ids(tok, {"rating": 7})
+
+    # the streaming dataset builds the same token stream
+    shard = tmp_path / "reviews.jsonl"
+    shard.write_text("".join(json.dumps(r) + "\n" for r in records))
+    ds = StreamingReviewDataset(
+        str(shard),
+        str(tmp_path / "tok.json"),
+        seq_len=7,
+        batch_size=2,
+        shuffle_buffer=1,
+        controls=True,
+        control_dropout=0,
+    )
+    ds.set_epoch(0)
+    streamed = torch.cat([torch.cat([x, y[:, -1:]], 1).view(-1) for x, y, _ in ds])
+    assert torch.equal(streamed, ids[: len(streamed)])
+
+
+def test_sweep_spec_expansion_and_argv():
+    from train.sweep import expand_spec, rungs, to_argv
+
+    grid = {"params": {"lr": [1e-3, 1e-4], "preset": ["tiny", "small"], "bs": 16}}
+    trials = expand_spec(grid)
+    assert len(trials) == 4 and {t["bs"] for t in trials} == {16}
+    assert {(t["lr"], t["preset"]) for t in trials} == {
+        (1e-3, "tiny"),
+        (1e-3, "small"),
+        (1e-4, "tiny"),
+        (1e-4, "small"),
+    }
+    spec = {
+        "method": "random",
+        "trials": 5,
+        "params": {"lr": {"log_uniform": [1e-4, 1e-2]}, "seq_len": {"int": [8, 16]}},
+    }
+    trials = expand_spec(spec)
+    assert trials == expand_spec(spec)  # seeded
+    assert len(trials) == 5
+    assert all(1e-4 <= t["lr"] <= 1e-2 and 8 <= t["seq_len"] <= 16 for t in trials)
+    with pytest.raises(ValueError):
+        expand_spec({"params": {"lr": {"uniform": [0, 1]}}})
+
+    assert rungs(900, {"min_steps": 100, "eta": 3}) == [100, 300, 900]
+    assert rungs(1000, {"min_steps": 100, "eta": 2}) == [100, 200, 400, 800, 1000]
+    assert rungs(900, None) == [900]
+
+    argv = to_argv({"seq_len": 64, "grad-checkpoint": True, "progress": False})
+    assert argv == ["--seq-len", "64", "--grad-checkpoint", "--no-progress"]
+
+
+class _StubPool:
+    """In-process stand-in for the sweep's worker pool."""
+
+    def __init__(self, losses):
+        self.losses = losses  # trial -> val loss per rung
+        self.jobs = []
+
+    def imap_unordered(self, fn, jobs):
+        for job in jobs:
+            self.jobs.append((job["trial"], job["steps"]))
+            loss = self.losses[job["trial"]][job["rung"]]
+            yield dict(
+                trial=job["trial"],
+                steps=job["steps"],
+                val_loss=loss,
+                seconds=1.0,
+                error=None,
+            )
+
+
+def test_run_sweep_prunes_failed_trials_and_ranks_the_summary(tmp_path):
+    import csv, math
+    from train.sweep import run_sweep, summarise
+
+    trials = [dict(trial=f"t{i}", params={"lr": i}, argv=[]) for i in range(4)]
+    pool = _StubPool(
+        {
+            "t0": [2.0, 1.5],
+            "t1": [math.nan, 0.1],  # diverged
+            "t2": [math.inf, 0.1],  # failed
+            "t3": [1.0, 1.8],
+        }
+    )
+    history = run_sweep(pool, trials, [10, 30], eta=2, log=lambda msg: None)
+    assert sorted(j for j in pool.jobs if j[1] == 30) == [("t0", 30), ("t3", 30)]
+
+    rows = summarise(tmp_path, trials, history)
+    with open(tmp_path / "summary.csv", newline="") as f:
+        ranked = [(r["trial"], r["steps"]) for r in csv.DictReader(f)]
+    # survivors by loss, then the trials pruned after rung 0
+    assert ranked == [("t0", "30"), ("t3", "30"), ("t1", "10"), ("t2", "10")]
+    assert rows[0]["val_loss"] == 1.5 and rows[0]["train_loss"] is None
+
+
+def _reviews(n, seed=0):
+    import random
+
+    rng = random.Random(seed)
+    words = "the broth was rich noodles chewy service slow friendly spicy curry".split()
+    return [
+        dict(
+            text=" ".join(rng.choices(words, k=rng.randint(5, 15))) + f" visit {i}",
+            rating=rng.randint(1, 5),
+            restaurant_cuisine=rng.choice(["thai", "Japanese;ramen"]),
+        )
+        for i in range(n)
+    ]
+
+
+def test_tokenizer_heldout_split_and_report():
+    from train.train_tokenizer import (
+        is_heldout,
+        split_reviews,
+        tokenizer_report,
+        train_tokenizer,
+    )
+
+    texts = [r["text"] for r in _reviews(400)]
+    train_iter, heldout = split_reviews(texts, heldout_every=10)
+    train_texts = list(train_iter)
+    assert heldout == [t for t in texts if is_heldout(t, 10)]
+    assert 0 < len(heldout) < 100
+    assert sorted(train_texts + heldout) == sorted(texts)
+    again, _ = split_reviews(texts, sample=0.5, max_reviews=50, heldout_every=10)
+    assert len(list(again)) == 50
+
+    tokenizer = train_tokenizer(train_texts, vocab_size=300)
+    report = tokenizer_report(tokenizer, heldout, d_model=32)
+    n_tokens = sum(len(e.ids) for e in tokenizer.encode_batch(heldout))
+    n_words = sum(len(t.split()) for t in heldout)
+    assert report["fertility"] == pytest.approx(n_tokens / n_words)
+    assert report["fertility"] >= 1.0 and report["unk_rate"] == 0.0
+    vocab = tokenizer.get_vocab_size()
+    assert report["embed_params"] == 2 * vocab * 32
+    tied = tokenizer_report(tokenizer, heldout, d_model=32, tie_weights=True)
+    assert tied["embed_params"] == vocab * 32
+
+
+def test_train_tokenizer_controls_adds_special_tokens(tmp_path):
+    import json
+    from tokenizers import Tokenizer
+    from train import train_tokenizer
+
+    corpus = tmp_path / "reviews.json"
+    corpus.write_text(json.dumps(_reviews(300)))
+    out = tmp_path / "tok.json"
+    train_tokenizer.main(
+        ["--corpus", str(corpus), "--vocab-size", "300", "--out", str(out)]
+        + ["--controls", "--min-cuisine-reviews", "5", "--heldout-every", "10"]
+    )
+    tok = Tokenizer.from_file(str(out))
+    controls = [f"<rating={r}>" for r in range(1, 6)]
+    controls += ["<cuisine=japanese>", "<cuisine=thai>"]
+    for token in controls:
+        assert tok.encode(token).ids == [tok.token_to_id(token)]
+    assert tok.decode([tok.token_to_id("<cuisine=thai>")]) == ""  # special
@@ -1 +1,17 @@
-from .review_gen import ReviewGen
+# resolved on first use, so `import train.presets` (or a --help) doesn't load torch
+_EXPORTS = {
+    "ReviewGen": "review_gen",
+    "save_checkpoint": "checkpoint",
+    "load_checkpoint": "checkpoint",
+    "save_config": "checkpoint",
+    "load_config": "checkpoint",
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
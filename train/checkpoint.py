@@ -0,0 +1,114 @@
+"""Checkpoint save/load with memory-mapped weights.
+
+Weights are written with ``torch.save`` (``.pt``) or, when the optional
+``safetensors`` package is installed, as a flat ``.safetensors`` file. The model
+config sits beside them as ``<name>.json``.
+
+Loading memory-maps the file (``torch.load(mmap=True, weights_only=True)`` or
+``safetensors.safe_open(...).get_tensor``) and assigns the mapped tensors
+straight into the module, so the weights are never copied: pages come from the
+page cache and are shared by every process serving the same file.
+"""
+
+import json, contextlib
+from pathlib import Path
+
+import torch
+
+# config key marking an int8 checkpoint written by generate/quantize.py
+QUANT_KEY = "quantize"
+
+
+# ---------- config ----------
+def config_path(weights_path):
+    """``review_gen.pt`` -> ``review_gen.json``"""
+    return Path(weights_path).with_suffix(".json")
+
+
+def save_config(model, weights_path):
+    path = config_path(weights_path)
+    path.write_text(json.dumps(model.config, indent=2))
+    return path
+
+
+def load_config(weights_path, **defaults):
+    """Model config saved beside ``weights_path``.
+
+    Checkpoints written before configs were saved have no JSON; those fall
+    back to ``defaults`` (at least ``vocab_size``) and the constructor defaults.
+    """
+    path = config_path(weights_path)
+    if path.exists():
+        return json.loads(path.read_text())
+    return dict(defaults)
+
+
+# ---------- weights ----------
+def _is_safetensors(path):
+    return Path(path).suffix == ".safetensors"
+
+
+def _safetensors():
+    try:
+        import safetensors.torch
+    except ImportError as e:
+        raise ImportError(
+            "the .safetensors format needs the safetensors package "
+            "(pip install safetensors); use a .pt path otherwise"
+        ) from e
+    return safetensors.torch
+
+
+def save_checkpoint(model, path):
+    """Write weights (format chosen by suffix) plus the JSON config."""
+    path = Path(path)
+    state = model.state_dict()
+    if _is_safetensors(path):
+        # safetensors refuses aliased tensors; tied weights are re-tied on load
+        if getattr(model, "tie_weights", False):
+            state.pop("lm_head.weight", None)
+        _safetensors().save_file({k: v.contiguous() for k, v in state.items()}, path)
+    else:
+        torch.save(state, str(path))
+    save_config(model, path)
+    return path
+
+
+def load_state(path, mmap=True):
+    """State dict for ``path``; memory-mapped unless ``mmap=False``."""
+    if _is_safetensors(path):
+        st = _safetensors()
+        if mmap:
+            from safetensors import safe_open
+
+            with safe_open(str(path), framework="pt", device="cpu") as f:
+                return {k: f.get_tensor(k) for k in f.keys()}
+        return st.load(Path(path).read_bytes())  # one read into private memory
+    return torch.load(str(path), map_location="cpu", mmap=mmap, weights_only=True)
+
+
+def load_checkpoint(
+    model_cls, path, device="cpu", mmap=True, lazy=False, **config_defaults
+):
+    """Build ``model_cls`` from the saved config and load the weights into it.
+
+    ``mmap`` maps the weights file instead of reading it; on CPU the mapped
+    tensors are assigned to the module as-is (``load_state_dict(assign=True)``),
+    so no second copy is made. ``lazy`` builds the module on the meta device
+    so random initialisation is skipped too; creating meta tensors imports
+    ``torch._dynamo``, which costs more time and memory than the init it saves
+    for every preset here (``benchmarks/bench_cold_start.py``).
+    """
+    config = load_config(path, **config_defaults)
+    with torch.device("meta") if lazy else contextlib.nullcontext():
+        model = model_cls.from_config(config)
+    state = load_state(path, mmap=mmap)
+    if getattr(model, "tie_weights", False):
+        state.setdefault("lm_head.weight", state["tok_emb.weight"])
+    # assigning keeps the mmap-backed storage; a meta model has nothing to copy into
+    assign = lazy or (mmap and str(device) == "cpu")
+    model.load_state_dict(state, assign=assign)
+    if getattr(model, "tie_weights", False):
+        # assign=True gives each key its own Parameter; share them again
+        model.lm_head.weight = model.tok_emb.weight
+    return model.to(device).eval()
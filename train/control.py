@@ -0,0 +1,131 @@
+"""Control tokens: review metadata as a prefix the model conditions on.
+
+A 2-star review of a ramen place trains as
+
+    <rating=2> <cuisine=ramen> the broth was ... <eos>
+
+Each control is one special token of the tokenizer (added by
+``train_tokenizer.py --controls``), so it is never split and decoding with
+``skip_special_tokens`` drops it. Datasets put the control ids in front of
+the review's own encoding, exactly as ``control_ids`` does for generation.
+A fixed share of controls (``dropout``, chosen by hash so every run and
+every worker agrees) is left out, so the model also learns to write a review
+given only some of them, or none.
+"""
+
+import re, zlib
+from collections import Counter
+
+# control name -> review record field (as written by the scraper/review store)
+FIELDS = {"rating": "rating", "cuisine": "restaurant_cuisine"}
+TOKEN = re.compile(r"^<(\w+)=([^<>\s]+)>$")
+
+
+def rating_value(value):
+    try:
+        rating = round(float(value))
+    except (TypeError, ValueError):
+        return None
+    return rating if 1 <= rating <= 5 else None
+
+
+def cuisine_value(value):
+    # OSM-style tags: "japanese;ramen" -> "japanese"
+    value = re.split(r"[;,]", str(value or ""))[0].strip().lower()
+    return re.sub(r"\W+", "_", value).strip("_") or None
+
+
+NORMALISE = {"rating": rating_value, "cuisine": cuisine_value}
+
+
+def conditions(record):
+    """{control: value} for the metadata a review record carries."""
+    out = {}
+    for name, field in FIELDS.items():
+        value = NORMALISE[name](record.get(field))
+        if value is not None:
+            out[name] = value
+    return out
+
+
+def control_token(name, value):
+    normalised = NORMALISE[name](value)
+    if normalised is None:
+        raise ValueError(f"not a valid {name}: {value!r}")
+    return f"<{name}={normalised}>"
+
+
+def control_vocab(records, min_count=20):
+    """Control tokens for a corpus: every rating, and each cuisine with at
+    least ``min_count`` reviews (rarer ones get no token of their own)."""
+    counts = Counter(
+        (name, value) for r in records for name, value in conditions(r).items()
+    )
+    tokens = [control_token("rating", v) for v in range(1, 6)]
+    tokens += sorted(
+        control_token(name, value)
+        for (name, value), n in counts.items()
+        if name != "rating" and n >= min_count
+    )
+    return tokens
+
+
+def add_control_tokens(tokenizer, tokens):
+    """Append ``tokens`` to the tokenizer as special tokens; returns how many
+    were new. Ids of the existing vocab are unchanged."""
+    return tokenizer.add_special_tokens(list(tokens))
+
+
+def known_controls(tokenizer):
+    """{control: {value: token id}} for the control tokens in ``tokenizer``."""
+    known = {}
+    for token, idx in tokenizer.get_vocab().items():
+        m = TOKEN.match(token)
+        if m and m[1] in FIELDS:
+            known.setdefault(m[1], {})[m[2]] = idx
+    return known
+
+
+def control_ids(tokenizer, conds, known=None):
+    """Ids for ``conds`` ({control: value}), in ``FIELDS`` order; raises for
+    a value the tokenizer has no token for."""
+    known = known_controls(tokenizer) if known is None else known
+    ids = []
+    for name in FIELDS:
+        if conds.get(name) is None:
+            continue
+        value = str(NORMALISE[name](conds[name]))
+        if value not in known.get(name, {}):
+            choices = ", ".join(sorted(known.get(name, {}))) or "none"
+            raise ValueError(
+                f"no control token for {name}={conds[name]} (have: {choices})"
+            )
+        ids.append(known[name][value])
+    unknown = set(conds) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown controls {sorted(unknown)}; have {list(FIELDS)}")
+    return ids
+
+
+class ControlPrefixer:
+    """Control ids to put before each training review."""
+
+    def __init__(self, tokenizer, dropout=0.1):
+        self.known = known_controls(tokenizer)
+        if not self.known:
+            raise ValueError(
+                "tokenizer has no control tokens; train it with "
+                "train_tokenizer.py --controls"
+            )
+        self.dropout = dropout
+
+    def _dropped(self, name, text):
+        return zlib.crc32(f"{name}:{text}".encode()) % 10000 < self.dropout * 10000
+
+    def __call__(self, record):
+        ids = []
+        for name, value in conditions(record).items():
+            idx = self.known.get(name, {}).get(str(value))
+            if idx is not None and not self._dropped(name, record["text"]):
+                ids.append(idx)
+        return ids
@@ -3,27 +3,77 @@ from torch.utils.data import Dataset
 import random, json, pathlib
 from tokenizers import Tokenizer
 
+from train.control import ControlPrefixer
+
+
+def tokenize_corpus(
+    json_path, tokenizer, eos_token="<eos>", controls=False, control_dropout=0.1
+):
+    """All review texts in ``json_path`` as one 1-D id tensor.
+
+    ``controls`` puts each review's rating/cuisine control tokens in front of
+    it (see ``control.py``).
+    """
+    with open(json_path) as f:
+        raw = json.load(f)
+    records = [r for r in raw if r.get("text")]
+    texts = [r["text"] for r in records]
+
+    # each review ends with <eos> so the model learns where reviews stop;
+    # tokenizers without it fall back to newline-joined text
+    eos_id = tokenizer.token_to_id(eos_token)
+    if eos_id is None:
+        if controls:
+            raise ValueError(f"control tokens need {eos_token} in the tokenizer")
+        ids = tokenizer.encode("\n".join(texts)).ids
+    else:
+        prefix = ControlPrefixer(tokenizer, control_dropout) if controls else None
+        ids = []
+        for r, enc in zip(records, tokenizer.encode_batch(texts)):
+            if prefix:
+                ids.extend(prefix(r))
+            ids.extend(enc.ids)
+            ids.append(eos_id)
+    return torch.tensor(ids, dtype=torch.long)
+
 
 class ReviewLMDataset(Dataset):
-    def __init__(self, json_path, tokenizer_path, seq_len=128):
+    def __init__(
+        self,
+        json_path,
+        tokenizer_path,
+        seq_len=128,
+        eos_token="<eos>",
+        controls=False,
+        control_dropout=0.1,
+    ):
         self.seq_len = seq_len
         self.tokenizer = Tokenizer.from_file(tokenizer_path)
 
-        with open(json_path) as f:
-            raw = json.load(f)
-        texts = [r["text"] for r in raw if r.get("text")]
-        corpus = "\n".join(texts)
-
-        ids = self.tokenizer.encode(corpus).ids
+        ids = tokenize_corpus(
+            json_path, self.tokenizer, eos_token, controls, control_dropout
+        )
         if len(ids) < self.seq_len + 1:
             raise ValueError(
                 f"Corpus too small: {len(ids)} tokens, need at least {self.seq_len + 1}"
             )
 
-        n_complete_seqs = len(ids) // (self.seq_len + 1)
-        self.tokens = torch.tensor(
-            ids[: n_complete_seqs * (self.seq_len + 1)], dtype=torch.long
-        )
+        self._set_tokens(ids)
+
+    @classmethod
+    def from_tokens(cls, tokens, seq_len=128, tokenizer=None):
+        """Build from an already tokenized 1-D id tensor (no copy is made)."""
+        ds = cls.__new__(cls)
+        ds.seq_len = seq_len
+        ds.tokenizer = tokenizer
+        ds._set_tokens(tokens)
+        return ds
+
+    def _set_tokens(self, tokens):
+        n_complete_seqs = len(tokens) // (self.seq_len + 1)
+        self.tokens = tokens[: n_complete_seqs * (self.seq_len + 1)]
+        # (n_samples, seq_len + 1) view over the same storage
+        self.blocks = self.tokens.view(n_complete_seqs, self.seq_len + 1)
         self.n_samples = n_complete_seqs
 
     def __len__(self):  # number of training examples
@@ -34,3 +84,13 @@ class ReviewLMDataset(Dataset):
         x = self.tokens[start : start + self.seq_len]
         y = self.tokens[start + 1 : start + self.seq_len + 1]
         return x, y
+
+    def __getitems__(self, indices):
+        # one gather from the block view instead of stacking 2*bs slice views
+        block = self.blocks[torch.as_tensor(indices, dtype=torch.long)]
+        return block[:, :-1].contiguous(), block[:, 1:].contiguous()
+
+
+def collate_blocks(batch):
+    """Collate for ``ReviewLMDataset.__getitems__``, which already returns (x, y)."""
+    return batch
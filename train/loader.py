@@ -0,0 +1,79 @@
+import logging, os, time
+from torch.utils.data import DataLoader, IterableDataset
+
+log = logging.getLogger("train")
+
+
+def build_loader(
+    ds,
+    batch_size,
+    device,
+    num_workers=0,
+    persistent_workers=True,
+    prefetch_factor=4,
+    collate_fn=None,
+    shuffle=True,
+    generator=None,
+):
+    """DataLoader with the worker / pinning knobs set consistently.
+
+    ``pin_memory`` is only enabled when batches are going to a CUDA device;
+    ``persistent_workers`` and ``prefetch_factor`` only apply with workers.
+    Iterable datasets (``StreamingReviewDataset``) batch and shuffle themselves.
+    """
+    if isinstance(ds, IterableDataset):
+        batch_size, shuffle = None, False
+    kwargs = {}
+    if num_workers > 0:
+        kwargs["persistent_workers"] = persistent_workers
+        kwargs["prefetch_factor"] = prefetch_factor
+    return DataLoader(
+        ds,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=num_workers,
+        pin_memory=str(device).startswith("cuda"),
+        collate_fn=collate_fn,
+        generator=generator,
+        **kwargs,
+    )
+
+
+def measure_data_wait(loader, step_fn, n_batches=30, warmup=3):
+    """Mean seconds per batch spent blocked in ``next()`` while ``step_fn`` runs."""
+    waited, seen = 0.0, 0
+    batches = iter(loader)
+    for i in range(n_batches + warmup):
+        t0 = time.perf_counter()
+        batch = next(batches, None)
+        if batch is None:
+            break
+        if i >= warmup:
+            waited += time.perf_counter() - t0
+            seen += 1
+        step_fn(batch)
+    del batches  # shuts workers down before the next candidate
+    return waited / max(seen, 1)
+
+
+def autotune_num_workers(
+    make_loader, step_fn, candidates=None, n_batches=30, tolerance=0.02
+):
+    """Pick the smallest worker count whose data-wait is within ``tolerance``
+    (relative, plus 0.1ms of slack) of the best one measured.
+
+    ``make_loader(num_workers)`` builds a non-persistent loader; ``step_fn(batch)`` is the
+    consumer (normally a forward/backward without an optimizer step), so the
+    wait is measured under real compute pressure rather than in isolation.
+    """
+    if candidates is None:
+        n_cpu = len(os.sched_getaffinity(0))
+        candidates = sorted({0, 1, 2, 4, 8, n_cpu // 2} & set(range(n_cpu + 1)))
+    waits = {}
+    for n in candidates:
+        waits[n] = measure_data_wait(make_loader(n), step_fn, n_batches=n_batches)
+        log.info(f"autotune: num_workers={n} data_wait={1000 * waits[n]:.2f}ms/batch")
+    best = min(waits.values())
+    chosen = min(n for n, w in waits.items() if w <= best * (1 + tolerance) + 1e-4)
+    log.info(f"autotune: using num_workers={chosen}")
+    return chosen, waits
@@ -0,0 +1,207 @@
+import csv, os, queue, resource, threading, time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import torch
+
+PHASES = ("data", "h2d", "forward", "backward", "optim")
+
+
+class StepMetrics:
+    """Per-phase wall-clock timings for the training loop.
+
+    Each phase is wrapped with ``timer.phase(name)``. On CUDA each phase is
+    bracketed by CUDA events on the current stream, so kernel time is
+    attributed to the phase that launched it without synchronising the device;
+    the events are read once per window, in ``window()``. Windows are reset by
+    ``window()`` so throughput never includes time spent outside of the
+    measured steps (dataloader startup, epoch turnover, logging).
+    """
+
+    def __init__(self, device, flops_per_token=0.0, peak_tflops=None):
+        self.cuda = str(device).startswith("cuda")
+        self.flops_per_token = flops_per_token
+        self.peak_tflops = peak_tflops
+        self.reset()
+
+    def reset(self):
+        self.totals = defaultdict(float)
+        self.events = []  # (phase, start, end) CUDA events not read yet
+        self.steps = 0
+        self.tokens = 0
+
+    @contextmanager
+    def phase(self, name):
+        with torch.profiler.record_function(name):
+            if self.cuda:
+                start = torch.cuda.Event(enable_timing=True)
+                end = torch.cuda.Event(enable_timing=True)
+                start.record()
+                try:
+                    yield
+                finally:
+                    end.record()
+                    self.events.append((name, start, end))
+                return
+            t0 = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.totals[name] += time.perf_counter() - t0
+
+    def _read_events(self):
+        # the only sync: wait for the last recorded phase to finish
+        if self.events:
+            self.events[-1][2].synchronize()
+        for name, start, end in self.events:
+            self.totals[name] += start.elapsed_time(end) / 1000
+        self.events = []
+
+    def step_done(self, n_tokens):
+        self.steps += 1
+        self.tokens += n_tokens
+
+    def window(self):
+        """Summarise the current window and start a new one."""
+        self._read_events()
+        elapsed = sum(self.totals.values())
+        steps = max(self.steps, 1)
+        out = {f"{p}_ms": round(1000 * self.totals[p] / steps, 2) for p in PHASES}
+        out["tokens_per_sec"] = int(self.tokens / elapsed) if elapsed > 0 else 0
+        achieved = self.flops_per_token * self.tokens / elapsed if elapsed else 0.0
+        out["tflops"] = round(achieved / 1e12, 4)
+        out["mfu"] = (
+            round(achieved / (self.peak_tflops * 1e12), 4) if self.peak_tflops else None
+        )
+        out["peak_mem_mb"] = round(peak_memory_mb(self.cuda), 1)
+        self.reset()
+        return out
+
+
+def peak_memory_mb(cuda):
+    if cuda:
+        return torch.cuda.max_memory_allocated() / 2**20
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def model_flops_per_token(model, seq_len):
+    """Training FLOPs per token (forward + backward), PaLM appendix B style.
+
+    6 * N for the matmul weights (embeddings excluded, they are lookups) plus
+    the attention score/value products, 12 * n_layers * seq_len * d_model.
+    """
+    n_params = sum(p.numel() for p in model.parameters())
+    n_params -= model.tok_emb.weight.numel() + model.pos_emb.numel()
+    if model.tie_weights:
+        # the shared matrix is still the output projection matmul
+        n_params += model.tok_emb.weight.numel()
+    n_layers = len(model.transformer.layers)
+    d_model = model.tok_emb.embedding_dim
+    return 6 * n_params + 12 * n_layers * seq_len * d_model
+
+
+def parse_step_range(spec):
+    """``"a:b"`` -> ``(a, b)``; profiles steps a (inclusive) to b (exclusive)."""
+    if not spec:
+        return None
+    start, _, stop = spec.partition(":")
+    start, stop = int(start), int(stop)
+    if not 0 <= start < stop:
+        raise ValueError(f"--profile-steps expects a:b with 0 <= a < b, got {spec!r}")
+    return start, stop
+
+
+class StepProfiler:
+    """Runs ``torch.profiler`` over a step range and dumps a chrome trace."""
+
+    def __init__(self, step_range, trace_path, device):
+        self.range = step_range
+        self.trace_path = str(trace_path)
+        self.activities = [torch.profiler.ProfilerActivity.CPU]
+        if str(device).startswith("cuda"):
+            self.activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.prof = None
+
+    def step(self, global_step):
+        """Call before each step with the index of the step about to run."""
+        if self.range is None:
+            return
+        start, stop = self.range
+        if global_step == start and self.prof is None:
+            self.prof = torch.profiler.profile(
+                activities=self.activities, record_shapes=True, profile_memory=True
+            )
+            self.prof.__enter__()
+        elif global_step == stop and self.prof is not None:
+            self.close()
+
+    def close(self):
+        if self.prof is None:
+            return
+        self.prof.__exit__(None, None, None)
+        self.prof.export_chrome_trace(self.trace_path)
+        self.prof = None
+        self.range = None
+
+
+def rotate(path):
+    """Rename ``path`` to the first free ``<name>.<n><ext>``; returns it."""
+    root, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(f"{root}.{n}{ext}"):
+        n += 1
+    os.replace(path, f"{root}.{n}{ext}")
+    return f"{root}.{n}{ext}"
+
+
+class BackgroundCSVWriter:
+    """Appends rows to a CSV file from a daemon thread.
+
+    ``writerow`` only enqueues, so the training loop never blocks on disk.
+    The file is flushed when the queue drains or every ``flush_every`` rows,
+    whichever comes first, and on ``close()``. An existing file with a
+    different header (an older run logging other columns) is renamed to
+    ``<name>.<n><ext>`` first, so rows never land under the wrong header.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path, header, flush_every=50):
+        header = [str(h) for h in header]
+        self.rotated = None  # where an old file with another header went
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="") as f:
+                existing = next(csv.reader(f), [])
+            if existing != header:
+                self.rotated = rotate(path)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(header)
+        self.flush_every = flush_every
+        self.q = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def writerow(self, row):
+        self.q.put(row)
+
+    def _run(self):
+        pending = 0
+        while True:
+            row = self.q.get()
+            if row is self._STOP:
+                break
+            self.writer.writerow(row)
+            pending += 1
+            if pending >= self.flush_every or self.q.empty():
+                self.file.flush()
+                pending = 0
+        self.file.flush()
+
+    def close(self):
+        self.q.put(self._STOP)
+        self.thread.join()
+        self.file.close()
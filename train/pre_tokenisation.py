@@ -1,15 +1,9 @@
-import json, re, pathlib, itertools
-from collections import Counter
-import os
+import argparse, json, re, pathlib, hashlib
 
 PROJECT_ROOT = pathlib.Path(__file__).parent.parent.absolute()
 
 RAW_PATH = PROJECT_ROOT / "master.json"
 TEXT_PATH = PROJECT_ROOT / "reviews.txt"  # one line per review
-VOCAB_SIZE = 8000  # fits into the 5‑10 k window
-
-with RAW_PATH.open() as f:
-    data = json.load(f)
 
 clean = lambda s: re.sub(r"\s+", " ", s).strip()
 
@@ -23,23 +17,45 @@ profile_patterns = [
 
 profile_regex = re.compile("|".join(profile_patterns), re.IGNORECASE)
 
-texts = []
-for r in data:
-    if not r.get("text"):
-        continue
 
-    text = clean(r["text"])
+def clean_reviews(texts):
+    """Whitespace-normalised review texts, minus scraped profile blurbs and
+    exact duplicates. Streams: only a digest per distinct review is kept."""
+    seen = set()
+    for text in texts:
+        if not text:
+            continue
+        text = clean(text)
+        if profile_regex.search(text):
+            continue
+        key = hashlib.blake2b(text.encode(), digest_size=8).digest()
+        if key in seen:
+            continue
+        seen.add(key)
+        yield text
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(
+        description="Write the cleaned corpus, one review per line"
+    )
+    cli.add_argument("--json", default=str(RAW_PATH))
+    cli.add_argument("--out", default=str(TEXT_PATH))
+    args = cli.parse_args(argv)
+
+    with open(args.json) as f:
+        data = json.load(f)
 
-    if profile_regex.search(text):
-        continue
+    texts = list(clean_reviews(r.get("text") for r in data))
 
-    texts.append(text)
+    lens = [len(t.split()) for t in texts]
+    print(f"{len(texts)=}, median_tokens={sorted(lens)[len(lens)//2]}")
 
-lens = [len(t.split()) for t in texts]
-print(f"{len(texts)=}, median_tokens={sorted(lens)[len(lens)//2]}")
+    out = pathlib.Path(args.out)
+    out.write_text("\n".join(texts), encoding="utf-8")
+    print("Wrote clean corpus to", out.resolve())
+    print(f"Filtered out reviews matching profile information patterns")
 
-texts = list(dict.fromkeys(texts))
 
-TEXT_PATH.write_text("\n".join(texts), encoding="utf-8")
-print("Wrote clean corpus to", TEXT_PATH.resolve())
-print(f"Filtered out reviews matching profile information patterns")
+if __name__ == "__main__":
+    main()
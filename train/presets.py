@@ -0,0 +1,89 @@
+"""Named ReviewGen sizes for ``train.py --preset``.
+
+    python train/presets.py --vocab 8000 --seq-len 128
+
+prints parameters, FLOPs per token and measured CPU latency for each preset.
+"""
+
+import argparse, pathlib, sys, time
+
+if not __package__:  # run as a script: import the train package
+    sys.path.insert(0, str(pathlib.Path(__file__).parent.parent.absolute()))
+
+PRESETS = {
+    # 1 layer; cheap enough to act as a draft model
+    "tiny": dict(d_model=64, n_heads=2, n_layers=1, tie_weights=True),
+    # the original constructor defaults
+    "small": dict(d_model=128, n_heads=2, n_layers=2, tie_weights=False),
+    "small-tied": dict(d_model=128, n_heads=2, n_layers=2, tie_weights=True),
+    "base": dict(d_model=256, n_heads=4, n_layers=4, tie_weights=True),
+    "large": dict(d_model=384, n_heads=6, n_layers=6, tie_weights=True),
+}
+
+
+def param_counts(model):
+    """(total, non-embedding) parameter counts; tied weights are counted once."""
+    total = sum(p.numel() for p in model.parameters())
+    emb = model.tok_emb.weight.numel() + model.pos_emb.numel()
+    return total, total - emb
+
+
+def inference_flops_per_token(model, seq_len):
+    """Forward FLOPs per token: 2 per matmul weight plus attention products."""
+    _, non_emb = param_counts(model)
+    if model.tie_weights:
+        non_emb += model.tok_emb.weight.numel()
+    n_layers = len(model.transformer.layers)
+    return 2 * non_emb + 4 * n_layers * seq_len * model.tok_emb.embedding_dim
+
+
+def report(vocab_size, seq_len, bs=1, repeats=10):
+    import torch
+    from train.review_gen import ReviewGen
+    from train.metrics import model_flops_per_token
+
+    rows = []
+    for name, cfg in PRESETS.items():
+        model = ReviewGen(vocab_size, ctx_len=seq_len, **cfg).eval()
+        total, non_emb = param_counts(model)
+        x = torch.randint(0, vocab_size, (bs, seq_len))
+        with torch.no_grad():
+            model(x)  # warm-up
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                model(x)
+        latency = (time.perf_counter() - t0) / repeats
+        rows.append(
+            dict(
+                preset=name,
+                params=total,
+                non_emb_params=non_emb,
+                fwd_mflops_tok=inference_flops_per_token(model, seq_len) / 1e6,
+                train_mflops_tok=model_flops_per_token(model, seq_len) / 1e6,
+                fwd_ms=1000 * latency,
+            )
+        )
+    return rows
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Compare the model presets")
+    cli.add_argument("--vocab", type=int, default=8000)
+    cli.add_argument("--seq-len", type=int, default=128)
+    cli.add_argument("--bs", type=int, default=1, help="Batch size for fwd latency")
+    args = cli.parse_args(argv)
+
+    print(
+        f"{'preset':<11} {'params':>10} {'non-emb':>10} "
+        f"{'fwd MFLOP/tok':>13} {'train MFLOP/tok':>15} {'fwd ms':>8}"
+    )
+    for r in report(args.vocab, args.seq_len, bs=args.bs):
+        print(
+            f"{r['preset']:<11} {r['params']:>10,} {r['non_emb_params']:>10,} "
+            f"{r['fwd_mflops_tok']:>13.2f} {r['train_mflops_tok']:>15.2f} "
+            f"{r['fwd_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
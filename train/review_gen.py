@@ -1,9 +1,129 @@
 import torch, math, torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+
+class KVCache:
+    """Per-layer attention keys/values for incremental decoding.
+
+    Buffers of shape (B, n_heads, max_len, head_dim) are allocated on first use
+    and filled in place, so memory is fixed at ``max_len`` (the model's
+    ``ctx_len``) however long generation runs. ``length`` is the number of
+    positions already filled; it doubles as the position offset of the next
+    token.
+    """
+
+    def __init__(self, n_layers, max_len):
+        self.max_len = max_len
+        self.k = [None] * n_layers
+        self.v = [None] * n_layers
+        self.length = 0
+
+    @property
+    def remaining(self):
+        return self.max_len - self.length
+
+    def update(self, layer, k, v):
+        """Write (B, H, T, hd) keys/values after ``length``; return the filled prefix."""
+        T = k.size(2)
+        if self.length + T > self.max_len:
+            raise ValueError(
+                f"KVCache overflow: {self.length} + {T} > max_len {self.max_len}"
+            )
+        if self.k[layer] is None:
+            shape = (*k.shape[:2], self.max_len, k.size(-1))
+            self.k[layer] = k.new_empty(shape)
+            self.v[layer] = v.new_empty(shape)
+        end = self.length + T
+        self.k[layer][:, :, self.length : end] = k
+        self.v[layer][:, :, self.length : end] = v
+        return self.k[layer][:, :, :end], self.v[layer][:, :, :end]
+
+    def reset(self):
+        self.length = 0
+
+    def crop(self, length):
+        """Forget everything after the first ``length`` positions."""
+        self.length = min(self.length, length)
+
+    def select(self, index):
+        """Keep/reorder batch rows, e.g. drop finished sequences."""
+        self.k = [None if k is None else k.index_select(0, index) for k in self.k]
+        self.v = [None if v is None else v.index_select(0, index) for v in self.v]
+        return self
+
+    def clone(self):
+        new = KVCache(len(self.k), self.max_len)
+        new.k = [None if k is None else k.clone() for k in self.k]
+        new.v = [None if v is None else v.clone() for v in self.v]
+        new.length = self.length
+        return new
+
+
+class ChunkedLMLoss(torch.autograd.Function):
+    """Mean cross-entropy of ``hidden @ weight.T`` against ``targets``.
+
+    The (N, V) logits are computed ``chunk`` rows at a time and dropped; the
+    backward pass recomputes each chunk from ``hidden`` and the saved
+    per-row logsumexp, so at most ``chunk x V`` logits exist at once.
+    """
+
+    @staticmethod
+    @torch.amp.custom_fwd(device_type="cuda", cast_inputs=torch.float32)
+    def forward(ctx, hidden, weight, targets, chunk):
+        lse = hidden.new_empty(hidden.size(0))
+        total = hidden.new_zeros(())
+        for i in range(0, hidden.size(0), chunk):
+            logits = hidden[i : i + chunk] @ weight.t()
+            lse[i : i + chunk] = torch.logsumexp(logits, dim=-1)
+            picked = logits.gather(1, targets[i : i + chunk, None])[:, 0]
+            total += (lse[i : i + chunk] - picked).sum()
+        ctx.save_for_backward(hidden, weight, targets, lse)
+        ctx.chunk = chunk
+        return total / hidden.size(0)
+
+    @staticmethod
+    @torch.amp.custom_bwd(device_type="cuda")
+    def backward(ctx, grad_out):
+        hidden, weight, targets, lse = ctx.saved_tensors
+        scale = grad_out / hidden.size(0)
+        grad_hidden = torch.empty_like(hidden)
+        grad_weight = torch.zeros_like(weight)
+        for i in range(0, hidden.size(0), ctx.chunk):
+            h = hidden[i : i + ctx.chunk]
+            # d loss / d logits = softmax - one_hot(target)
+            g = torch.exp(h @ weight.t() - lse[i : i + ctx.chunk, None])
+            g.scatter_add_(
+                1, targets[i : i + ctx.chunk, None], g.new_full((len(h), 1), -1.0)
+            )
+            g *= scale
+            grad_hidden[i : i + ctx.chunk] = g @ weight
+            grad_weight.addmm_(g.t(), h)
+        return grad_hidden, grad_weight, None, None
 
 
 class ReviewGen(nn.Module):
-    def __init__(self, vocab_size, ctx_len=128, d_model=128, n_heads=2, n_layers=2):
+    def __init__(
+        self,
+        vocab_size,
+        ctx_len=128,
+        d_model=128,
+        n_heads=2,
+        n_layers=2,
+        tie_weights=False,
+    ):
         super().__init__()
+        self.config = dict(
+            vocab_size=vocab_size,
+            ctx_len=ctx_len,
+            d_model=d_model,
+            n_heads=n_heads,
+            n_layers=n_layers,
+            tie_weights=tie_weights,
+        )
+        self.tie_weights = tie_weights
+        # recompute each layer's activations in backward instead of storing them
+        self.grad_checkpoint = False
         self.tok_emb = nn.Embedding(vocab_size, d_model)
         self.pos_emb = nn.Parameter(torch.zeros(1, ctx_len, d_model))
 
@@ -18,9 +138,76 @@ class ReviewGen(nn.Module):
 
         self.transformer = nn.TransformerEncoder(block(), num_layers=n_layers)
         self.lm_head = nn.Linear(d_model, vocab_size, bias=False)
+        if tie_weights:
+            # one vocab x d_model matrix for both the lookup and the projection;
+            # nn.Embedding's N(0, 1) init would start the logits far from uniform
+            self.lm_head.weight = self.tok_emb.weight
+            nn.init.normal_(self.tok_emb.weight, 0.0, 0.02)
 
     def forward(self, idx):
+        return self.lm_head(self.hidden(idx))
+
+    def hidden(self, idx):
+        """Final-layer activations (B, T, d_model), before ``lm_head``."""
         B, T = idx.shape
         x = self.tok_emb(idx) + self.pos_emb[:, :T]
-        x = self.transformer(x)
+        mask = nn.Transformer.generate_square_subsequent_mask(T, device=idx.device)
+        if not (self.grad_checkpoint and self.training):
+            return self.transformer(x, mask=mask, is_causal=True)
+        for layer in self.transformer.layers:
+            x = checkpoint(layer, x, mask, None, True, use_reentrant=False)
+        return x
+
+    def loss(self, idx, targets, chunk=0):
+        """Mean next-token cross-entropy. ``chunk`` > 0 computes ``lm_head``
+        and the loss ``chunk`` positions at a time so the full (B, T, vocab)
+        logits are never materialised."""
+        h = self.hidden(idx)
+        if chunk <= 0:
+            logits = self.lm_head(h)
+            return F.cross_entropy(logits.view(-1, logits.size(-1)), targets.view(-1))
+        h = h.reshape(-1, h.size(-1))
+        return ChunkedLMLoss.apply(h, self.lm_head.weight, targets.reshape(-1), chunk)
+
+    # ---------- incremental decoding ----------
+    def new_cache(self):
+        return KVCache(len(self.transformer.layers), self.config["ctx_len"])
+
+    def forward_cached(self, idx, cache):
+        """Logits for ``idx`` (B, T) given everything already in ``cache``.
+
+        Equivalent to the last T positions of ``forward`` over the whole
+        cached sequence, but only the new tokens are computed. Inference only:
+        dropout is skipped.
+        """
+        B, T = idx.shape
+        start = cache.length
+        x = self.tok_emb(idx) + self.pos_emb[:, start : start + T]
+        if T > 1:
+            # new token i sits at absolute position start + i
+            mask = torch.ones(T, start + T, dtype=torch.bool, device=idx.device)
+            mask = mask.tril(diagonal=start)
+        else:
+            mask = None
+        for i, layer in enumerate(self.transformer.layers):
+            x = self._layer_cached(layer, x, cache, i, mask)
+        cache.length += T
         return self.lm_head(x)
+
+    @staticmethod
+    def _layer_cached(layer, x, cache, i, mask):
+        # nn.TransformerEncoderLayer.forward (post-norm, eval) with a KV cache
+        attn = layer.self_attn
+        B, T, D = x.shape
+        H = attn.num_heads
+        qkv = F.linear(x, attn.in_proj_weight, attn.in_proj_bias)
+        q, k, v = (t.view(B, T, H, D // H).transpose(1, 2) for t in qkv.chunk(3, -1))
+        k, v = cache.update(i, k, v)
+        a = F.scaled_dot_product_attention(q, k, v, attn_mask=mask)
+        a = attn.out_proj(a.transpose(1, 2).reshape(B, T, D))
+        x = layer.norm1(x + a)
+        return layer.norm2(x + layer.linear2(layer.activation(layer.linear1(x))))
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**config)
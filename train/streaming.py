@@ -0,0 +1,228 @@
+"""Streaming review dataset: tokenise shards on the fly instead of up front.
+
+Shards are ``.jsonl`` files (one review object per line) or ``.json`` arrays
+such as the scraper's per-restaurant files or ``master.json``. Each DataLoader
+worker reads its share of the corpus, tokenises reviews in small batches,
+cuts the token stream into ``seq_len + 1`` blocks, mixes them through a
+shuffle buffer and yields whole (x, y, stream) batches, so nothing is held in memory
+beyond the buffer and training starts as soon as the buffer fills.
+
+Sharding: with at least as many files as (ranks x workers) each reader gets
+whole files; otherwise every reader scans all files and keeps every n-th
+review. The rank comes from ``RANK`` / ``WORLD_SIZE`` unless given.
+
+Resume: the order of batches depends only on ``seed``, the epoch, the number
+of workers and the batch size. Iterate through ``track(loader)`` and the
+dataset records how many batches came from each worker's stream
+(``position``); ``set_epoch(epoch, position)`` in a new run makes each worker
+fast-forward past what was consumed, and training continues with the same
+batches in the same order.
+
+    python train/streaming.py master.json --out-dir shards --shard-size 5000
+"""
+
+import glob, itertools, json, os, random
+from pathlib import Path
+
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from tokenizers import Tokenizer
+
+from train.control import ControlPrefixer
+
+
+def expand_shards(shards):
+    """Glob pattern(s) or paths -> sorted list of files."""
+    if isinstance(shards, (str, Path)):
+        shards = [shards]
+    files = sorted({f for s in shards for f in glob.glob(str(s))})
+    if not files:
+        raise FileNotFoundError(f"no shards match {shards}")
+    return files
+
+
+def read_records(path):
+    """Review records with text from one shard; ``.jsonl`` is read a line at a time."""
+    with open(path) as f:
+        if str(path).endswith(".jsonl"):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            records = json.load(f)
+        for r in records:
+            if r.get("text"):
+                yield r
+
+
+def read_reviews(path):
+    """Review texts from one shard."""
+    return (r["text"] for r in read_records(path))
+
+
+class StreamingReviewDataset(IterableDataset):
+    def __init__(
+        self,
+        shards,
+        tokenizer_path,
+        seq_len=128,
+        batch_size=48,
+        shuffle_buffer=10000,
+        seed=0,
+        rank=None,
+        world_size=None,
+        eos_token="<eos>",
+        encode_batch=256,
+        max_workers=64,
+        controls=False,
+        control_dropout=0.1,
+    ):
+        self.files = expand_shards(shards)
+        self.tokenizer_path = tokenizer_path
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.eos_id = self.tokenizer.token_to_id(eos_token)
+        self.prefix = (
+            ControlPrefixer(self.tokenizer, control_dropout) if controls else None
+        )
+        self.seq_len = seq_len
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.rank = int(os.environ.get("RANK", 0)) if rank is None else rank
+        self.world_size = (
+            int(os.environ.get("WORLD_SIZE", 1)) if world_size is None else world_size
+        )
+        self.encode_batch = encode_batch
+        self.max_workers = max_workers
+        # epoch, streams, next stream, batches consumed per stream; in shared
+        # memory so persistent workers see set_epoch()
+        self._state = torch.zeros(3 + max_workers, dtype=torch.long).share_memory_()
+        self.position = dict(next=0, consumed=[])
+
+    def set_epoch(self, epoch, position=None):
+        """Start ``epoch``, optionally resuming from a saved ``position``."""
+        self.position = dict(position or dict(next=0, consumed=[]))
+        consumed = list(self.position["consumed"])
+        if len(consumed) > self.max_workers:
+            raise ValueError(f"position has more than {self.max_workers} streams")
+        self._state.zero_()
+        self._state[:3] = torch.tensor([epoch, len(consumed), self.position["next"]])
+        self._state[3 : 3 + len(consumed)] = torch.tensor(consumed, dtype=torch.long)
+
+    def track(self, loader):
+        """Batches of ``loader`` as (x, y), recording which stream each came from.
+
+        The DataLoader cycles through its workers in order, skipping those
+        that have run out, so (batches consumed per stream, next stream) is
+        enough to reproduce the rest of the epoch.
+        """
+        n = max(1, loader.num_workers)
+        pos = self.position
+        if not pos["consumed"]:
+            pos["consumed"] = [0] * n
+        elif len(pos["consumed"]) != n:
+            raise ValueError(
+                f"resuming with {n} workers, position was saved with "
+                f"{len(pos['consumed'])}"
+            )
+        return self._tracked(iter(loader), pos, n)  # workers start here
+
+    @staticmethod
+    def _tracked(batches, pos, n):
+        for x, y, stream in batches:
+            pos["consumed"][stream] += 1
+            pos["next"] = (stream + 1) % n
+            yield x, y
+
+    def _records(self, epoch, reader, n_readers):
+        files = list(self.files)
+        random.Random(f"{self.seed}-{epoch}").shuffle(files)
+        if len(files) >= n_readers:
+            for path in files[reader::n_readers]:
+                yield from read_records(path)
+        else:
+            records = itertools.chain.from_iterable(map(read_records, files))
+            yield from itertools.islice(records, reader, None, n_readers)
+
+    def _blocks(self, records):
+        """Token stream cut into (seq_len + 1) blocks; reviews end with eos."""
+        pending, n = [], self.seq_len + 1
+        while True:
+            chunk = list(itertools.islice(records, self.encode_batch))
+            if not chunk:
+                return
+            texts = [r["text"] for r in chunk]
+            for r, enc in zip(chunk, self.tokenizer.encode_batch(texts)):
+                if self.prefix:
+                    pending.extend(self.prefix(r))
+                pending.extend(enc.ids)
+                if self.eos_id is not None:
+                    pending.append(self.eos_id)
+            full = len(pending) // n * n
+            if full:
+                yield from torch.tensor(pending[:full]).view(-1, n)
+                pending = pending[full:]
+
+    def _shuffled(self, blocks, rng):
+        buf = []
+        for block in blocks:
+            if len(buf) < self.shuffle_buffer:
+                buf.append(block)
+                continue
+            i = rng.randrange(len(buf))
+            buf[i], block = block, buf[i]
+            yield block
+        rng.shuffle(buf)
+        yield from buf
+
+    def __iter__(self):
+        epoch, n_streams, first, *consumed = self._state.tolist()
+        info = get_worker_info()
+        wid, n_workers = (info.id, info.num_workers) if info else (0, 1)
+        # every iter() starts at worker 0; rotate so worker 0 continues the
+        # stream that was due next when the position was saved
+        role = (wid + first) % n_workers
+        own_skip = consumed[role] if n_streams else 0
+        reader, n_readers = self.rank * n_workers + role, self.world_size * n_workers
+        rng = random.Random(f"{self.seed}-{epoch}-{reader}")
+        blocks = self._shuffled(
+            self._blocks(self._records(epoch, reader, n_readers)), rng
+        )
+        batches = iter(lambda: list(itertools.islice(blocks, self.batch_size)), [])
+        for i, batch in enumerate(batches):
+            if len(batch) < self.batch_size:
+                return  # drop the ragged tail
+            if i < own_skip:
+                continue
+            block = torch.stack(batch)
+            yield block[:, :-1].contiguous(), block[:, 1:].contiguous(), role
+
+
+def write_shards(json_path, out_dir, shard_size=5000):
+    """Split a ``master.json`` array into ``.jsonl`` shards of ``shard_size`` reviews."""
+    with open(json_path) as f:
+        records = json.load(f)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(0, len(records), shard_size):
+        path = out_dir / f"reviews-{i // shard_size:05d}.jsonl"
+        with open(path, "w") as f:
+            for r in records[i : i + shard_size]:
+                f.write(json.dumps(r) + "\n")
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    import argparse
+
+    cli = argparse.ArgumentParser(description="Split a JSON array into JSONL shards")
+    cli.add_argument("json")
+    cli.add_argument("--out-dir", default="shards")
+    cli.add_argument("--shard-size", type=int, default=5000)
+    args = cli.parse_args(argv)
+    paths = write_shards(args.json, args.out_dir, args.shard_size)
+    print(f"wrote {len(paths)} shards to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
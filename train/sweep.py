@@ -0,0 +1,355 @@
+"""Hyperparameter sweep over train.py with successive halving.
+
+    python train/sweep.py sweep.json --out-dir sweeps/lr-size --cores-per-trial 2
+
+The corpus is tokenized once and put in shared memory; every trial trains
+on a zero-copy view of it (any ``seq_len``) in a pool of worker processes,
+each pinned to its own ``--cores-per-trial`` cores. A spec looks like
+
+    {
+      "method": "random",              # or "grid" (every combination)
+      "trials": 12,                    # random only
+      "params": {
+        "lr": {"log_uniform": [1e-4, 3e-3]},
+        "preset": ["tiny", "small", "base"],
+        "bs": [16, 32],
+        "seq_len": {"int": [64, 128]}
+      },
+      "fixed": {"epochs": 50, "log_every": 50},
+      "max_steps": 900,
+      "halving": {"min_steps": 100, "eta": 3}
+    }
+
+Keys are ``train.py`` options (``seq_len`` or ``seq-len``; ``true`` for
+flags). With ``halving``, all trials train ``min_steps``, are scored on the
+held-out tail of the corpus, and the best 1/``eta`` continue from their saved
+state for ``eta`` times as many steps, up to ``max_steps``. Each trial gets a
+directory with its weights, state and ``metrics.csv``; ``summary.csv`` ranks
+them all.
+"""
+
+import argparse, csv, itertools, json, math, os, random, sys, time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.absolute()
+if not __package__:  # run as a script: import the train package
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from train.train import build_parser as train_parser, train
+
+
+# ---------- spec ----------
+def sample_value(rng, space):
+    if isinstance(space, list):
+        return rng.choice(space)
+    if not isinstance(space, dict):
+        return space
+    ((kind, (lo, hi)),) = space.items()
+    if kind == "log_uniform":
+        return math.exp(rng.uniform(math.log(lo), math.log(hi)))
+    if kind == "uniform":
+        return rng.uniform(lo, hi)
+    if kind == "int":
+        return rng.randint(lo, hi)
+    raise ValueError(f"unknown search space {space}")
+
+
+def expand_spec(spec):
+    """List of trial param dicts for a grid or random spec."""
+    params = spec.get("params", {})
+    if spec.get("method", "grid") == "grid":
+        for key, space in params.items():
+            if isinstance(space, dict):
+                raise ValueError(f"grid search needs a list of values for {key!r}")
+        keys = list(params)
+        values = [v if isinstance(v, list) else [v] for v in params.values()]
+        return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+    rng = random.Random(spec.get("seed", 0))
+    return [
+        {key: sample_value(rng, space) for key, space in params.items()}
+        for _ in range(spec["trials"])
+    ]
+
+
+def to_argv(options):
+    argv = []
+    for key, value in options.items():
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            argv.append(flag)
+        elif value is False:
+            argv.append("--no-" + key.replace("_", "-"))
+        else:
+            argv += [flag, str(value)]
+    return argv
+
+
+# ---------- workers ----------
+_corpus = {}
+
+
+def init_worker(cores, train_tokens, val_tokens, tok_path):
+    import torch
+    from tokenizers import Tokenizer
+
+    # one core set per worker process, handed out through the queue
+    mine = cores.get()
+    os.sched_setaffinity(0, mine)
+    torch.set_num_threads(len(mine))
+    _corpus.update(
+        train=train_tokens, val=val_tokens, tokenizer=Tokenizer.from_file(tok_path)
+    )
+
+
+def evaluate(model, tokens, seq_len, bs):
+    import torch
+    from train.dataset import ReviewLMDataset
+
+    ds = ReviewLMDataset.from_tokens(tokens, seq_len)
+    if not len(ds):
+        raise ValueError(f"held-out split has no {seq_len + 1}-token block")
+    device = next(model.parameters()).device  # train() may have moved it to GPU
+    model.eval()
+    losses = []
+    with torch.no_grad():
+        for i in range(0, len(ds), bs):
+            x, y = ds.__getitems__(list(range(i, min(i + bs, len(ds)))))
+            losses.append(model.loss(x.to(device), y.to(device)).item())
+    return sum(losses) / len(losses)
+
+
+def run_trial(job):
+    """Train trial ``job["trial"]`` up to ``job["steps"]`` global steps,
+    resuming from its last rung; returns its held-out loss."""
+    from train.dataset import ReviewLMDataset
+
+    trial, steps, argv = job["trial"], job["steps"], job["argv"]
+    if job["rung"]:
+        argv = argv + ["--resume"]  # from the state the previous rung saved
+    t0 = time.perf_counter()
+    try:
+        args = train_parser().parse_args(argv + ["--max-steps", str(steps)])
+        ds = ReviewLMDataset.from_tokens(
+            _corpus["train"], args.seq_len, _corpus["tokenizer"]
+        )
+        model = train(args, ds)
+        val_loss = evaluate(model, _corpus["val"], args.seq_len, args.bs)
+        error = None
+    except Exception as e:  # a bad config loses the trial, not the sweep
+        val_loss, error = float("inf"), f"{type(e).__name__}: {e}"
+    if math.isnan(val_loss):
+        val_loss = float("inf")
+    return dict(
+        trial=trial,
+        steps=steps,
+        val_loss=val_loss,
+        seconds=time.perf_counter() - t0,
+        error=error,
+    )
+
+
+def core_sets(cores_per_trial, workers=None):
+    cores = sorted(os.sched_getaffinity(0))
+    n = workers or max(1, len(cores) // cores_per_trial)
+    return [
+        cores[(i * cores_per_trial) % len(cores) :][:cores_per_trial] for i in range(n)
+    ]
+
+
+# ---------- successive halving ----------
+def rungs(max_steps, halving):
+    if not halving:
+        return [max_steps]
+    steps, out = halving["min_steps"], []
+    while steps < max_steps:
+        out.append(steps)
+        steps *= halving.get("eta", 3)
+    return out + [max_steps]
+
+
+def run_sweep(pool, trials, schedule, eta, log=print):
+    """Run every rung of ``schedule``; returns {trial: [rung results]}."""
+    history = {t["trial"]: [] for t in trials}
+    alive = trials
+    for rung, steps in enumerate(schedule):
+        log(f"rung {rung}: {len(alive)} trials x {steps} steps")
+        for result in pool.imap_unordered(
+            run_trial, [dict(t, steps=steps, rung=rung) for t in alive]
+        ):
+            history[result["trial"]].append(result)
+            note = f" ({result['error']})" if result["error"] else ""
+            log(
+                f"  {result['trial']}: val loss {result['val_loss']:.4f} "
+                f"after {steps} steps, {result['seconds']:.0f}s{note}"
+            )
+        if rung + 1 < len(schedule):
+            # a failed or diverged trial (inf or NaN) never goes on
+            loss = lambda t: history[t["trial"]][-1]["val_loss"]
+            ranked = sorted(
+                alive, key=lambda t: loss(t) if math.isfinite(loss(t)) else math.inf
+            )
+            alive = [
+                t for t in ranked[: max(1, len(alive) // eta)] if math.isfinite(loss(t))
+            ]
+            if not alive:
+                break
+    return history
+
+
+# ---------- summary ----------
+def read_metrics(path):
+    """(last logged loss, mean tokens/s) from a train.py metrics CSV."""
+    if not path.exists():
+        return None, None
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return None, None
+    tps = [float(r["tokens_per_sec"]) for r in rows]
+    return float(rows[-1]["loss"]), sum(tps) / len(tps)
+
+
+def summarise(out_dir, trials, history):
+    rows = []
+    for t in trials:
+        results = history[t["trial"]]
+        train_loss, tps = read_metrics(out_dir / t["trial"] / "metrics.csv")
+        rows.append(
+            dict(
+                trial=t["trial"],
+                val_loss=results[-1]["val_loss"],
+                steps=results[-1]["steps"],
+                train_loss=train_loss,
+                tokens_per_sec=tps,
+                seconds=sum(r["seconds"] for r in results),
+                **{f"param.{k}": v for k, v in t["params"].items()},
+            )
+        )
+    # furthest rung first, then best loss: rung survivors always rank higher
+    rows.sort(
+        key=lambda r: (
+            -r["steps"],
+            r["val_loss"] if math.isfinite(r["val_loss"]) else math.inf,
+        )
+    )
+    with open(out_dir / "summary.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def print_summary(rows):
+    params = [k for k in rows[0] if k.startswith("param.")]
+    fmt = lambda v: f"{v:.4g}" if isinstance(v, float) else str(v)
+    header = ["trial", "val_loss", "steps", "train_loss", "tokens_per_sec"] + params
+    table = [header] + [
+        [fmt(r[k]) if r[k] is not None else "-" for k in header] for r in rows
+    ]
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    for row in table:
+        print("  ".join(cell.rjust(w) for cell, w in zip(row, widths)))
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Successive-halving sweep over train.py")
+    cli.add_argument("spec", help="Sweep spec JSON")
+    cli.add_argument("--json", default=str(PROJECT_ROOT / "master.json"))
+    cli.add_argument("--tok", default=str(PROJECT_ROOT / "tokenizer.json"))
+    cli.add_argument("--out-dir", default=str(PROJECT_ROOT / "sweeps" / "sweep"))
+    cli.add_argument("--cores-per-trial", type=int, default=1)
+    cli.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Concurrent trials; default all cores / --cores-per-trial",
+    )
+    cli.add_argument(
+        "--val-fraction",
+        type=float,
+        default=0.05,
+        help="Tail of the corpus held out for scoring trials",
+    )
+    cli.add_argument(
+        "--controls",
+        action="store_true",
+        help="Prefix reviews with control tokens, as train.py --controls",
+    )
+    args = cli.parse_args(argv)
+
+    import torch.multiprocessing as mp
+    from tokenizers import Tokenizer
+    from train.dataset import tokenize_corpus
+
+    spec = json.loads(Path(args.spec).read_text())
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    schedule = rungs(spec["max_steps"], spec.get("halving"))
+    eta = spec.get("halving", {}).get("eta", 3)
+
+    t0 = time.perf_counter()
+    tokens = tokenize_corpus(
+        args.json, Tokenizer.from_file(args.tok), controls=args.controls
+    )
+    split = int(len(tokens) * (1 - args.val_fraction))
+    tokens.share_memory_()  # workers map it; nothing is copied per trial
+    print(
+        f"tokenized {len(tokens):,} tokens in {time.perf_counter() - t0:.1f}s "
+        f"({len(tokens) - split:,} held out)"
+    )
+
+    fixed = dict(spec.get("fixed", {}), tok=args.tok)
+    trials = []
+    for i, params in enumerate(expand_spec(spec)):
+        name = f"trial-{i:03d}"
+        trial_dir = (out_dir / name).absolute()
+        trial_dir.mkdir(exist_ok=True)
+        for stale in ("metrics.csv", "model.state.pt"):  # from an earlier sweep
+            (trial_dir / stale).unlink(missing_ok=True)
+        options = dict(
+            fixed,
+            **params,
+            out=trial_dir / "model.pt",
+            csv_log=trial_dir / "metrics.csv",
+            progress=False,
+        )
+        trial_argv = to_argv(options)
+        trial_args = train_parser().parse_args(trial_argv)
+        if trial_args.num_workers != "0":
+            # pool workers are daemonic and cannot start DataLoader workers
+            cli.error(
+                f"{name}: sweeps need num_workers 0, got {trial_args.num_workers}"
+            )
+        if len(tokens) - split < trial_args.seq_len + 1:
+            cli.error(
+                f"{name}: the held-out split ({len(tokens) - split} tokens) is "
+                f"shorter than one seq_len {trial_args.seq_len} block; "
+                "raise --val-fraction"
+            )
+        trials.append(dict(trial=name, params=params, argv=trial_argv))
+        (trial_dir / "params.json").write_text(json.dumps(params, indent=2))
+
+    cores = core_sets(args.cores_per_trial, args.workers)
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for c in cores:
+        queue.put(c)
+    print(
+        f"{len(trials)} trials, rungs {schedule}, {len(cores)} workers on cores {cores}"
+    )
+    with ctx.Pool(
+        len(cores), init_worker, (queue, tokens[:split], tokens[split:], args.tok)
+    ) as pool:
+        history = run_sweep(pool, trials, schedule, eta)
+
+    rows = summarise(out_dir, trials, history)
+    (out_dir / "summary.json").write_text(json.dumps(rows, indent=2, default=str))
+    print_summary(rows)
+    print(
+        f"sweep took {time.perf_counter() - t0:.0f}s; summary in {out_dir / 'summary.csv'}"
+    )
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,378 @@
 # train_amp.py
-import argparse, json, time, logging, torch, csv, os
-from torch.utils.data import DataLoader
-from torch.amp import autocast, GradScaler
-from tqdm.auto import tqdm
+import argparse, json, time, logging, os, itertools, sys
 import pathlib
 
 PROJECT_ROOT = pathlib.Path(__file__).parent.parent.absolute()
+if not __package__:  # run as a script: import the train package, not this file
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from train.presets import PRESETS
 
-from dataset import ReviewLMDataset
-from review_gen import ReviewGen
 
 # -------------------- CLI --------------------
-p = argparse.ArgumentParser()
-p.add_argument("--json", default=str(PROJECT_ROOT / "master.json"))
-p.add_argument("--tok", default=str(PROJECT_ROOT / "tokenizer.json"))
-p.add_argument("--seq-len", type=int, default=128)
-p.add_argument("--bs", type=int, default=48)
-p.add_argument("--epochs", type=int, default=6)
-p.add_argument("--lr", type=float, default=3e-4)
-p.add_argument("--log-every", type=int, default=200)
-p.add_argument(
-    "--csv-log", default="training_metrics.csv", help="CSV file to log metrics"
-)
-args = p.parse_args()
-
-# -------------------- logging --------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",  # one compact line per record
-    handlers=[logging.StreamHandler()],
-)
-log = logging.getLogger("train")
-
-csv_path = PROJECT_ROOT / args.csv_log
-csv_exists = os.path.exists(csv_path)
-csv_file = open(csv_path, "a", newline="")
-csv_writer = csv.writer(csv_file)
-if not csv_exists:
-    csv_writer.writerow(["step", "epoch", "loss", "tokens_per_sec"])
-
-# -------------------- dataset / model --------------------
-device = "cuda" if torch.cuda.is_available() else "cpu"
-ds = ReviewLMDataset(args.json, args.tok, seq_len=args.seq_len)
-dl = DataLoader(ds, batch_size=args.bs, shuffle=True, pin_memory=True)
-
-model = ReviewGen(len(ds.tokenizer.get_vocab()), ctx_len=args.seq_len).to(device)
-opt = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-2)
-
-scaler = GradScaler(enabled=(device == "cuda"))
-
-tokens_per_step = args.bs * args.seq_len
-
-# -------------------- training loop --------------------
-global_step = 0
-for epoch in range(args.epochs):
-    epoch_start = time.time()
-    running_loss = 0.0
-    with tqdm(total=len(dl), desc=f"Epoch {epoch}", unit="batch") as pbar:
-        for it, (x, y) in enumerate(dl):
-            x, y = x.to(device, non_blocking=True), y.to(device, non_blocking=True)
-
-            with autocast(device_type=device, enabled=(device == "cuda")):
-                logits = model(x)
-                loss = torch.nn.functional.cross_entropy(
-                    logits.view(-1, logits.size(-1)), y.view(-1)
-                )
-
-            scaler.scale(loss).backward()
-            scaler.step(opt)
-            scaler.update()
-            opt.zero_grad(set_to_none=True)
-
-            running_loss += loss.item()
-            global_step += 1
-            pbar.update(1)
-
-            # ---- periodic logging ----
-            if global_step % args.log_every == 0:
-                avg_loss = running_loss / args.log_every
-                tokens_sec = (tokens_per_step * args.log_every) / (
-                    time.time() - epoch_start
-                )
-                epoch_start = time.time()
-                running_loss = 0.0
-
-                payload = {
-                    "step": global_step,
-                    "epoch": epoch,
-                    "loss": round(avg_loss, 4),
-                    "tokens_per_sec": int(tokens_sec),
-                }
-                log.info(json.dumps(payload))  # ↳     single‑line JSON
-
-                csv_writer.writerow(
-                    [global_step, epoch, round(avg_loss, 4), int(tokens_sec)]
-                )
-                csv_file.flush()
-
-# -------------------- teardown --------------------
-csv_file.close()  # Close the CSV file
-torch.save(model.state_dict(), str(PROJECT_ROOT / "review_gen.pt"))
-log.info("Finished training; model saved to review_gen.pt")
-log.info(f"Training metrics saved to {args.csv_log}")
+def build_parser():
+    p = argparse.ArgumentParser(description="Train ReviewGen")
+    p.add_argument("--json", default=str(PROJECT_ROOT / "master.json"))
+    p.add_argument("--tok", default=str(PROJECT_ROOT / "tokenizer.json"))
+    p.add_argument(
+        "--shards",
+        nargs="+",
+        default=None,
+        help="Glob(s) or paths of .jsonl/.json review shards to stream and tokenise on the fly "
+        "instead of loading --json up front",
+    )
+    p.add_argument(
+        "--shuffle-buffer", type=int, default=10000, help="Blocks held for shuffling"
+    )
+    p.add_argument("--seed", type=int, default=0, help="Init, dropout and data order")
+    p.add_argument("--seq-len", type=int, default=128)
+    p.add_argument("--bs", type=int, default=48)
+    p.add_argument("--epochs", type=int, default=6)
+    p.add_argument("--lr", type=float, default=3e-4)
+    p.add_argument("--log-every", type=int, default=200)
+    p.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    p.add_argument("--d-model", type=int, default=None, help="Override the preset")
+    p.add_argument("--n-heads", type=int, default=None, help="Override the preset")
+    p.add_argument("--n-layers", type=int, default=None, help="Override the preset")
+    p.add_argument(
+        "--tie-weights",
+        dest="tie_weights",
+        action="store_const",
+        const=True,
+        default=None,
+        help="Share tok_emb and lm_head weights (default: per preset)",
+    )
+    p.add_argument(
+        "--no-tie-weights", dest="tie_weights", action="store_const", const=False
+    )
+    p.add_argument(
+        "--out",
+        default="review_gen.pt",
+        help="Weights file (.pt, or .safetensors with safetensors installed); "
+        "the model config is written beside it as .json",
+    )
+    p.add_argument(
+        "--save-every",
+        type=int,
+        default=0,
+        help="Write a resumable training state every N steps (and every epoch)",
+    )
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the training state saved beside --out",
+    )
+    p.add_argument(
+        "--csv-log", default="training_metrics.csv", help="CSV file to log metrics"
+    )
+    p.add_argument(
+        "--profile-steps",
+        default=None,
+        help="a:b - record a torch.profiler trace for global steps a..b-1",
+    )
+    p.add_argument("--trace", default="profile_trace.json", help="Chrome trace output")
+    p.add_argument(
+        "--peak-tflops",
+        type=float,
+        default=None,
+        help="Hardware peak TFLOP/s, used to report model FLOPs utilisation",
+    )
+    p.add_argument(
+        "--num-workers",
+        default="0",
+        help="DataLoader worker processes, or 'auto' to pick by measured data-wait",
+    )
+    p.add_argument(
+        "--no-persistent-workers",
+        dest="persistent_workers",
+        action="store_false",
+        help="Restart workers every epoch instead of keeping them alive",
+    )
+    p.add_argument("--prefetch-factor", type=int, default=4, help="Batches per worker")
+    p.add_argument(
+        "--loss-chunk",
+        type=int,
+        default=0,
+        help="Compute lm_head + cross-entropy this many positions at a time "
+        "(recomputed in backward) so full logits never exist; 0 = all at once",
+    )
+    p.add_argument(
+        "--max-steps",
+        type=int,
+        default=0,
+        help="Stop after this many global steps (saving a resumable state); 0 = run all epochs",
+    )
+    p.add_argument(
+        "--no-progress", dest="progress", action="store_false", help="No progress bars"
+    )
+    p.add_argument(
+        "--controls",
+        action="store_true",
+        help="Prefix each review with its rating/cuisine control tokens "
+        "(tokenizer from train_tokenizer.py --controls)",
+    )
+    p.add_argument(
+        "--control-dropout",
+        type=float,
+        default=0.1,
+        help="Share of control tokens left out, so partial conditions work too",
+    )
+    p.add_argument(
+        "--grad-checkpoint",
+        action="store_true",
+        help="Recompute transformer layer activations in backward to save memory",
+    )
+    return p
+
+
+def train(args, ds=None):
+    """Train as configured by ``args`` (from ``build_parser``) and save the model.
+
+    ``ds`` replaces loading ``--json``/``--shards``; the sweep runner passes
+    each trial a view of one shared, already tokenized corpus. Returns the
+    trained model.
+    """
+    import torch
+    from torch.amp import autocast, GradScaler
+    from tqdm.auto import tqdm
+
+    from train.checkpoint import save_checkpoint
+    from train.dataset import ReviewLMDataset, collate_blocks
+    from train.loader import build_loader, autotune_num_workers
+    from train.metrics import (
+        PHASES,
+        BackgroundCSVWriter,
+        StepMetrics,
+        StepProfiler,
+        model_flops_per_token,
+        parse_step_range,
+    )
+    from train.review_gen import ReviewGen
+    from train.streaming import StreamingReviewDataset
+
+    # -------------------- logging --------------------
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",  # one compact line per record
+        handlers=[logging.StreamHandler()],
+    )
+    log = logging.getLogger("train")
+
+    METRIC_FIELDS = ["tokens_per_sec", *(f"{p}_ms" for p in PHASES)]
+    METRIC_FIELDS += ["tflops", "mfu", "peak_mem_mb"]
+
+    csv_writer = BackgroundCSVWriter(
+        PROJECT_ROOT / args.csv_log, ["step", "epoch", "loss", *METRIC_FIELDS]
+    )
+    if csv_writer.rotated:
+        log.info(f"{args.csv_log} had other columns; moved to {csv_writer.rotated}")
+
+    # -------------------- dataset / model --------------------
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    torch.manual_seed(args.seed)
+    if ds is None and args.shards:
+        ds = StreamingReviewDataset(
+            args.shards,
+            args.tok,
+            seq_len=args.seq_len,
+            batch_size=args.bs,
+            shuffle_buffer=args.shuffle_buffer,
+            seed=args.seed,
+            controls=args.controls,
+            control_dropout=args.control_dropout,
+        )
+    elif ds is None:
+        ds = ReviewLMDataset(
+            args.json,
+            args.tok,
+            seq_len=args.seq_len,
+            controls=args.controls,
+            control_dropout=args.control_dropout,
+        )
+
+    model_cfg = dict(PRESETS[args.preset])
+    for key in ("d_model", "n_heads", "n_layers", "tie_weights"):
+        if getattr(args, key) is not None:
+            model_cfg[key] = getattr(args, key)
+    model = ReviewGen(
+        len(ds.tokenizer.get_vocab()), ctx_len=args.seq_len, **model_cfg
+    ).to(device)
+    model.grad_checkpoint = args.grad_checkpoint
+    log.info(json.dumps({"model": model.config}))
+    opt = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-2)
+
+    # reseeded every epoch so a resumed run sees the same batch order
+    data_gen = torch.Generator()
+
+    def make_loader(num_workers, persistent_workers=args.persistent_workers):
+        return build_loader(
+            ds,
+            args.bs,
+            device,
+            num_workers=num_workers,
+            persistent_workers=persistent_workers,
+            prefetch_factor=args.prefetch_factor,
+            collate_fn=collate_blocks,
+            generator=data_gen,
+        )
+
+    def probe_step(batch):
+        # forward/backward without an optimizer step: real compute, no weight change
+        x, y = (t.to(device, non_blocking=True) for t in batch[:2])
+        model.loss(x, y, chunk=args.loss_chunk).backward()
+        model.zero_grad(set_to_none=True)
+
+    if args.num_workers == "auto":
+        num_workers, _ = autotune_num_workers(
+            lambda n: make_loader(n, persistent_workers=False), probe_step
+        )
+    else:
+        num_workers = int(args.num_workers)
+    dl = make_loader(num_workers)
+
+    scaler = GradScaler(enabled=(device == "cuda"))
+
+    tokens_per_step = args.bs * args.seq_len
+    metrics = StepMetrics(
+        device,
+        flops_per_token=model_flops_per_token(model, args.seq_len),
+        peak_tflops=args.peak_tflops,
+    )
+    profiler = StepProfiler(
+        parse_step_range(args.profile_steps), PROJECT_ROOT / args.trace, device
+    )
+
+    # -------------------- resumable state --------------------
+    out_path = PROJECT_ROOT / args.out
+    state_path = out_path.with_suffix(".state.pt")
+
+    def save_state(epoch, batches_done):
+        state = dict(
+            model=model.state_dict(),
+            opt=opt.state_dict(),
+            scaler=scaler.state_dict(),
+            epoch=epoch,
+            batches_done=batches_done,
+            global_step=global_step,
+            rng=torch.get_rng_state(),  # dropout masks continue where they left off
+        )
+        if args.shards and batches_done:
+            state["stream_position"] = ds.position
+        tmp = state_path.with_suffix(".tmp")
+        torch.save(state, tmp)
+        os.replace(tmp, state_path)  # never leave a half-written state behind
+
+    global_step, start_epoch, skip_batches, stream_position = 0, 0, 0, None
+    if args.resume:
+        state = torch.load(state_path, map_location=device, weights_only=True)
+        model.load_state_dict(state["model"])
+        opt.load_state_dict(state["opt"])
+        scaler.load_state_dict(state["scaler"])
+        global_step = state["global_step"]
+        torch.set_rng_state(state["rng"])
+        start_epoch, skip_batches = state["epoch"], state["batches_done"]
+        stream_position = state.get("stream_position")
+        log.info(f"Resuming at epoch {start_epoch}, batch {skip_batches}")
+
+    # -------------------- training loop --------------------
+    running_loss = torch.zeros((), device=device)
+    position = (args.epochs, 0)  # where a resume would pick up
+    for epoch in range(start_epoch, args.epochs):
+        data_gen.manual_seed(args.seed + epoch)
+        batches_done = skip_batches
+        if args.shards:
+            # each worker fast-forwards past the batches its stream already gave
+            ds.set_epoch(epoch, stream_position)
+            batches = ds.track(dl)
+        else:
+            batches = itertools.islice(iter(dl), skip_batches, None)
+        skip_batches, stream_position = 0, None
+        # worker startup happens in iter(), outside the timed window
+        total = None if args.shards else len(dl)
+        with tqdm(
+            total=total,
+            initial=batches_done,
+            desc=f"Epoch {epoch}",
+            unit="batch",
+            disable=not args.progress,
+        ) as pbar:
+            while True:
+                if args.max_steps and global_step >= args.max_steps:
+                    break
+                profiler.step(global_step)
+                with metrics.phase("data"):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+
+                with metrics.phase("h2d"):
+                    x, y = batch
+                    x = x.to(device, non_blocking=True)
+                    y = y.to(device, non_blocking=True)
+
+                with metrics.phase("forward"):
+                    with autocast(device_type=device, enabled=(device == "cuda")):
+                        loss = model.loss(x, y, chunk=args.loss_chunk)
+
+                with metrics.phase("backward"):
+                    scaler.scale(loss).backward()
+
+                with metrics.phase("optim"):
+                    scaler.step(opt)
+                    scaler.update()
+                    opt.zero_grad(set_to_none=True)
+
+                # accumulate on device; .item() here would sync every step
+                running_loss += loss.detach()
+                global_step += 1
+                batches_done += 1
+                metrics.step_done(tokens_per_step)
+                pbar.update(1)
+
+                # ---- periodic logging ----
+                if global_step % args.log_every == 0:
+                    avg_loss = running_loss.item() / args.log_every
+                    running_loss.zero_()
+
+                    payload = {
+                        "step": global_step,
+                        "epoch": epoch,
+                        "loss": round(avg_loss, 4),
+                        **metrics.window(),
+                    }
+                    log.info(json.dumps(payload))  # ↳     single‑line JSON
+
+                    csv_writer.writerow(
+                        [global_step, epoch, payload["loss"]]
+                        + [payload[k] for k in METRIC_FIELDS]
+                    )
+
+                if args.save_every and global_step % args.save_every == 0:
+                    save_state(epoch, batches_done)
+
+        if args.max_steps and global_step >= args.max_steps:
+            position = (epoch, batches_done)
+            break
+        if args.save_every:
+            save_state(epoch + 1, 0)
+
+    # -------------------- teardown --------------------
+    if args.max_steps:
+        # a later --resume with a larger --max-steps carries on from here
+        save_state(*position)
+    profiler.close()
+    csv_writer.close()  # drains the background writer
+    save_checkpoint(model, out_path)
+    log.info(f"Finished training; model saved to {args.out}")
+    log.info(f"Training metrics saved to {args.csv_log}")
+    if args.profile_steps:
+        log.info(f"Profiler trace saved to {args.trace}")
+    return model
+
+
+def main(argv=None):
+    return train(build_parser().parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
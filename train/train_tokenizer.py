@@ -1,22 +1,234 @@
-from tokenizers import Tokenizer, trainers, models, pre_tokenizers, normalizers
-import pathlib
+"""Train the BPE tokenizer straight from review shards.
+
+    python train/train_tokenizer.py --corpus 'reviews/*.json' --vocab-size 4000,8000,16000
+
+Reviews are streamed from ``.json`` / ``.jsonl`` shards (cleaned on the fly
+with ``pre_tokenisation.clean_reviews``) or from a cleaned ``reviews.txt``,
+optionally subsampled, and fed to ``Tokenizer.train_from_iterator`` in batches,
+so the corpus never has to be written out or held in memory. About 1 in
+``--heldout-every`` reviews (chosen by hash, so the same ones every run) is
+held out; each trained vocab is scored on them:
+
+- fertility: tokens per whitespace word, i.e. how many positions a review
+  costs in training and generation
+- encode throughput: reviews/s and tokens/s for ``encode_batch``
+- embedding + lm_head parameters at ``--preset``'s ``d_model``
+"""
+
+import argparse, itertools, os, pathlib, random, sys, time, zlib
 
 PROJECT_ROOT = pathlib.Path(__file__).parent.parent.absolute()
+if not __package__:  # run as a script: import the train package
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from train.pre_tokenisation import clean_reviews
+from train.presets import PRESETS
+
+SPECIAL_TOKENS = ["[UNK]", "<pad>", "<bos>", "<eos>"]
+
+
+def build_tokenizer():
+    from tokenizers import Tokenizer, models, pre_tokenizers, normalizers
+
+    tokenizer = Tokenizer(models.BPE(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Sequence(
+        [
+            normalizers.NFD(),  # decompose accents
+            normalizers.StripAccents(),  # remove accents
+            normalizers.Lowercase(),
+        ]
+    )
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=True)
+    return tokenizer
+
+
+def stream_reviews(corpus):
+    """Clean review texts from ``.txt`` (already cleaned, one per line) and
+    ``.json`` / ``.jsonl`` shards."""
+    from train.streaming import expand_shards, read_reviews
+
+    def raw():
+        for path in expand_shards(corpus):
+            if path.endswith(".txt"):
+                with open(path, encoding="utf-8") as f:
+                    yield from (line.rstrip("\n") for line in f)
+            else:
+                yield from read_reviews(path)
+
+    return clean_reviews(raw())
+
+
+def corpus_controls(corpus, min_count=20):
+    """Control tokens (``control.control_vocab``) for the reviews in ``corpus``."""
+    from train.control import control_vocab
+    from train.streaming import expand_shards, read_records
+
+    paths = [p for p in expand_shards(corpus) if not p.endswith(".txt")]
+    if not paths:
+        raise ValueError("control tokens need .json/.jsonl reviews with metadata")
+    records = (r for path in paths for r in read_records(path))
+    return control_vocab(records, min_count)
+
+
+def is_heldout(text, every):
+    return every > 0 and zlib.crc32(text.encode()) % every == 0
+
+
+def split_reviews(texts, sample=1.0, max_reviews=None, heldout_every=50, seed=0):
+    """(training iterator, held-out list) over one pass of ``texts``.
+
+    The training side keeps each review with probability ``sample`` and stops
+    after ``max_reviews``; held-out reviews are collected as the training
+    iterator is consumed.
+    """
+    rng = random.Random(seed)
+    heldout = []
+
+    def train_iter():
+        for text in texts:
+            if is_heldout(text, heldout_every):
+                heldout.append(text)
+            elif sample >= 1.0 or rng.random() < sample:
+                yield text
+
+    return itertools.islice(train_iter(), max_reviews), heldout
+
+
+def batched(texts, size):
+    it = iter(texts)
+    return iter(lambda: list(itertools.islice(it, size)), [])
+
+
+def train_tokenizer(texts, vocab_size, batch_size=1000, min_frequency=0):
+    """Train a fresh BPE tokenizer on an iterator of review texts."""
+    from tokenizers import trainers
+
+    tokenizer = build_tokenizer()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        min_frequency=min_frequency,
+        special_tokens=SPECIAL_TOKENS,
+        show_progress=False,
+    )
+    tokenizer.train_from_iterator(batched(texts, batch_size), trainer)
+    return tokenizer
+
+
+def tokenizer_report(tokenizer, heldout, d_model=None, tie_weights=False):
+    """Fertility and ``encode_batch`` throughput on ``heldout`` texts."""
+    t0 = time.perf_counter()
+    encodings = tokenizer.encode_batch(heldout)
+    elapsed = time.perf_counter() - t0
+    n_tokens = sum(len(e.ids) for e in encodings)
+    n_words = sum(len(t.split()) for t in heldout)
+    unk = tokenizer.token_to_id("[UNK]")
+    vocab = tokenizer.get_vocab_size()
+    report = dict(
+        vocab_size=vocab,
+        fertility=n_tokens / max(n_words, 1),
+        tokens_per_review=n_tokens / max(len(heldout), 1),
+        unk_rate=sum(e.ids.count(unk) for e in encodings) / max(n_tokens, 1),
+        reviews_per_sec=len(heldout) / elapsed,
+        tokens_per_sec=n_tokens / elapsed,
+    )
+    if d_model:
+        report["embed_params"] = vocab * d_model * (1 if tie_weights else 2)
+    return report
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    cli.add_argument(
+        "--corpus",
+        nargs="+",
+        default=[str(PROJECT_ROOT / "master.json")],
+        help="Globs/paths of .json/.jsonl shards or a cleaned reviews.txt",
+    )
+    cli.add_argument(
+        "--vocab-size",
+        default="8000",
+        help="Vocab size, or a comma-separated list to train and compare",
+    )
+    cli.add_argument("--out", default=str(PROJECT_ROOT / "tokenizer.json"))
+    cli.add_argument("--sample", type=float, default=1.0, help="Fraction of reviews")
+    cli.add_argument("--max-reviews", type=int, default=None)
+    cli.add_argument("--heldout-every", type=int, default=50)
+    cli.add_argument("--min-frequency", type=int, default=0)
+    cli.add_argument("--batch-size", type=int, default=1000, help="Texts per batch")
+    cli.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Tokenizer worker threads (RAYON_NUM_THREADS); default all cores",
+    )
+    cli.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    cli.add_argument("--seed", type=int, default=0)
+    cli.add_argument(
+        "--controls",
+        action="store_true",
+        help="Add rating/cuisine control tokens for train.py --controls",
+    )
+    cli.add_argument(
+        "--min-cuisine-reviews",
+        type=int,
+        default=20,
+        help="Cuisines with fewer reviews get no control token",
+    )
+    args = cli.parse_args(argv)
+
+    if args.threads:
+        # read once, when the tokenizers thread pool starts
+        os.environ["RAYON_NUM_THREADS"] = str(args.threads)
+    preset = PRESETS[args.preset]
+    sizes = [int(v) for v in args.vocab_size.split(",")]
+
+    controls = []
+    if args.controls:
+        controls = corpus_controls(args.corpus, args.min_cuisine_reviews)
+        print(f"{len(controls)} control tokens: {' '.join(controls)}")
+
+    rows = []
+    for vocab_size in sizes:
+        texts, heldout = split_reviews(
+            stream_reviews(args.corpus),
+            sample=args.sample,
+            max_reviews=args.max_reviews,
+            heldout_every=args.heldout_every,
+            seed=args.seed,
+        )
+        t0 = time.perf_counter()
+        tokenizer = train_tokenizer(
+            texts, vocab_size, args.batch_size, args.min_frequency
+        )
+        train_s = time.perf_counter() - t0
+        if not heldout:
+            raise SystemExit("no held-out reviews; lower --heldout-every")
+        out = pathlib.Path(args.out)
+        if len(sizes) > 1:
+            out = out.with_name(f"{out.stem}-{vocab_size}{out.suffix}")
+        if controls:
+            from train.control import add_control_tokens
+
+            add_control_tokens(tokenizer, controls)
+        tokenizer.save(str(out))
+        report = tokenizer_report(
+            tokenizer, heldout, preset["d_model"], preset.get("tie_weights", False)
+        )
+        rows.append(dict(report, train_s=train_s, path=out))
+
+    print(
+        f"{'vocab':>6} {'train s':>8} {'tok/word':>8} {'tok/review':>10} "
+        f"{'unk %':>6} {'reviews/s':>10} {'tokens/s':>10} {'emb params':>10}  saved to"
+    )
+    for r in rows:
+        print(
+            f"{r['vocab_size']:>6} {r['train_s']:>8.1f} {r['fertility']:>8.3f} "
+            f"{r['tokens_per_review']:>10.1f} {100 * r['unk_rate']:>6.2f} "
+            f"{r['reviews_per_sec']:>10.0f} {r['tokens_per_sec']:>10.0f} "
+            f"{r['embed_params'] / 1e6:>9.2f}M  {r['path']}"
+        )
+    return rows
+
 
-corpus_file = str(PROJECT_ROOT / "reviews.txt")
-VOCAB_SIZE = 8000
-tokenizer = Tokenizer(models.BPE(unk_token="[UNK]"))
-tokenizer.normalizer = normalizers.Sequence(
-    [
-        normalizers.NFD(),  # decompose accents
-        normalizers.StripAccents(),  # remove accents
-        normalizers.Lowercase(),
-    ]
-)
-tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=True)
-trainer = trainers.BpeTrainer(
-    vocab_size=VOCAB_SIZE, special_tokens=["[UNK]", "<pad>", "<bos>", "<eos>"]
-)
-tokenizer.train([corpus_file], trainer)
-tokenizer.save(str(PROJECT_ROOT / "tokenizer.json"))
-print("Saved tokenizer with", len(tokenizer.get_vocab()), "tokens")
+if __name__ == "__main__":
+    main()